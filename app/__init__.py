@@ -43,6 +43,18 @@ def create_app(config_object=None):
     except ImportError:
         app.logger.warning("Blueprint для логов не зарегистрирован (файл не найден)")
     
+    # Регистрация blueprint для статистики производительности
+    from app.routes.stats_routes import stats_bp
+    app.register_blueprint(stats_bp)
+    
+    # Регистрация blueprint для статуса фоновых задач
+    from app.routes.job_routes import job_bp
+    app.register_blueprint(job_bp)
+    
+    # Запуск обработчиков очереди: задачи, оставшиеся после перезапуска, продолжат выполняться
+    from app.services.job_service import job_service
+    job_service.start()
+    
     # Если ALLOWED_EXTENSIONS не определено в конфигурации, добавим значение по умолчанию
     if 'ALLOWED_EXTENSIONS' not in app.config:
         app.config['ALLOWED_EXTENSIONS'] = {"png", "jpg", "jpeg", "gif", "pdf"}
@@ -13,12 +13,38 @@ class Config:
     
     # Database configuration
     DATABASE_URI = os.environ.get('DATABASE_URI', 'sqlite:///textbook_analyzer.db')
+    # SQLite: WAL journal, wait on locks instead of failing, explicit BEGIN mode
+    DB_SQLITE_BUSY_TIMEOUT = float(os.environ.get('DB_SQLITE_BUSY_TIMEOUT', 30))  # seconds
+    DB_SQLITE_SYNCHRONOUS = os.environ.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL')  # durable with WAL except on power loss
+    DB_SQLITE_CACHE_KB = int(os.environ.get('DB_SQLITE_CACHE_KB', 16384))  # page cache per connection
+    DB_SQLITE_BEGIN_MODE = os.environ.get('DB_SQLITE_BEGIN_MODE', 'DEFERRED')  # read->write paths use write_transaction (IMMEDIATE)
+    # Server databases (PostgreSQL, MySQL): connection pool per worker process
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds, below server idle timeouts
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # Compression of large text columns (document content, page text, job results) in SQLite
+    CONTENT_COMPRESSION = os.environ.get('CONTENT_COMPRESSION', 'zlib')  # zlib, zstd (needs zstandard) or none
+    CONTENT_COMPRESSION_MIN_BYTES = int(os.environ.get('CONTENT_COMPRESSION_MIN_BYTES', 1024))
+    CONTENT_COMPRESSION_LEVEL = int(os.environ.get('CONTENT_COMPRESSION_LEVEL', 6))
     
     # File upload configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads'))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "pdf", "tiff", "bmp"}
     
+    # Document listing (keyset pagination)
+    DOCUMENTS_PAGE_SIZE = int(os.environ.get('DOCUMENTS_PAGE_SIZE', 50))
+    DOCUMENTS_MAX_PAGE_SIZE = int(os.environ.get('DOCUMENTS_MAX_PAGE_SIZE', 500))
+    
+    # Full-text search (SQLite FTS5)
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+    SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', 100))
+    
+    # Page-level document storage
+    PAGES_MAX_RANGE = int(os.environ.get('PAGES_MAX_RANGE', 100))
+    
     # OCR configuration
     TESSERACT_PATH = os.environ.get('TESSERACT_PATH', None)
     
@@ -30,6 +56,101 @@ class Config:
     YANDEX_VISION_URL = 'https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze'
     YANDEX_GPT_URL = 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion'
     YANDEX_GPT_MODEL = f"gpt://{YANDEX_FOLDER_ID}/yandexgpt-lite"
+    YANDEX_GPT_LARGE_MODEL = os.environ.get('YANDEX_GPT_LARGE_MODEL', f"gpt://{YANDEX_FOLDER_ID}/yandexgpt/latest")
+    
+    # HTTP connection pools for Yandex Cloud APIs
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))  # keep-alive connections per upstream host
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 60))
+    YANDEX_GPT_READ_TIMEOUT = float(os.environ.get('YANDEX_GPT_READ_TIMEOUT', 120))
+    YANDEX_IAM_READ_TIMEOUT = float(os.environ.get('YANDEX_IAM_READ_TIMEOUT', 15))
+    
+    # Client-side throttling and retries (429/5xx) for Yandex upstreams
+    YANDEX_VISION_RPS = float(os.environ.get('YANDEX_VISION_RPS', 10))  # requests per second, sized to the quota
+    YANDEX_VISION_MAX_CONCURRENCY = int(os.environ.get('YANDEX_VISION_MAX_CONCURRENCY', 10))
+    YANDEX_GPT_RPS = float(os.environ.get('YANDEX_GPT_RPS', 10))
+    YANDEX_GPT_MAX_CONCURRENCY = int(os.environ.get('YANDEX_GPT_MAX_CONCURRENCY', 10))
+    YANDEX_IAM_RPS = float(os.environ.get('YANDEX_IAM_RPS', 5))
+    YANDEX_IAM_MAX_CONCURRENCY = int(os.environ.get('YANDEX_IAM_MAX_CONCURRENCY', 2))
+    HTTP_RETRY_DEADLINE = float(os.environ.get('HTTP_RETRY_DEADLINE', 30))  # total seconds spent waiting and retrying
+    HTTP_RETRY_MAX_ATTEMPTS = int(os.environ.get('HTTP_RETRY_MAX_ATTEMPTS', 5))
+    HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.5))
+    HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', 8))
+    
+    # OCR batching: limits of a single Vision batchAnalyze request
+    OCR_BATCH_MAX_IMAGES = int(os.environ.get('OCR_BATCH_MAX_IMAGES', 8))
+    OCR_BATCH_MAX_BYTES = int(os.environ.get('OCR_BATCH_MAX_BYTES', 10 * 1024 * 1024))  # base64 payload size
+    
+    # Image preprocessing before OCR upload
+    OCR_PREPROCESS_ENABLED = os.environ.get('OCR_PREPROCESS_ENABLED', 'true').lower() == 'true'
+    OCR_GRAYSCALE = os.environ.get('OCR_GRAYSCALE', 'true').lower() == 'true'
+    OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 300))
+    OCR_MAX_MEGAPIXELS = float(os.environ.get('OCR_MAX_MEGAPIXELS', 20))
+    OCR_JPEG_QUALITY = int(os.environ.get('OCR_JPEG_QUALITY', 90))
+    OCR_DESKEW = os.environ.get('OCR_DESKEW', 'false').lower() == 'true'
+    
+    # PDF ingestion
+    PDF_OCR_WORKERS = int(os.environ.get('PDF_OCR_WORKERS', 4))  # parallel OCR requests per document
+    PDF_RASTER_DPI = int(os.environ.get('PDF_RASTER_DPI', 200))
+    PDF_MIN_TEXT_CHARS = int(os.environ.get('PDF_MIN_TEXT_CHARS', 20))  # shorter text layers are OCR'd
+    
+    # Long documents: map-reduce explanation under the model context budget
+    GPT_CHARS_PER_TOKEN = float(os.environ.get('GPT_CHARS_PER_TOKEN', 3))  # conservative estimate for Russian text
+    GPT_CHUNK_TOKENS = int(os.environ.get('GPT_CHUNK_TOKENS', 6000))  # prompt budget per request
+    GPT_MAP_MAX_TOKENS = int(os.environ.get('GPT_MAP_MAX_TOKENS', 1000))  # length of each partial explanation
+    GPT_MAP_WORKERS = int(os.environ.get('GPT_MAP_WORKERS', 4))  # chunks explained in parallel
+    
+    GPT_BATCH_MAX_TASKS = int(os.environ.get('GPT_BATCH_MAX_TASKS', 10))  # tasks in one /study-pack request
+    
+    # Token accounting and per-session budgets for YandexGPT
+    GPT_USAGE_TRACKING = os.environ.get('GPT_USAGE_TRACKING', 'true').lower() == 'true'
+    GPT_SESSION_TOKEN_BUDGET = int(os.environ.get('GPT_SESSION_TOKEN_BUDGET', 0))  # tokens per window, 0 = unlimited
+    GPT_BUDGET_WINDOW = int(os.environ.get('GPT_BUDGET_WINDOW', 24 * 3600))  # seconds
+    GPT_MAX_PROMPT_TOKENS = int(os.environ.get('GPT_MAX_PROMPT_TOKENS', 6000))  # longer material is truncated before sending
+    
+    # Per-call model routing between yandexgpt-lite and the larger model
+    GPT_ROUTING_ENABLED = os.environ.get('GPT_ROUTING_ENABLED', 'true').lower() == 'true'
+    GPT_ROUTER_LARGE_TASKS = os.environ.get('GPT_ROUTER_LARGE_TASKS', '')  # e.g. 'explain,examples'; empty = lite for every task
+    GPT_ROUTER_LARGE_MAX_PROMPT_TOKENS = int(os.environ.get('GPT_ROUTER_LARGE_MAX_PROMPT_TOKENS', 3000))  # longer prompts go to lite
+    GPT_ROUTER_SLO_P95 = float(os.environ.get('GPT_ROUTER_SLO_P95', 20))  # seconds; above it the larger model is bypassed
+    GPT_ROUTER_LATENCY_WINDOW = float(os.environ.get('GPT_ROUTER_LATENCY_WINDOW', 300))  # seconds of samples behind p95
+    GPT_ROUTER_MIN_SAMPLES = int(os.environ.get('GPT_ROUTER_MIN_SAMPLES', 10))
+    
+    # Coalescing of identical in-flight OCR/GPT requests (threads + SQLite lease across workers)
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_LEASE_SECONDS = float(os.environ.get('SINGLE_FLIGHT_LEASE_SECONDS', 180))
+    SINGLE_FLIGHT_POLL_INTERVAL = float(os.environ.get('SINGLE_FLIGHT_POLL_INTERVAL', 0.2))
+    
+    # Passage retrieval for /ask (BM25 over paragraph chunks)
+    RETRIEVAL_PASSAGE_TOKENS = int(os.environ.get('RETRIEVAL_PASSAGE_TOKENS', 300))
+    RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 4))
+    RETRIEVAL_INDEX_CACHE_SIZE = int(os.environ.get('RETRIEVAL_INDEX_CACHE_SIZE', 64))  # indexes kept in memory
+    
+    # Result caches: in-memory LRU tier + SQLite tier shared by all workers
+    CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'results.db'))
+    OCR_CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+    OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 512))
+    OCR_CACHE_MAX_DISK_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_DISK_ENTRIES', 100000))
+    GPT_CACHE_ENABLED = os.environ.get('GPT_CACHE_ENABLED', 'true').lower() == 'true'
+    GPT_CACHE_MAX_ENTRIES = int(os.environ.get('GPT_CACHE_MAX_ENTRIES', 256))
+    GPT_CACHE_MAX_DISK_ENTRIES = int(os.environ.get('GPT_CACHE_MAX_DISK_ENTRIES', 20000))
+    GPT_CACHE_TTL = float(os.environ.get('GPT_CACHE_TTL', 7 * 24 * 3600))  # seconds
+    GPT_CACHE_MAX_TEMPERATURE = float(os.environ.get('GPT_CACHE_MAX_TEMPERATURE', 0.3))  # hotter completions are not cached
+    GPT_CACHE_EXPLANATIONS = os.environ.get('GPT_CACHE_EXPLANATIONS', 'false').lower() == 'true'  # explain_content opt-in
+    
+    # Background jobs (upload -> OCR -> GPT pipeline)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # worker threads per process
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 600))  # running jobs without progress are requeued
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    
+    # Fair per-session scheduling of upstream calls
+    SCHEDULER_OCR_CONCURRENCY = int(os.environ.get('SCHEDULER_OCR_CONCURRENCY', 8))  # in-flight Vision requests per process
+    SCHEDULER_OCR_SESSION_CONCURRENCY = int(os.environ.get('SCHEDULER_OCR_SESSION_CONCURRENCY', 4))
+    SCHEDULER_GPT_CONCURRENCY = int(os.environ.get('SCHEDULER_GPT_CONCURRENCY', 16))  # a full study pack leaves room for others
+    # A full study pack (GPT_BATCH_MAX_TASKS) runs in one wave, not several
+    SCHEDULER_GPT_SESSION_CONCURRENCY = max(int(os.environ.get('SCHEDULER_GPT_SESSION_CONCURRENCY', GPT_BATCH_MAX_TASKS)),
+                                            GPT_BATCH_MAX_TASKS)
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -0,0 +1,161 @@
+import zlib
+import logging
+from sqlalchemy import Text, text
+from sqlalchemy.types import TypeDecorator
+from app.config import Config
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен, по умолчанию используется zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Сжатое значение хранится как BLOB: маркер формата и сжатые байты UTF-8.
+# Несжатые значения (короткие и записанные до включения сжатия) остаются TEXT,
+# поэтому столбец можно читать без миграции.
+ZLIB_MARKER = b'\x00zl1'
+ZSTD_MARKER = b'\x00zs1'
+CODECS = ('zlib', 'zstd', 'none')
+
+def _codec(name):
+    if name == 'zstd' and zstandard is None:
+        logger.warning('Пакет zstandard не установлен, для сжатия используется zlib')
+        return 'zlib'
+    return name
+
+def compress_text(value, codec=None, min_bytes=None, level=None):
+    """
+    Сжимает строку, если она не короче порога и сжатие уменьшает размер
+
+    Args:
+        value (str): Строка
+        codec (str, optional): zlib, zstd или none (по умолчанию Config.CONTENT_COMPRESSION)
+        min_bytes (int, optional): Минимальный размер в байтах UTF-8 для сжатия
+        level (int, optional): Уровень сжатия
+
+    Returns:
+        str или bytes: Исходная строка или маркер формата со сжатыми данными
+    """
+    if not isinstance(value, str):
+        return value
+    codec = _codec(codec or Config.CONTENT_COMPRESSION)
+    if codec == 'none':
+        return value
+    raw = value.encode('utf-8')
+    if len(raw) < (Config.CONTENT_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes):
+        return value
+    level = Config.CONTENT_COMPRESSION_LEVEL if level is None else level
+    if codec == 'zstd':
+        packed = ZSTD_MARKER + zstandard.ZstdCompressor(level=level).compress(raw)
+    else:
+        packed = ZLIB_MARKER + zlib.compress(raw, level)
+    return packed if len(packed) < len(raw) else value
+
+def decompress_text(value):
+    """
+    Восстанавливает строку, сохраненную compress_text
+
+    Несжатые строки и None возвращаются без изменений. Используется и как
+    функция SQL decompress_text в SQLite (см. app.database.db).
+    """
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    marker, data = value[:len(ZLIB_MARKER)], value[len(ZLIB_MARKER):]
+    if marker == ZLIB_MARKER:
+        return zlib.decompress(data).decode('utf-8')
+    if marker == ZSTD_MARKER:
+        if zstandard is None:
+            raise RuntimeError('Значение сжато zstd: установите пакет zstandard')
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    # BLOB без маркера - текст, записанный как байты
+    return value.decode('utf-8')
+
+class CompressedText(TypeDecorator):
+    """
+    Текстовый столбец с прозрачным сжатием больших значений
+
+    Сжатие применяется только в SQLite: PostgreSQL и MySQL сами сжимают
+    большие значения (TOAST, InnoDB), а хранение байтов в столбце TEXT
+    для них недопустимо.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != 'sqlite':
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+def compress_column(engine, table, column, batch_size=200, codec=None, on_batch=None):
+    """
+    Сжимает уже сохраненные несжатые значения столбца
+
+    Строки обрабатываются пакетами по возрастанию rowid, каждый пакет
+    фиксируется отдельной транзакцией: прерванную миграцию можно запустить
+    снова, а приложение продолжает работать с базой. Значения, которые
+    сжатие не уменьшает, остаются как есть.
+
+    Args:
+        engine: Engine SQLAlchemy (SQLite)
+        table (str): Таблица
+        column (str): Столбец типа CompressedText
+        batch_size (int): Строк в одной транзакции
+        codec (str, optional): zlib, zstd или none (по умолчанию из настроек)
+        on_batch (callable, optional): Вызывается как on_batch(просмотрено, сжато, последний rowid)
+
+    Returns:
+        tuple: Число просмотренных и сжатых значений
+    """
+    if engine.dialect.name != 'sqlite':
+        raise RuntimeError('Сжатие содержимого поддерживается только для SQLite')
+    scanned = compressed = 0
+    last_rowid = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                f'SELECT rowid, {column} FROM {table} WHERE rowid > :last_rowid '
+                f"AND typeof({column}) = 'text' ORDER BY rowid LIMIT :batch_size"
+            ), {'last_rowid': last_rowid, 'batch_size': batch_size}).all()
+            if not rows:
+                break
+            updates = []
+            for rowid, value in rows:
+                packed = compress_text(value, codec=codec)
+                if isinstance(packed, bytes):
+                    updates.append({'rowid': rowid, 'value': packed})
+            if updates:
+                connection.execute(text(f'UPDATE {table} SET {column} = :value WHERE rowid = :rowid'), updates)
+        scanned += len(rows)
+        compressed += len(updates)
+        last_rowid = rows[-1][0]
+        if on_batch:
+            on_batch(scanned, compressed, last_rowid)
+    return scanned, compressed
+
+def storage_report(engine, table, column):
+    """
+    Размер столбца до и после сжатия
+
+    Returns:
+        dict: rows, compressed_rows, raw_bytes (текст в UTF-8), stored_bytes и ratio
+    """
+    with engine.connect() as connection:
+        row = connection.execute(text(
+            f"SELECT count({column}), sum(typeof({column}) = 'blob'), "
+            f'coalesce(sum(length(CAST(decompress_text({column}) AS BLOB))), 0), '
+            f'coalesce(sum(length(CAST({column} AS BLOB))), 0) FROM {table}'
+        )).one()
+    rows, compressed_rows, raw_bytes, stored_bytes = row
+    return {
+        'rows': rows,
+        'compressed_rows': compressed_rows or 0,
+        'raw_bytes': raw_bytes,
+        'stored_bytes': stored_bytes,
+        'ratio': round(raw_bytes / stored_bytes, 2) if stored_bytes else None
+    }
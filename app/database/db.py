@@ -1,17 +1,129 @@
-from sqlalchemy import create_engine
+import os
+import sqlite3
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 from app.config import Config
+from app.database.compression import decompress_text
 
 Base = declarative_base()
 
-engine = create_engine(Config.DATABASE_URI)
+@event.listens_for(Engine, 'connect')
+def register_sqlite_functions(dbapi_connection, connection_record):
+    # Триггеры полнотекстового индекса читают сжатый столбец content через
+    # decompress_text, поэтому функция нужна каждому соединению SQLite
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('decompress_text', 1, decompress_text, deterministic=True)
+
+def create_db_engine(uri=None, **options):
+    """
+    Создает engine с настройками для работы нескольких воркеров
+
+    Для SQLite включается журнал WAL (читатели не блокируют писателя),
+    ожидание блокировки вместо немедленной ошибки "database is locked" и
+    уровень synchronous. Транзакции начинаются явной командой BEGIN
+    (по умолчанию DEFERRED), а не неявно драйвером sqlite3; транзакции
+    "чтение -> запись" открываются через write_transaction. Для серверных
+    СУБД настраиваются размер пула, проверка соединений и их пересоздание.
+
+    Args:
+        uri (str, optional): Строка подключения (по умолчанию Config.DATABASE_URI)
+        **options: Дополнительные аргументы create_engine
+
+    Returns:
+        Engine: Настроенный engine SQLAlchemy
+    """
+    url = make_url(uri or Config.DATABASE_URI)
+    if url.get_backend_name() != 'sqlite':
+        options.setdefault('pool_size', Config.DB_POOL_SIZE)
+        options.setdefault('max_overflow', Config.DB_MAX_OVERFLOW)
+        options.setdefault('pool_timeout', Config.DB_POOL_TIMEOUT)
+        options.setdefault('pool_recycle', Config.DB_POOL_RECYCLE)
+        options.setdefault('pool_pre_ping', Config.DB_POOL_PRE_PING)
+        return create_engine(url, **options)
+
+    connect_args = options.pop('connect_args', {})
+    connect_args.setdefault('timeout', Config.DB_SQLITE_BUSY_TIMEOUT)
+    # Соединения пула используются разными потоками (фоновые задачи, потоки запросов)
+    connect_args.setdefault('check_same_thread', False)
+    engine = create_engine(url, connect_args=connect_args, **options)
+    in_memory = url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Транзакциями управляет событие begin ниже
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={Config.DB_SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA busy_timeout={int(Config.DB_SQLITE_BUSY_TIMEOUT * 1000)}')
+        cursor.execute(f'PRAGMA cache_size=-{Config.DB_SQLITE_CACHE_KB}')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin_sqlite_transaction(connection):
+        # Читающие транзакции (DEFERRED) не берут блокировку записи и не мешают
+        # писателям других соединений; режим IMMEDIATE задает write_transaction
+        mode = connection.get_execution_options().get('sqlite_begin_mode', Config.DB_SQLITE_BEGIN_MODE)
+        connection.exec_driver_sql(f'BEGIN {mode}')
+
+    return engine
+
+engine = create_db_engine()
 db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
+if hasattr(os, 'register_at_fork'):
+    # Соединения, открытые до fork (gunicorn --preload), не должны использоваться воркерами
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+@contextmanager
+def write_transaction(session):
+    """
+    Транзакция "чтение -> запись" с блокировкой записи SQLite с самого начала
+
+    В режиме WAL транзакция DEFERRED, прочитавшая данные, при первой записи
+    получает SQLITE_BUSY без ожидания busy_timeout, если другое соединение
+    успело записать. BEGIN IMMEDIATE сразу ждет блокировку записи, поэтому
+    такие транзакции (захват задачи, сохранение страницы, обновление стадии)
+    выполняются через этот контекст. Открытая читающая транзакция сессии
+    предварительно фиксируется. Для других СУБД режим BEGIN не меняется.
+
+    Args:
+        session: Сессия SQLAlchemy (Session или scoped_session)
+
+    Yields:
+        Сессия; транзакция фиксируется при выходе или откатывается при ошибке
+    """
+    if isinstance(session, scoped_session):
+        session = session()
+    if session.in_transaction():
+        session.commit()
+    session.connection(execution_options={'sqlite_begin_mode': 'IMMEDIATE'})
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
 def init_db():
     # Import all modules that define models
     from app.models.document import Document
+    from app.models.job import Job
+    from app.models.document_index import DocumentIndex
+    from app.models.token_usage import TokenUsage
+    from app.models.document_page import DocumentPage
     Base.metadata.create_all(bind=engine)
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    from app.services.search_service import init_search_index
+    init_search_index(engine)
 
 def get_db():
     try:
@@ -1,20 +1,34 @@
 import io
 import os
 import uuid
-from flask import Flask, request, jsonify, send_file, render_template, Blueprint, session, current_app
+from flask import Flask, request, jsonify, send_file, render_template, Blueprint, session, current_app, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from app.models.document import Document
+from app.models.document_page import DocumentPage
 from app.services.ocr_service import OCRService
 from app.services.file_service import FileService
+from app.services.pipeline_service import (REPROCESS_MODES, NO_TEXT_MESSAGE, count_pages, create_document,
+                                           process_pages, store_content)
+from app.services.job_service import job_service
+from app.services.retrieval_service import retrieval_service
+from app.services.document_service import stream_document_page, parse_fields, decode_cursor, get_page_range, get_page_summary, assemble_content
+from app.services.search_service import SearchService, is_supported as search_supported
+from app.services.usage_service import TokenBudgetExceeded
+from app.services.model_router import get_model_router
 from app.services.log_service import LogService
-from app.database.db import init_db, db_session, get_db
+from app.database.db import init_db, db_session, get_db, engine, write_transaction
 from app.config import Config
+from app.utils.token_manager import get_token
+from app.utils.sse import sse_response, sse_stream, iterate_async
 from flask import Blueprint
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 
+# Маршруты приложения, которое создает create_app (run.py)
+main_bp = Blueprint('main', __name__)
+
 # Initialize services
 file_service = FileService()
 log_service = LogService()
@@ -22,35 +36,61 @@ log_service = LogService()
 # Initialize database
 init_db()
 
-# Function to get fresh OCR service with valid token
+# Function to get OCR service backed by the shared IAM token cache
 def get_ocr_service():
     try:
-        oauth_token = os.environ.get('YANDEX_OAUTH_TOKEN')
-        if not oauth_token:
-            log_service.error('YANDEX_OAUTH_TOKEN не настроен в переменных окружения')
-            raise ValueError("YANDEX_OAUTH_TOKEN не настроен")
-        
-        # Generate a fresh IAM token using OAuth token
-        iam_token = OCRService.get_iam_token(oauth_token)
-        # Return a new OCR service instance with the fresh token
-        return OCRService(Config.YANDEX_FOLDER_ID, iam_token)
+        # Токен берется из общего менеджера: обмен OAuth -> IAM выполняется
+        # только при истечении срока действия, а не на каждую загрузку
+        get_token()
+        return OCRService(Config.YANDEX_FOLDER_ID, session_id=session.get('session_id'))
     except Exception as e:
         log_service.error(f'Ошибка при получении IAM токена: {str(e)}')
         raise
 
-@app.before_request
+# Function to get GPT service sharing the same IAM token source as OCR
+def get_gpt_service(document_id=None):
+    from app.services.gpt_service import GPTService
+    # Токены учитываются по сессии, маршруту и документу запроса
+    return GPTService(
+        gpt_url=current_app.config['YANDEX_GPT_URL'],
+        folder_id=current_app.config['YANDEX_FOLDER_ID'],
+        model_uri=current_app.config['YANDEX_GPT_MODEL'],
+        session_id=session.get('session_id'),
+        endpoint=request.endpoint,
+        document_id=document_id,
+        router=get_model_router()
+    )
+
+@main_bp.before_app_request
 def create_session():
     """
     Создает сессию для пользователя, если она еще не создана,
     и генерирует уникальный идентификатор сессии
+
+    Выполняется для всех запросов приложения, в котором зарегистрирован
+    main_bp: идентификатор сессии нужен планировщику запросов, бюджету
+    токенов и проверке владельца фоновой задачи.
+    """
+    ensure_session_id()
+
+def ensure_session_id():
+    """
+    Идентификатор сессии пользователя (создается при отсутствии)
+
+    Returns:
+        str: Идентификатор сессии
     """
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
+    return session['session_id']
 
-@app.teardown_appcontext
+@main_bp.teardown_app_request
 def shutdown_session(exception=None):
     db_session.remove()
 
+app.before_request(create_session)
+app.teardown_appcontext(shutdown_session)
+
 @app.route('/api/documents', methods=['POST'])
 def upload_document():
     session_id = session.get('session_id')
@@ -67,55 +107,85 @@ def upload_document():
 
     # Save file and get file path
     log_service.info(f'Сохранение файла {file.filename}', session_id)
-    file_path = file_service.save_file(file)
+    upload = file_service.spool_upload(file)
+    file_path = upload.file_path if upload else None
     if not file_path:
         log_service.error('Ошибка сохранения файла', session_id)
         return jsonify({'error': 'Error saving file'}), 500
 
     file_type = file_service.get_file_type(file.filename)
-    content = None
-    
-    # Process file based on type
-    if file_type in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
-        # For images, perform OCR with fresh token
-        log_service.info('Начало OCR обработки изображения', session_id)
+    title = os.path.basename(file.filename)
+
+    if file_type in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp', '.pdf']:
+        # Документ создается до распознавания, каждая страница сохраняется
+        # сразу после обработки; ошибка OCR отмечает страницу как failed
+        log_service.info('Начало постраничной обработки документа', session_id)
         try:
-            # Get a fresh OCR service instance
             ocr_service = get_ocr_service()
-            with open(file_path, 'rb') as f:
-                content = ocr_service.process_image(f.read())
-            log_service.success('OCR обработка завершена успешно', session_id)
+            total = count_pages(file_path)
         except Exception as e:
-            log_service.error(f'Ошибка OCR обработки: {str(e)}', session_id)
-            return jsonify({'error': f'OCR error: {str(e)}'}), 500
-    elif file_type in ['.txt', '.pdf', '.docx']:
-        # For text documents, add appropriate handling here
-        log_service.info('Извлечение текста из документа', session_id)
-        content = "Text extracted from document"
-
-    # Create document record
-    log_service.info('Создание записи в базе данных', session_id)
-    document = Document(
-        title=os.path.basename(file.filename),
-        content=content,
-        file_path=file_path,
-        file_type=file_type,
-    )
-
-    # Save to database
-    db_session.add(document)
-    db_session.commit()
+            log_service.error(f'Ошибка подготовки обработки: {str(e)}', session_id)
+            return jsonify({'error': f'Processing error: {str(e)}'}), 500
+        document_uuid = create_document(file_path, title, file_type)
+        try:
+            _, failed = process_pages(document_uuid, file_path, ocr_service, list(range(1, total + 1)),
+                                      session_id, digest=upload.sha256)
+            content = assemble_content(db_session, document_uuid) or NO_TEXT_MESSAGE
+            store_content(document_uuid, content)
+        except Exception as e:
+            log_service.error(f'Ошибка обработки документа {document_uuid}: {str(e)}', session_id)
+            return jsonify({'error': f'Processing error: {str(e)}', 'document_id': document_uuid}), 500
+        if failed:
+            log_service.warning(f'Не распознаны страницы: {failed}', session_id)
+        else:
+            log_service.success('Текст документа извлечен', session_id)
+    else:
+        content = None
+        if file_type in ['.txt', '.docx']:
+            # For text documents, add appropriate handling here
+            log_service.info('Извлечение текста из документа', session_id)
+            content = "Text extracted from document"
+        log_service.info('Создание записи в базе данных', session_id)
+        document_uuid = create_document(file_path, title, file_type, content=content)
+        if content:
+            retrieval_service.build_index(document_uuid, content)
     log_service.success('Документ успешно создан и сохранен', session_id)
 
+    document = db_session.query(Document).filter_by(uuid=document_uuid).one()
     return jsonify(document.to_dict()), 201
 
-@app.route('/api/documents', methods=['GET'])
+@main_bp.route('/api/documents', methods=['GET'])
 def get_documents():
     session_id = session.get('session_id')
     log_service.info('Получен запрос на список документов', session_id)
-    documents = db_session.query(Document).all()
-    log_service.info(f'Найдено {len(documents)} документов', session_id)
-    return jsonify([doc.to_dict() for doc in documents])
+    # Страница документов без текста; content и другие поля - по параметру fields
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        cursor = request.args.get('cursor')
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        log_service.error(f'Некорректный запрос списка документов: {str(e)}', session_id)
+        return jsonify({'error': str(e)}), 400
+    limit = min(max(request.args.get('limit', Config.DOCUMENTS_PAGE_SIZE, type=int), 1), Config.DOCUMENTS_MAX_PAGE_SIZE)
+    chunks = stream_document_page(db_session, fields=fields, limit=limit, cursor=cursor)
+    return Response(stream_with_context(chunks), mimetype='application/json')
+
+@main_bp.route('/api/documents/search', methods=['GET'])
+def search_documents():
+    """Полнотекстовый поиск документов: ранжированные результаты с фрагментами текста"""
+    session_id = session.get('session_id')
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Необходимо указать поисковый запрос (q)'}), 400
+    if not search_supported(engine):
+        return jsonify({'error': 'Полнотекстовый поиск недоступен для этой базы данных'}), 501
+    limit = min(max(request.args.get('limit', Config.SEARCH_PAGE_SIZE, type=int), 1), Config.SEARCH_MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    log_service.info(f'Поиск документов: "{query[:50]}"', session_id)
+    result = SearchService(db_session).search(query, limit=limit, offset=offset)
+    log_service.info(f'Найдено документов на странице: {len(result["results"])}', session_id)
+    return jsonify(result)
 
 @app.route('/api/documents/<uuid>', methods=['GET'])
 def get_document(uuid):
@@ -128,6 +198,59 @@ def get_document(uuid):
     log_service.success('Документ найден и возвращен', session_id)
     return jsonify(document.to_dict())
 
+@main_bp.route('/api/documents/<uuid>/pages', methods=['GET'])
+def get_document_pages(uuid):
+    """Страницы документа в диапазоне start..end без загрузки всего текста"""
+    session_id = session.get('session_id')
+    if db_session.query(Document.id).filter_by(uuid=uuid).first() is None:
+        return jsonify({'error': 'Document not found'}), 404
+    start = max(request.args.get('start', 1, type=int), 1)
+    end = request.args.get('end', start + Config.PAGES_MAX_RANGE - 1, type=int)
+    if end < start:
+        return jsonify({'error': 'end должен быть не меньше start'}), 400
+    end = min(end, start + Config.PAGES_MAX_RANGE - 1)
+    include_text = request.args.get('text', '1') != '0'
+    log_service.info(f'Запрос страниц {start}-{end} документа {uuid}', session_id)
+    return jsonify({
+        'document_id': uuid,
+        'start': start,
+        'end': end,
+        'pages': get_page_range(db_session, uuid, start, end, include_text=include_text),
+        'status': get_page_summary(db_session, uuid)
+    })
+
+@main_bp.route('/api/documents/<uuid>/pages/<int:page_number>', methods=['GET'])
+def get_document_page(uuid, page_number):
+    page = db_session.query(DocumentPage).filter_by(document_uuid=uuid, page_number=page_number).first()
+    if not page:
+        return jsonify({'error': 'Page not found'}), 404
+    return jsonify(page.to_dict())
+
+@main_bp.route('/api/documents/<uuid>/reprocess', methods=['POST'])
+def reprocess_document(uuid):
+    """Повторное распознавание страниц с ошибками, устаревших или выбранных страниц в фоне"""
+    # Задача доступна только сессии, которая ее поставила
+    session_id = ensure_session_id()
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'failed')
+    pages = data.get('pages')
+    if mode not in REPROCESS_MODES:
+        return jsonify({'error': f"Недопустимый режим: {mode}. Допустимы: {', '.join(REPROCESS_MODES)}"}), 400
+    if pages is not None and (not isinstance(pages, list) or not all(isinstance(number, int) for number in pages)):
+        return jsonify({'error': 'pages должен быть списком номеров страниц'}), 400
+    document = db_session.query(Document).filter_by(uuid=uuid).first()
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+    if not document.file_path or not os.path.exists(document.file_path):
+        return jsonify({'error': 'Исходный файл документа недоступен'}), 409
+    job_id = job_service.submit('reprocess', {'document_id': uuid, 'mode': mode, 'pages': pages}, session_id=session_id)
+    log_service.info(f'Документ {uuid} поставлен в очередь повторной обработки ({mode}), задача {job_id}', session_id)
+    return jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}'
+    }), 202
+
 @app.route('/api/documents/<uuid>/download', methods=['GET'])
 def download_document(uuid):
     session_id = session.get('session_id')
@@ -157,8 +280,10 @@ def delete_document(uuid):
 
     # Delete from database
     log_service.info('Удаление документа из базы данных', session_id)
-    db_session.delete(document)
-    db_session.commit()
+    with write_transaction(db_session):
+        retrieval_service.delete_index(uuid)
+        db_session.query(DocumentPage).filter_by(document_uuid=uuid).delete(synchronize_session=False)
+        db_session.delete(document)
     log_service.success('Документ успешно удален', session_id)
 
     return jsonify({'message': 'Document deleted successfully'})
@@ -186,8 +311,6 @@ def clear_logs():
     log_service.clear_logs(session_id=session_id)
     return jsonify({'status': 'success'})
 
-main_bp = Blueprint('main', __name__)
-
 @main_bp.route('/')
 def index():
     session_id = session.get('session_id')
@@ -196,7 +319,8 @@ def index():
 
 @main_bp.route('/upload', methods=['POST'])
 def upload_file():
-    session_id = session.get('session_id')
+    # Задача доступна только сессии, которая ее поставила
+    session_id = ensure_session_id()
     log_service.info('Начало обработки загрузки файла', session_id)
     
     try:
@@ -231,76 +355,24 @@ def upload_file():
             
             filepath = os.path.join(upload_folder, filename)
             log_service.info(f'Сохранение файла по пути: {filepath}', session_id)
-            file.save(filepath)
+            upload = file_service.spool_upload(file, filepath)
             log_service.success(f'Файл сохранен: {filepath}', session_id)
             
-            try:
-                # Инициализация OCR сервиса с новым токеном
-                log_service.info('Инициализация сервиса OCR', session_id)
-                try:
-                    ocr_service = get_ocr_service()
-                except Exception as token_error:
-                    log_service.error(f'Ошибка при получении IAM токена: {str(token_error)}', session_id)
-                    return jsonify({'error': f'Ошибка аутентификации: {str(token_error)}'}), 401
-                
-                # Распознавание текста
-                log_service.info('Начало распознавания текста (OCR)', session_id)
-                with open(filepath, "rb") as image_file:
-                    image_data = image_file.read()
-                
-                extracted_text = ocr_service.process_image(image_data)
-                if not extracted_text:
-                    log_service.warning('Не удалось распознать текст в изображении', session_id)
-                    extracted_text = "Не удалось распознать текст. Пожалуйста, загрузите изображение лучшего качества."
-                else:
-                    log_service.success('Текст успешно распознан', session_id)
-                
-                # Создание документа
-                log_service.info('Создание документа', session_id)
-                document = Document(
-                    title=filename,
-                    content=extracted_text,
-                    file_path=filepath
-                )
-                
-                # Проверка наличия необходимых конфигураций для GPT-сервиса
-                required_configs = ['YANDEX_GPT_URL', 'YANDEX_FOLDER_ID', 'YANDEX_IAM_TOKEN', 'YANDEX_GPT_MODEL']
-                missing_configs = [config for config in required_configs if not current_app.config.get(config)]
-                
-                if missing_configs:
-                    log_service.warning(f'Отсутствуют необходимые конфигурации GPT: {", ".join(missing_configs)}', session_id)
-                    explanation = "Объяснение недоступно. Пожалуйста, настройте необходимые параметры GPT-сервиса."
-                else:
-                    # Генерация объяснения через GPT-сервис
-                    try:
-                        from app.services.gpt_service import GPTService
-                        log_service.info('Инициализация сервиса GPT', session_id)
-                        gpt_service = GPTService(
-                            gpt_url=current_app.config['YANDEX_GPT_URL'],
-                            folder_id=current_app.config['YANDEX_FOLDER_ID'],
-                            iam_token=current_app.config['YANDEX_IAM_TOKEN'],
-                            model_uri=current_app.config['YANDEX_GPT_MODEL']
-                        )
-                        
-                        log_service.info('Запрос объяснения от YandexGPT', session_id)
-                        explanation = gpt_service.explain_content(extracted_text)
-                        log_service.success('Получено объяснение от YandexGPT', session_id)
-                    except Exception as gpt_error:
-                        log_service.error(f'Ошибка при работе с GPT: {str(gpt_error)}', session_id)
-                        explanation = f"Не удалось получить объяснение: {str(gpt_error)}"
-                
-                return jsonify({
-                    'status': 'success',
-                    'extracted_text': extracted_text,
-                    'explanation': explanation,
-                    'document_id': getattr(document, 'id', None)
-                })
-            except Exception as e:
-                log_service.error(f'Ошибка при обработке файла: {str(e)}', session_id)
-                import traceback
-                error_details = traceback.format_exc()
-                log_service.error(f'Детали ошибки: {error_details}', session_id)
-                return jsonify({'error': str(e), 'details': error_details}), 500
+            # OCR и объяснение выполняются в фоне; клиент опрашивает статус задачи
+            # При stream=1 клиент получит объяснение потоком через /explain/stream
+            job_id = job_service.submit('upload', {
+                'file_path': filepath,
+                'filename': filename,
+                'sha256': upload.sha256,
+                'explain': request.form.get('stream') != '1'
+            }, session_id=session_id)
+            log_service.info(f'Файл поставлен в очередь обработки, задача {job_id}', session_id)
+            
+            return jsonify({
+                'status': 'queued',
+                'job_id': job_id,
+                'status_url': f'/api/jobs/{job_id}'
+            }), 202
         else:
             log_service.error(f'Недопустимый формат файла: {file.filename}', session_id)
             return jsonify({'error': f'Недопустимый формат файла. Разрешены только: {", ".join(allowed_extensions)}'}), 400
@@ -311,6 +383,29 @@ def upload_file():
         log_service.error(f'Детали критической ошибки: {error_details}', session_id)
         return jsonify({'error': 'Внутренняя ошибка сервера', 'details': str(outer_e)}), 500
 
+def select_question_context(data, session_id=None):
+    """
+    Текст, передаваемый GPT вместе с вопросом
+    
+    Если указан document_id, вместо всего текста отправляются только
+    фрагменты документа, найденные поисковым индексом.
+    """
+    document_id = data.get('document_id')
+    if not document_id:
+        return data['text']
+    if db_session.query(Document.id).filter_by(uuid=document_id).first() is None:
+        return data['text']
+
+    def load_content():
+        # Полный текст распаковывается, только если индекс еще не построен
+        return db_session.query(Document.content).filter_by(uuid=document_id).scalar()
+
+    context = retrieval_service.select_context(document_id, load_content, data['question'])
+    if not context:
+        return data['text']
+    log_service.info(f'Выбраны фрагменты документа: {len(context)} символов', session_id)
+    return context
+
 @main_bp.route('/ask', methods=['POST'])
 def ask_question():
     """Обработка вопроса по содержанию"""
@@ -325,23 +420,120 @@ def ask_question():
     log_service.info(f'Обработка вопроса: "{data["question"][:50]}..."', session_id)
     
     try:
-        from app.services.gpt_service import GPTService
-        gpt_service = GPTService(
-            gpt_url=current_app.config['YANDEX_GPT_URL'],
-            folder_id=current_app.config['YANDEX_FOLDER_ID'],
-            iam_token=current_app.config['YANDEX_IAM_TOKEN'],
-            model_uri=current_app.config['YANDEX_GPT_MODEL']
-        )
+        gpt_service = get_gpt_service(data.get('document_id'))
+        context = select_question_context(data, session_id)
         
         # Получаем ответ на вопрос
         log_service.info('Отправка запроса к YandexGPT', session_id)
-        answer = gpt_service.answer_question(data['text'], data['question'])
+        answer = gpt_service.answer_question(context, data['question'])
         log_service.success('Получен ответ от YandexGPT', session_id)
         return jsonify({'answer': answer})
+    except TokenBudgetExceeded as e:
+        log_service.warning(f'Превышен лимит токенов: {str(e)}', session_id)
+        return jsonify({'error': str(e)}), 429
     except Exception as e:
         log_service.error(f'Ошибка при получении ответа: {str(e)}', session_id)
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Потоковый ответ на вопрос по содержанию (Server-Sent Events)"""
+    session_id = session.get('session_id')
+    log_service.info('Получен запрос на потоковый ответ по вопросу', session_id)
+    
+    data = request.json
+    if not data or 'text' not in data or 'question' not in data:
+        log_service.error('Недостаточно данных для ответа на вопрос', session_id)
+        return jsonify({'error': 'Необходимо предоставить текст и вопрос'}), 400
+    
+    log_service.info(f'Обработка вопроса: "{data["question"][:50]}..."', session_id)
+    context = select_question_context(data, session_id)
+    try:
+        chunks = get_gpt_service(data.get('document_id')).answer_question_stream(context, data['question'])
+    except TokenBudgetExceeded as e:
+        log_service.warning(f'Превышен лимит токенов: {str(e)}', session_id)
+        return jsonify({'error': str(e)}), 429
+    return sse_response(chunks, log=lambda error: log_service.error(f'Ошибка при получении ответа: {error}', session_id))
+
+@main_bp.route('/explain/stream', methods=['POST'])
+def explain_stream():
+    """Потоковое объяснение текста или сохраненного документа (Server-Sent Events)"""
+    session_id = session.get('session_id')
+    data = request.json or {}
+    
+    text = data.get('text')
+    if not text and data.get('document_id'):
+        document = db_session.query(Document).filter_by(uuid=data['document_id']).first()
+        text = document.content if document else None
+    if not text:
+        log_service.error('Не найден текст для объяснения', session_id)
+        return jsonify({'error': 'Необходимо предоставить текст или идентификатор документа'}), 400
+    
+    log_service.info('Потоковый запрос объяснения от YandexGPT', session_id)
+    try:
+        # Для длинного материала сначала идут события progress по фрагментам, затем текст объяснения
+        events = get_gpt_service(data.get('document_id')).explain_content_events(text)
+    except TokenBudgetExceeded as e:
+        log_service.warning(f'Превышен лимит токенов: {str(e)}', session_id)
+        return jsonify({'error': str(e)}), 429
+    return sse_stream(events, log=lambda error: log_service.error(f'Ошибка при работе с GPT: {error}', session_id))
+
+# Обязательные текстовые поля заданий пакета по типу задания
+BATCH_TASK_FIELDS = {'explain': (), 'examples': ('topic',), 'answer': ('question',)}
+
+def validate_batch_tasks(tasks):
+    """
+    Проверка заданий пакета до отправки в YandexGPT
+
+    Returns:
+        str: Описание ошибки или None, если все задания корректны
+    """
+    for index, task in enumerate(tasks):
+        if not isinstance(task, dict):
+            return f'Задание {index} должно быть объектом'
+        if task.get('type') not in BATCH_TASK_FIELDS:
+            return f"Задание {index}: неизвестный тип {task.get('type')!r}. Допустимы: {', '.join(BATCH_TASK_FIELDS)}"
+        for field in BATCH_TASK_FIELDS[task['type']]:
+            if not isinstance(task.get(field), str) or not task[field].strip():
+                return f'Задание {index}: поле {field} обязательно'
+    return None
+
+@main_bp.route('/study-pack', methods=['POST'])
+def study_pack():
+    """
+    Пакет заданий по одному материалу: объяснение, примеры и ответы на вопросы
+    
+    Задания выполняются параллельно, результаты отправляются событиями SSE
+    (result) по мере готовности.
+    """
+    session_id = session.get('session_id')
+    data = request.json or {}
+    tasks = data.get('tasks')
+    
+    text = data.get('text')
+    if not text and data.get('document_id'):
+        document = db_session.query(Document).filter_by(uuid=data['document_id']).first()
+        text = document.content if document else None
+    if not text or not isinstance(tasks, list) or not tasks:
+        log_service.error('Недостаточно данных для пакета заданий', session_id)
+        return jsonify({'error': 'Необходимо предоставить текст (или документ) и список заданий'}), 400
+    if len(tasks) > Config.GPT_BATCH_MAX_TASKS:
+        return jsonify({'error': f'Слишком много заданий в пакете (не более {Config.GPT_BATCH_MAX_TASKS})'}), 400
+    error = validate_batch_tasks(tasks)
+    if error:
+        log_service.error(f'Некорректный пакет заданий: {error}', session_id)
+        return jsonify({'error': error}), 400
+    
+    for task in tasks:
+        if task.get('type') == 'answer' and task.get('question'):
+            # Для вопросов по документу отправляются только найденные фрагменты
+            task['content'] = select_question_context(dict(data, text=text, question=task['question']), session_id)
+    
+    log_service.info(f'Пакет из {len(tasks)} заданий отправлен в YandexGPT', session_id)
+    results = iterate_async(get_gpt_service(data.get('document_id')).run_batch(text, tasks))
+    return sse_stream((('result', result) for result in results),
+                      log=lambda error: log_service.error(f'Ошибка пакета заданий: {error}', session_id))
+
 if __name__ == '__main__':
     app.register_blueprint(main_bp)
     app.run(debug=True)
\ No newline at end of file
@@ -1,17 +1,22 @@
 import uuid
-from sqlalchemy import Column, String, Integer, Text, DateTime
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, String, Integer, DateTime, Index
+from sqlalchemy.orm import deferred
 from datetime import datetime
-
-Base = declarative_base()
+from app.database.db import Base
+from app.database.compression import CompressedText
 
 class Document(Base):
     __tablename__ = 'documents'
+    __table_args__ = (
+        # Keyset-пагинация списка документов по (created_at, id)
+        Index('ix_documents_created_at_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36), unique=True, default=lambda: str(uuid.uuid4()))
     title = Column(String(255), nullable=False)
-    content = Column(Text)
+    # Текст загружается и распаковывается только при обращении к атрибуту
+    content = deferred(Column(CompressedText))
     file_path = Column(String(255))
     file_type = Column(String(50))
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,26 @@
+import json
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary
+from datetime import datetime
+from app.database.db import Base
+from app.database.compression import CompressedText
+
+class DocumentIndex(Base):
+    __tablename__ = 'document_indexes'
+    
+    document_uuid = Column(String(36), primary_key=True)
+    # Фрагменты повторяют текст документа, поэтому хранятся сжатыми
+    passages = Column(CompressedText, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    passage_count = Column(Integer, nullable=False, default=0)
+    # Время построения: меняется при каждой перестройке и служит версией индекса
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __init__(self, document_uuid, passages, data):
+        self.document_uuid = document_uuid
+        self.passages = json.dumps(passages, ensure_ascii=False)
+        self.data = data
+        self.passage_count = len(passages)
+        self.created_at = datetime.utcnow()
+    
+    def get_passages(self):
+        return json.loads(self.passages)
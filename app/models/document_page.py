@@ -0,0 +1,48 @@
+from sqlalchemy import Column, String, Integer, Float, Text, DateTime, UniqueConstraint
+from datetime import datetime
+from app.database.db import Base
+from app.database.compression import CompressedText
+
+class DocumentPage(Base):
+    __tablename__ = 'document_pages'
+    __table_args__ = (
+        UniqueConstraint('document_uuid', 'page_number', name='uq_document_pages_page'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    document_uuid = Column(String(36), nullable=False, index=True)
+    page_number = Column(Integer, nullable=False)
+    text = Column(CompressedText)
+    # text_layer, ocr
+    source = Column(String(20))
+    image_hash = Column(String(64))
+    # Отпечаток настроек OCR, с которыми распознана страница
+    ocr_config = Column(String(16))
+    # pending, done, failed
+    status = Column(String(20), nullable=False, default='pending')
+    error = Column(Text)
+    elapsed = Column(Float)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime)
+    
+    def __init__(self, document_uuid, page_number):
+        self.document_uuid = document_uuid
+        self.page_number = page_number
+        self.status = 'pending'
+        self.attempts = 0
+    
+    def to_dict(self, include_text=True):
+        result = {
+            'page_number': self.page_number,
+            'source': self.source,
+            'image_hash': self.image_hash,
+            'status': self.status,
+            'error': self.error,
+            'elapsed': self.elapsed,
+            'attempts': self.attempts,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+        if include_text:
+            result['text'] = self.text
+        return result
@@ -0,0 +1,58 @@
+import json
+import uuid
+from sqlalchemy import Column, String, Integer, Text, DateTime
+from datetime import datetime
+from app.database.db import Base
+from app.database.compression import CompressedText
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    session_id = Column(String(36), index=True)
+    job_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default='queued', index=True)
+    payload = Column(Text)
+    stages = Column(Text)
+    # Результат с распознанным текстом и объяснением GPT
+    result = Column(CompressedText)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(64))
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, job_type, payload=None, session_id=None, stages=None):
+        self.id = str(uuid.uuid4())
+        self.job_type = job_type
+        self.status = 'queued'
+        self.attempts = 0
+        self.session_id = session_id
+        self.payload = json.dumps(payload or {}, ensure_ascii=False)
+        self.stages = json.dumps({name: {'status': 'pending'} for name in (stages or [])}, ensure_ascii=False)
+    
+    def get_payload(self):
+        return json.loads(self.payload) if self.payload else {}
+    
+    def get_stages(self):
+        return json.loads(self.stages) if self.stages else {}
+    
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'stages': self.get_stages(),
+            'result': self.get_result(),
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
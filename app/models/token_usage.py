@@ -0,0 +1,43 @@
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Index
+from datetime import datetime
+from app.database.db import Base
+
+class TokenUsage(Base):
+    __tablename__ = 'token_usage'
+    __table_args__ = (
+        Index('ix_token_usage_session_created', 'session_id', 'created_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(36))
+    document_id = Column(String(36), index=True)
+    endpoint = Column(String(100), index=True)
+    model_uri = Column(String(255))
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    estimated = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    def __init__(self, session_id, endpoint, input_tokens, output_tokens, document_id=None, model_uri=None, estimated=False):
+        self.session_id = session_id
+        self.endpoint = endpoint
+        self.document_id = document_id
+        self.model_uri = model_uri
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = input_tokens + output_tokens
+        self.estimated = estimated
+    
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'document_id': self.document_id,
+            'endpoint': self.endpoint,
+            'model_uri': self.model_uri,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'total_tokens': self.total_tokens,
+            'estimated': self.estimated,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify, session
+from app.services.job_service import job_service
+
+# Blueprint для статуса фоновых задач
+job_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+@job_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Статус фоновой задачи обработки
+    
+    Returns:
+        JSON со статусом задачи, стадиями и результатом (после завершения)
+    """
+    job = job_service.get_job(job_id)
+    # Задачи других сессий и задачи без владельца не раскрываются
+    if job is None or job.session_id is None or job.session_id != session.get('session_id'):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
@@ -0,0 +1,133 @@
+from flask import Blueprint, jsonify, request, session
+from app.utils.http_client import get_http_client
+
+# Blueprint для служебной статистики производительности
+stats_bp = Blueprint('stats', __name__, url_prefix='/api/stats')
+
+@stats_bp.route('/http', methods=['GET'])
+def get_http_stats():
+    """
+    Статистика пулов HTTP-соединений к внешним API
+    
+    Returns:
+        JSON со счетчиками попаданий и промахов пула по каждому хосту
+    """
+    return jsonify({'hosts': get_http_client().get_stats()})
+
+@stats_bp.route('/rate-limits', methods=['GET'])
+def get_rate_limit_stats():
+    """
+    Состояние ограничителей скорости запросов к внешним API
+    
+    Returns:
+        JSON с текущим окном одновременных запросов, числом 429 и повторов
+    """
+    return jsonify({'upstreams': get_http_client().get_rate_limit_stats()})
+
+@stats_bp.route('/ocr-cache', methods=['GET'])
+def get_ocr_cache_stats():
+    """
+    Статистика кэша результатов OCR
+    
+    Returns:
+        JSON со счетчиками попаданий, промахов и вытеснений
+    """
+    from app.services.ocr_service import get_ocr_cache
+    cache = get_ocr_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.get_stats()})
+
+@stats_bp.route('/gpt-cache', methods=['GET'])
+def get_gpt_cache_stats():
+    """
+    Статистика кэша ответов YandexGPT
+    
+    Returns:
+        JSON со счетчиками попаданий, промахов и вытеснений
+    """
+    from app.services.gpt_service import get_gpt_cache
+    cache = get_gpt_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.get_stats()})
+
+@stats_bp.route('/preprocessing', methods=['GET'])
+def get_preprocessing_stats():
+    """
+    Статистика предобработки изображений перед OCR
+    
+    Returns:
+        JSON с объемом сэкономленных байтов и временем по стадиям
+    """
+    from app.services.ocr_service import get_image_preprocessor
+    preprocessor = get_image_preprocessor()
+    if preprocessor is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **preprocessor.get_stats()})
+
+@stats_bp.route('/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """
+    Состояние планировщиков обращений к OCR и GPT
+    
+    Returns:
+        JSON с глубиной очередей и временем ожидания слота по сессиям
+    """
+    from app.services.scheduler import get_scheduler
+    return jsonify({upstream: get_scheduler(upstream).get_stats() for upstream in ('vision', 'gpt')})
+
+@stats_bp.route('/single-flight', methods=['GET'])
+def get_single_flight_stats():
+    """
+    Статистика объединения одинаковых одновременных запросов к OCR и GPT
+    
+    Returns:
+        JSON с числом ведущих запросов и запросов, дождавшихся чужого результата
+    """
+    from app.services.ocr_service import get_ocr_single_flight
+    from app.services.gpt_service import get_gpt_single_flight
+    stats = {}
+    for name, single_flight in (('ocr', get_ocr_single_flight()), ('gpt', get_gpt_single_flight())):
+        stats[name] = single_flight.get_stats() if single_flight is not None else {'enabled': False}
+    return jsonify(stats)
+
+@stats_bp.route('/tokens', methods=['GET'])
+def get_token_usage():
+    """
+    Расход токенов YandexGPT
+    
+    Параметры запроса: group_by (session, document, endpoint, model; по умолчанию endpoint),
+    since - учитывать только последние N секунд, limit - число групп.
+    
+    Returns:
+        JSON с суммами токенов по группам и бюджетом текущей сессии
+    """
+    from app.services.usage_service import usage_service
+    group_by = request.args.get('group_by', 'endpoint')
+    if group_by not in usage_service.GROUP_COLUMNS:
+        return jsonify({'error': f'Недопустимая группировка: {group_by}'}), 400
+    groups = usage_service.get_summary(
+        group_by=group_by,
+        since_seconds=request.args.get('since', type=int),
+        limit=request.args.get('limit', 100, type=int)
+    )
+    return jsonify({
+        'group_by': group_by,
+        'groups': groups,
+        'session': usage_service.get_budget_status(session.get('session_id'))
+    })
+
+@stats_bp.route('/models', methods=['GET'])
+def get_model_routing_stats():
+    """
+    Маршрутизация запросов между моделями YandexGPT
+    
+    Returns:
+        JSON с гистограммами и перцентилями задержек по моделям и счетчиками решений маршрутизатора
+    """
+    from app.services.model_router import get_model_router
+    router = get_model_router()
+    if router is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **router.get_stats()})
@@ -0,0 +1,201 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import tuple_, func
+from sqlalchemy.orm import defer
+from app.models.document import Document
+from app.models.document_page import DocumentPage
+from app.database.db import write_transaction
+
+# Поля, которые можно запросить параметром fields
+DOCUMENT_FIELDS = ('id', 'uuid', 'title', 'content', 'file_path', 'file_type', 'created_at', 'updated_at')
+# Облегченная проекция списка: без текста документа
+LIST_FIELDS = ('id', 'uuid', 'title', 'file_type', 'created_at', 'updated_at')
+
+class InvalidCursor(ValueError):
+    """Курсор страницы поврежден или подделан"""
+
+def encode_cursor(created_at, document_id):
+    """
+    Курсор страницы: позиция последнего отданного документа
+
+    Args:
+        created_at (datetime): Время создания документа
+        document_id (int): Идентификатор документа
+
+    Returns:
+        str: Непрозрачная строка для параметра cursor
+    """
+    raw = f"{created_at.isoformat() if created_at else ''}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Разбор курсора, выданного encode_cursor
+
+    Returns:
+        tuple: (created_at или None, id)
+
+    Raises:
+        InvalidCursor: Если курсор некорректен
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, document_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(document_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Некорректный курсор: {cursor}') from e
+
+def parse_fields(value):
+    """
+    Список полей из параметра fields
+
+    Args:
+        value (str): Поля через запятую или None для облегченной проекции
+
+    Returns:
+        tuple: Поля в порядке DOCUMENT_FIELDS
+
+    Raises:
+        ValueError: Если запрошено неизвестное поле
+    """
+    if not value:
+        return LIST_FIELDS
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(DOCUMENT_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return tuple(field for field in DOCUMENT_FIELDS if field in requested)
+
+def stream_document_page(session, fields=LIST_FIELDS, limit=50, cursor=None, batch_size=100):
+    """
+    Страница списка документов в виде потока фрагментов JSON
+
+    Документы отдаются от новых к старым. Следующая страница начинается
+    строго после (created_at, id) последнего документа, поэтому стоимость
+    запроса не зависит от номера страницы и размера библиотеки: выбираются
+    только нужные столбцы и не больше limit + 1 строк по индексу.
+
+    Args:
+        session: Сессия SQLAlchemy
+        fields (tuple): Поля документа в ответе
+        limit (int): Размер страницы
+        cursor (str, optional): Курсор из next_cursor предыдущей страницы
+        batch_size (int): Сколько строк читать из базы за раз
+
+    Yields:
+        str: Части JSON-объекта {"documents": [...], "next_cursor": ...}
+    """
+    position = decode_cursor(cursor) if cursor else None
+    # created_at и id нужны для курсора, даже если не запрошены
+    columns = [getattr(Document, field) for field in fields]
+    query = session.query(*columns, Document.created_at.label('_created_at'), Document.id.label('_id'))
+    if position is not None:
+        created_at, document_id = position
+        if created_at is None:
+            query = query.filter(Document.created_at.is_(None), Document.id < document_id)
+        else:
+            # Сравнение пар позволяет SQLite искать по индексу, а не сканировать его
+            query = query.filter(tuple_(Document.created_at, Document.id) < (created_at, document_id))
+    query = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1)
+
+    yield '{"documents": ['
+    last = None
+    for count, row in enumerate(query.yield_per(batch_size)):
+        if count == limit:
+            break
+        item = {}
+        for field in fields:
+            value = getattr(row, field)
+            item[field] = value.isoformat() if isinstance(value, datetime) else value
+        yield (',' if count else '') + json.dumps(item, ensure_ascii=False)
+        last = row
+    else:
+        # Строк не больше limit: это последняя страница
+        last = None
+    next_cursor = encode_cursor(last._created_at, last._id) if last is not None else None
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+def get_page_range(session, document_uuid, start=1, end=None, include_text=True):
+    """
+    Страницы документа в диапазоне номеров, без загрузки всего текста документа
+
+    Args:
+        session: Сессия SQLAlchemy
+        document_uuid (str): UUID документа
+        start (int): Первая страница (с 1)
+        end (int, optional): Последняя страница включительно
+        include_text (bool): Включать ли текст страниц
+
+    Returns:
+        list: Словари страниц в порядке номеров
+    """
+    query = session.query(DocumentPage).filter(
+        DocumentPage.document_uuid == document_uuid,
+        DocumentPage.page_number >= start
+    )
+    if end is not None:
+        query = query.filter(DocumentPage.page_number <= end)
+    if not include_text:
+        query = query.options(defer(DocumentPage.text))
+    return [page.to_dict(include_text=include_text) for page in query.order_by(DocumentPage.page_number)]
+
+def get_page_summary(session, document_uuid):
+    """
+    Число страниц документа по статусам обработки
+
+    Returns:
+        dict: Статус -> количество страниц
+    """
+    rows = session.query(DocumentPage.status, func.count(DocumentPage.id)) \
+        .filter(DocumentPage.document_uuid == document_uuid) \
+        .group_by(DocumentPage.status).all()
+    return {status: count for status, count in rows}
+
+def assemble_content(session, document_uuid):
+    """
+    Текст документа из успешно обработанных страниц в порядке номеров
+
+    Returns:
+        str: Текст страниц через пустую строку
+    """
+    texts = session.query(DocumentPage.text).filter(
+        DocumentPage.document_uuid == document_uuid,
+        DocumentPage.status == 'done'
+    ).order_by(DocumentPage.page_number).all()
+    return '\n\n'.join(text for (text,) in texts if text)
+
+def save_page(session, document_uuid, result, ocr_config=None):
+    """
+    Сохраняет результат обработки страницы отдельной транзакцией
+
+    Каждая страница фиксируется сразу после обработки: частичный результат
+    виден до окончания обработки документа, а после сбоя уже обработанные
+    страницы не теряются.
+
+    Args:
+        session: Сессия SQLAlchemy
+        document_uuid (str): UUID документа
+        result (dict): Результат страницы (PDFService.iter_pages)
+        ocr_config (str, optional): Отпечаток настроек OCR для страниц, распознанных OCR
+
+    Returns:
+        DocumentPage: Сохраненная страница
+    """
+    with write_transaction(session):
+        page = session.query(DocumentPage).filter_by(
+            document_uuid=document_uuid, page_number=result['page_number']).first()
+        if page is None:
+            page = DocumentPage(document_uuid, result['page_number'])
+            session.add(page)
+        page.text = result.get('text') or ''
+        page.source = result.get('source')
+        page.image_hash = result.get('image_hash')
+        page.ocr_config = ocr_config if page.source == 'ocr' else None
+        page.status = result.get('status', 'done')
+        page.error = result.get('error')
+        page.elapsed = result.get('elapsed')
+        page.attempts = (page.attempts or 0) + 1
+        page.processed_at = datetime.utcnow()
+    return page
@@ -1,10 +1,42 @@
+import io
 import os
+import mmap
 import uuid
 import shutil
+import hashlib
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 from app.config import Config
 
+class SpooledUpload:
+    """An upload written to disk once, with its SHA-256 computed on the way"""
+
+    def __init__(self, file_path, sha256, size, memory=None):
+        self.file_path = file_path
+        self.sha256 = sha256
+        self.size = size
+        # Upload contents when the request already held them in memory
+        self.memory = memory
+
+    @contextmanager
+    def buffer(self):
+        """
+        Zero-copy view of the contents: the in-memory upload
+        or a read-only mmap of the saved file
+        """
+        if self.memory is not None:
+            yield self.memory
+        elif self.size == 0:
+            yield b''
+        else:
+            with open(self.file_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield mapped
+
 class FileService:
+    # Chunk size used when copying uploads to disk
+    CHUNK_SIZE = 1024 * 1024
+
     def __init__(self):
         self.upload_folder = Config.UPLOAD_FOLDER
         # Create upload folder if it doesn't exist
@@ -25,6 +57,38 @@ class FileService:
             return file_path
         return None
 
+    def spool_upload(self, file, file_path=None):
+        """
+        Save an uploaded file to disk in chunks, hashing it on the way
+
+        Args:
+            file: Uploaded werkzeug FileStorage
+            file_path: Target path (a unique name in the upload folder by default)
+
+        Returns:
+            SpooledUpload with the path, SHA-256 and size, or None
+        """
+        if not file or not file.filename:
+            return None
+        if file_path is None:
+            file_path = os.path.join(self.upload_folder, f"{uuid.uuid4()}_{secure_filename(file.filename)}")
+
+        digest = hashlib.sha256()
+        size = 0
+        stream = file.stream
+        with open(file_path, 'wb') as target:
+            while True:
+                chunk = stream.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+
+        # Werkzeug keeps small uploads in a BytesIO; reuse them instead of reading the file back
+        memory = stream.getvalue() if isinstance(stream, io.BytesIO) else None
+        return SpooledUpload(file_path, digest.hexdigest(), size, memory)
+
     def delete_file(self, file_path):
         """Delete a file from the filesystem"""
         if file_path and os.path.exists(file_path):
@@ -1,11 +1,61 @@
-import requests
+import json
+import time
+import asyncio
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.config import Config
+from app.services.scheduler import get_scheduler
+from app.services.usage_service import usage_service
+from app.utils.http_client import http_client
+from app.utils.result_cache import ResultCache
+from app.utils.single_flight import SingleFlight
+from app.utils.text_chunker import estimate_tokens, split_text, truncate_text
 from app.utils.token_manager import get_token
 
+_gpt_cache = None
+_gpt_single_flight = None
+
+def get_gpt_cache():
+    """
+    Общий для процесса кэш ответов YandexGPT
+    
+    Returns:
+        ResultCache: Кэш или None, если кэширование отключено
+    """
+    global _gpt_cache
+    if _gpt_cache is None and Config.GPT_CACHE_ENABLED:
+        _gpt_cache = ResultCache(
+            'gpt',
+            max_entries=Config.GPT_CACHE_MAX_ENTRIES,
+            db_path=Config.CACHE_DB_PATH,
+            max_disk_entries=Config.GPT_CACHE_MAX_DISK_ENTRIES,
+            ttl=Config.GPT_CACHE_TTL
+        )
+    return _gpt_cache
+
+def get_gpt_single_flight():
+    """
+    Общий для процесса механизм объединения одинаковых запросов к YandexGPT
+    
+    Returns:
+        SingleFlight: Объединение запросов или None, если оно отключено
+    """
+    global _gpt_single_flight
+    if _gpt_single_flight is None and Config.SINGLE_FLIGHT_ENABLED:
+        _gpt_single_flight = SingleFlight(
+            'gpt',
+            db_path=Config.CACHE_DB_PATH,
+            lease_seconds=Config.SINGLE_FLIGHT_LEASE_SECONDS,
+            poll_interval=Config.SINGLE_FLIGHT_POLL_INTERVAL
+        )
+    return _gpt_single_flight
+
 class GPTService:
     """Сервис для работы с YandexGPT"""
     
-    def __init__(self, gpt_url, folder_id, iam_token=None, model_uri=None):
+    def __init__(self, gpt_url, folder_id, iam_token=None, model_uri=None, session_id=None, cache=None, single_flight=None,
+                 endpoint=None, document_id=None, usage=None, router=None):
         """
         Инициализация сервиса GPT
         
@@ -14,43 +64,261 @@ class GPTService:
             folder_id (str): Идентификатор каталога в Yandex Cloud
             iam_token (str, optional): IAM-токен для авторизации. Если None, будет получен через token_manager
             model_uri (str, optional): URI модели YandexGPT. Если None, будет создан на основе folder_id
+            session_id (str, optional): Сессия пользователя для справедливого планирования запросов
+            cache (ResultCache, optional): Кэш ответов. Если None, используется общий кэш процесса
+            single_flight (SingleFlight, optional): Объединение одинаковых одновременных запросов
+            endpoint (str, optional): Маршрут или задача, от имени которой учитываются токены
+            document_id (str, optional): Документ, к которому относятся запросы
+            usage (UsageService, optional): Учет токенов. Если None, используется общий сервис учета
+                (при GPT_USAGE_TRACKING); False отключает учет и проверку бюджета
+            router (ModelRouter, optional): Выбор модели для каждого запроса; если задан, model_uri не используется
         """
         self.gpt_url = gpt_url
         self.folder_id = folder_id
-        self.iam_token = iam_token or get_token()
+        self._iam_token = iam_token
         self.model_uri = model_uri or f"gpt://{folder_id}/yandexgpt-lite"
-        self.headers = {
-            "Authorization": f"Bearer {self.iam_token}",
+        self.session_id = session_id
+        self.scheduler = get_scheduler('gpt')
+        self.cache = cache if cache is not None else get_gpt_cache()
+        self.single_flight = single_flight if single_flight is not None else get_gpt_single_flight()
+        self.endpoint = endpoint
+        self.document_id = document_id
+        if usage is None:
+            usage = usage_service if Config.GPT_USAGE_TRACKING else None
+        self.usage = usage or None
+        self.router = router
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def iam_token(self):
+        """Текущий IAM-токен: явно переданный или общий токен из менеджера токенов"""
+        return self._iam_token or get_token()
+    
+    @property
+    def headers(self):
+        """Заголовки запроса с актуальным IAM-токеном"""
+        return self._build_headers(self.iam_token)
+    
+    def _build_headers(self, iam_token):
+        """Формирует заголовки запроса для указанного IAM-токена"""
+        return {
+            "Authorization": f"Bearer {iam_token}",
             "Content-Type": "application/json",
-            "x-folder-id": folder_id
+            "x-folder-id": self.folder_id
         }
-        self.logger = logging.getLogger(__name__)
     
-    def refresh_token(self):
-        """Обновляет IAM-токен через менеджер токенов"""
-        self.iam_token = get_token(force_refresh=True)
-        self.headers["Authorization"] = f"Bearer {self.iam_token}"
+    def refresh_token(self, stale_token=None):
+        """
+        Обновляет IAM-токен через менеджер токенов
+        
+        Args:
+            stale_token (str, optional): Токен, отклоненный API
+        """
+        get_token(force_refresh=True, stale_token=stale_token)
+        self._iam_token = None
         self.logger.info("IAM-токен для GPT обновлен")
     
-    def explain_content(self, content, instruction="Объясни этот учебный материал простыми словами"):
+    def explain_content(self, content, instruction="Объясни этот учебный материал простыми словами", on_progress=None):
         """
         Генерация объяснения учебного материала
         
+        Материал, не помещающийся в контекст модели, объясняется по схеме
+        map-reduce (см. _map_explanations).
+        
         Args:
             content (str): Текст учебного материала
             instruction (str): Инструкция для модели
+            on_progress (callable, optional): Вызывается как on_progress(готово, всего) после каждого фрагмента
             
         Returns:
             str: Объяснение материала
         """
-        prompt = f"{instruction}:\n\n{content}"
+        if estimate_tokens(content) > Config.GPT_CHUNK_TOKENS:
+            partials = self._map_explanations(content, instruction, on_progress)
+            if len(partials) == 1:
+                return partials[0]
+            return self._send_request(self._reduce_payload(partials, instruction), cacheable=Config.GPT_CACHE_EXPLANATIONS)
+        # Объяснения генерируются с температурой 0.6 и кэшируются только при
+        # явно включенном GPT_CACHE_EXPLANATIONS
+        return self._send_request(self._explain_payload(content, instruction), cacheable=Config.GPT_CACHE_EXPLANATIONS)
+    
+    def explain_content_stream(self, content, instruction="Объясни этот учебный материал простыми словами", on_progress=None):
+        """
+        Потоковая генерация объяснения учебного материала
         
-        payload = {
+        Для длинного материала фрагменты объясняются параллельно, а потоком
+        отдается итоговое объединение (см. explain_content_events).
+        
+        Args:
+            content (str): Текст учебного материала
+            instruction (str): Инструкция для модели
+            on_progress (callable, optional): Вызывается как on_progress(готово, всего) после каждого фрагмента
+            
+        Yields:
+            str: Очередные фрагменты объяснения
+        """
+        events = self.explain_content_events(content, instruction)
+        
+        def texts():
+            for event, data in events:
+                if event == 'progress':
+                    if on_progress:
+                        on_progress(data['done'], data['total'])
+                else:
+                    yield data['text']
+        return texts()
+    
+    def explain_content_events(self, content, instruction="Объясни этот учебный материал простыми словами"):
+        """
+        Потоковое объяснение учебного материала в виде событий SSE
+        
+        Шаг map для длинного материала выполняется уже во время обхода
+        итератора: после каждого объясненного фрагмента отдается событие
+        progress, а затем потоком - итоговое объединение. Бюджет токенов
+        проверяется сразу при вызове, чтобы маршрут успел ответить 429.
+        
+        Args:
+            content (str): Текст учебного материала
+            instruction (str): Инструкция для модели
+            
+        Returns:
+            iterator: Пары (тип события, данные): ('progress', {'done', 'total'})
+                и (None, {'text'}) с очередными фрагментами объяснения
+            
+        Raises:
+            TokenBudgetExceeded: Если запрос не помещается в бюджет сессии
+        """
+        if estimate_tokens(content) <= Config.GPT_CHUNK_TOKENS:
+            chunks = self._stream_request(self._explain_payload(content, instruction), cacheable=Config.GPT_CACHE_EXPLANATIONS)
+            return ((None, {'text': chunk}) for chunk in chunks)
+        payloads = self._map_payloads(content, instruction)
+        self._check_budget(payloads[0])
+        return self._map_reduce_events(payloads, instruction)
+    
+    def _map_reduce_events(self, payloads, instruction):
+        """События шага map и потоковый шаг reduce (см. explain_content_events)"""
+        partials = yield from self._map_steps(payloads, instruction)
+        if len(partials) == 1:
+            yield None, {'text': partials[0]}
+            return
+        for chunk in self._stream_request(self._reduce_payload(partials, instruction), cacheable=Config.GPT_CACHE_EXPLANATIONS):
+            yield None, {'text': chunk}
+    
+    def _map_payloads(self, content, instruction):
+        """Запросы шага map: материал делится на фрагменты в пределах GPT_CHUNK_TOKENS"""
+        chunks = split_text(content, Config.GPT_CHUNK_TOKENS)
+        self.logger.info(f"Материал разбит на {len(chunks)} фрагментов для объяснения")
+        return [self._explain_payload(chunk, instruction, max_tokens=Config.GPT_MAP_MAX_TOKENS) for chunk in chunks]
+    
+    def _map_explanations(self, content, instruction, on_progress=None):
+        """
+        Шаг map: параллельное объяснение фрагментов длинного материала
+        
+        Args:
+            content (str): Текст учебного материала
+            instruction (str): Инструкция для модели
+            on_progress (callable, optional): Вызывается в текущем потоке после каждого фрагмента
+            
+        Returns:
+            list: Объяснения в исходном порядке, которые помещаются в один запрос reduce
+        """
+        steps = self._map_steps(self._map_payloads(content, instruction), instruction)
+        while True:
+            try:
+                _, progress = next(steps)
+            except StopIteration as finished:
+                return finished.value
+            if on_progress:
+                on_progress(progress['done'], progress['total'])
+    
+    def _map_steps(self, payloads, instruction):
+        """
+        Генератор шага map
+        
+        Одновременно выполняется не больше GPT_MAP_WORKERS запросов (и не
+        больше, чем разрешает планировщик для сессии). Если генератор закрыт
+        досрочно (клиент отключился), еще не начатые запросы отменяются.
+        
+        Args:
+            payloads (list): Запросы для фрагментов материала
+            instruction (str): Инструкция для модели
+            
+        Yields:
+            tuple: ('progress', {'done': готово, 'total': всего}) после каждого фрагмента
+            
+        Returns:
+            list: Объяснения в исходном порядке, которые помещаются в один запрос reduce
+        """
+        partials = [None] * len(payloads)
+        executor = ThreadPoolExecutor(max_workers=min(Config.GPT_MAP_WORKERS, len(payloads)), thread_name_prefix='gpt-map')
+        try:
+            futures = {
+                executor.submit(self._send_request, payload, Config.GPT_CACHE_EXPLANATIONS): index
+                for index, payload in enumerate(payloads)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                partials[futures[future]] = future.result()
+                yield 'progress', {'done': done, 'total': len(payloads)}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Если объяснения частей вместе не помещаются в контекст, объединяем их группами
+        while len(partials) > 1:
+            merged = self._reduce_explanations(partials, instruction)
+            if merged is None:
+                break
+            partials = merged
+        return partials
+    
+    def _reduce_explanations(self, partials, instruction):
+        """
+        Промежуточный шаг reduce: объединяет группы объяснений, помещающиеся в контекст
+        
+        Args:
+            partials (list): Объяснения последовательных частей
+            instruction (str): Исходная инструкция
+            
+        Returns:
+            list: Объединенные объяснения или None, если все части уже помещаются в один запрос
+                или сгруппировать их не удается
+        """
+        groups = [[]]
+        group_tokens = 0
+        for partial in partials:
+            tokens = estimate_tokens(partial)
+            if groups[-1] and group_tokens + tokens > Config.GPT_CHUNK_TOKENS:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(partial)
+            group_tokens += tokens
+        if len(groups) == 1 or len(groups) == len(partials):
+            return None
+        
+        merged = [None] * len(groups)
+        with ThreadPoolExecutor(max_workers=min(Config.GPT_MAP_WORKERS, len(groups)), thread_name_prefix='gpt-reduce') as executor:
+            futures = {
+                executor.submit(self._send_request, self._reduce_payload(group, instruction, max_tokens=Config.GPT_MAP_MAX_TOKENS),
+                                Config.GPT_CACHE_EXPLANATIONS): index
+                for index, group in enumerate(groups) if len(group) > 1
+            }
+            for index, group in enumerate(groups):
+                if len(group) == 1:
+                    merged[index] = group[0]
+            for future in as_completed(futures):
+                merged[futures[future]] = future.result()
+        return merged
+    
+    def _reduce_payload(self, partials, instruction, max_tokens=2000):
+        parts = "\n\n".join(f"Часть {index}:\n{partial}" for index, partial in enumerate(partials, start=1))
+        prompt = (f"{instruction}. Ниже даны объяснения последовательных частей одного учебного материала. "
+                  f"Объедини их в одно связное структурированное объяснение без повторов:\n\n{parts}")
+        
+        return self._route({
             "modelUri": self.model_uri,
             "completionOptions": {
                 "stream": False,
                 "temperature": 0.6,
-                "maxTokens": 2000
+                "maxTokens": max_tokens
             },
             "messages": [
                 {
@@ -63,9 +331,30 @@ class GPTService:
                     "text": prompt
                 }
             ]
-        }
+        }, task="explain")
+    
+    def _explain_payload(self, content, instruction, max_tokens=2000):
+        prompt = f"{instruction}:\n\n{self._fit_content(content)}"
         
-        return self._send_request(payload)
+        return self._route({
+            "modelUri": self.model_uri,
+            "completionOptions": {
+                "stream": False,
+                "temperature": 0.6,
+                "maxTokens": max_tokens
+            },
+            "messages": [
+                {
+                    "role": "system",
+                    "text": "Ты - репетитор, который помогает студентам понять сложный учебный материал. " +
+                            "Объясняй понятно, структурированно и с примерами."
+                },
+                {
+                    "role": "user",
+                    "text": prompt
+                }
+            ]
+        }, task="explain")
     
     def answer_question(self, content, question):
         """
@@ -78,9 +367,25 @@ class GPTService:
         Returns:
             str: Ответ на вопрос
         """
-        prompt = f"Ответь на вопрос на основе этого учебного материала:\n\nМатериал: {content}\n\nВопрос: {question}"
+        return self._send_request(self._answer_payload(content, question))
+    
+    def answer_question_stream(self, content, question):
+        """
+        Потоковый ответ на вопрос по учебному материалу
         
-        payload = {
+        Args:
+            content (str): Текст учебного материала
+            question (str): Вопрос
+            
+        Yields:
+            str: Очередные фрагменты ответа
+        """
+        return self._stream_request(self._answer_payload(content, question))
+    
+    def _answer_payload(self, content, question):
+        prompt = f"Ответь на вопрос на основе этого учебного материала:\n\nМатериал: {self._fit_content(content)}\n\nВопрос: {question}"
+        
+        return self._route({
             "modelUri": self.model_uri,
             "completionOptions": {
                 "stream": False,
@@ -97,9 +402,34 @@ class GPTService:
                     "text": prompt
                 }
             ]
-        }
+        }, task="answer")
+    
+    def _route(self, payload, task):
+        """
+        Выбор модели для запроса маршрутизатором
         
-        return self._send_request(payload)
+        Args:
+            payload (dict): Тело запроса
+            task (str): Тип задания: explain, answer или examples
+            
+        Returns:
+            dict: Тело запроса с выбранной моделью
+        """
+        if self.router is not None:
+            payload["modelUri"] = self.router.choose(task, self.estimate_prompt_tokens(payload))
+        return payload
+    
+    def _observe_latency(self, payload, started, success):
+        """Учет задержки ответа модели для маршрутизатора"""
+        if self.router is not None:
+            self.router.observe(payload["modelUri"], time.monotonic() - started, success)
+    
+    def _fit_content(self, content):
+        """Обрезает материал, не помещающийся в GPT_MAX_PROMPT_TOKENS, до отправки запроса"""
+        fitted = truncate_text(content, Config.GPT_MAX_PROMPT_TOKENS)
+        if len(fitted) < len(content):
+            self.logger.warning(f"Материал обрезан до {Config.GPT_MAX_PROMPT_TOKENS} токенов: {len(content)} -> {len(fitted)} символов")
+        return fitted
     
     def generate_examples(self, content, topic):
         """
@@ -112,7 +442,7 @@ class GPTService:
         Returns:
             str: Дополнительные примеры
         """
-        prompt = f"Сгенерируй практические примеры по теме на основе учебного материала:\n\nМатериал: {content}\n\nТема: {topic}"
+        prompt = f"Сгенерируй практические примеры по теме на основе учебного материала:\n\nМатериал: {self._fit_content(content)}\n\nТема: {topic}"
         
         payload = {
             "modelUri": self.model_uri,
@@ -133,27 +463,296 @@ class GPTService:
             ]
         }
         
-        return self._send_request(payload)
+        return self._send_request(self._route(payload, task="examples"))
+    
+    async def explain_content_async(self, content, instruction="Объясни этот учебный материал простыми словами"):
+        """Асинхронный вариант explain_content"""
+        return await asyncio.to_thread(self.explain_content, content, instruction)
+    
+    async def answer_question_async(self, content, question):
+        """Асинхронный вариант answer_question"""
+        return await asyncio.to_thread(self.answer_question, content, question)
+    
+    async def generate_examples_async(self, content, topic):
+        """Асинхронный вариант generate_examples"""
+        return await asyncio.to_thread(self.generate_examples, content, topic)
+    
+    async def run_batch(self, content, tasks):
+        """
+        Параллельное выполнение нескольких заданий по одному материалу
+        
+        Запросы проходят через общие ограничитель скорости и планировщик GPT,
+        поэтому пакет не превышает квоту, а его длительность близка к времени
+        самого долгого запроса, а не к сумме всех.
+        
+        Args:
+            content (str): Текст учебного материала
+            tasks (list): Задания вида {"type": "explain"}, {"type": "examples", "topic": ...}
+                или {"type": "answer", "question": ...}; поле content заменяет общий текст
+            
+        Yields:
+            dict: Результат задания (index, type, result или error) по мере готовности
+        """
+        async def run(index, task):
+            task_content = task.get("content") or content
+            try:
+                if task["type"] == "explain":
+                    result = await self.explain_content_async(task_content)
+                elif task["type"] == "examples":
+                    result = await self.generate_examples_async(task_content, task["topic"])
+                elif task["type"] == "answer":
+                    result = await self.answer_question_async(task_content, task["question"])
+                else:
+                    raise ValueError(f"Неизвестный тип задания: {task['type']}")
+                return {"index": index, "type": task["type"], "result": result}
+            except Exception as e:
+                self.logger.error(f"Ошибка задания {task.get('type')} в пакете: {str(e)}")
+                return {"index": index, "type": task.get("type"), "error": str(e)}
+        
+        for completed in asyncio.as_completed([run(index, task) for index, task in enumerate(tasks)]):
+            yield await completed
+    
+    @staticmethod
+    def cache_key(payload):
+        """
+        Ключ кэша: модель, нормализованные сообщения и параметры генерации
+        
+        Args:
+            payload (dict): Тело запроса к YandexGPT
+            
+        Returns:
+            str: SHA-256 канонического представления запроса
+        """
+        options = {key: value for key, value in payload.get("completionOptions", {}).items() if key != "stream"}
+        messages = [
+            {
+                "role": message.get("role"),
+                # Пробелы и переводы строк, полученные из OCR, не влияют на ключ
+                "text": "\n".join(" ".join(line.split()) for line in message.get("text", "").strip().splitlines())
+            }
+            for message in payload.get("messages", [])
+        ]
+        canonical = json.dumps({"modelUri": payload.get("modelUri"), "messages": messages, "completionOptions": options},
+                               ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def _cache_lookup(self, payload, cacheable):
+        """
+        Поиск ответа в кэше
+        
+        Args:
+            payload (dict): Тело запроса
+            cacheable (bool, optional): Кэшировать ли ответ. Если None, кэшируются
+                только запросы с температурой не выше GPT_CACHE_MAX_TEMPERATURE
+            
+        Returns:
+            tuple: (ключ кэша или None, если ответ не кэшируется; найденный ответ или None)
+        """
+        if cacheable is None:
+            temperature = payload.get("completionOptions", {}).get("temperature", 0)
+            cacheable = temperature <= Config.GPT_CACHE_MAX_TEMPERATURE
+        if not cacheable or self.cache is None:
+            return None, None
+        cache_key = self.cache_key(payload)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.logger.info("Ответ YandexGPT получен из кэша")
+        return cache_key, cached
+    
+    @staticmethod
+    def estimate_prompt_tokens(payload):
+        """
+        Локальная оценка числа входных токенов запроса
+        
+        Args:
+            payload (dict): Тело запроса к YandexGPT
+            
+        Returns:
+            int: Оценка сверху по тексту всех сообщений
+        """
+        return sum(estimate_tokens(message.get("text", "")) for message in payload.get("messages", []))
+    
+    def _check_budget(self, payload):
+        """Отклоняет запрос, который не помещается в бюджет токенов сессии (TokenBudgetExceeded)"""
+        if self.usage is not None:
+            self.usage.check_budget(self.session_id, self.estimate_prompt_tokens(payload))
+    
+    def _record_usage(self, payload, result, text):
+        """
+        Учет токенов по блоку usage ответа YandexGPT
+        
+        Если API не вернул usage, записывается локальная оценка.
+        
+        Args:
+            payload (dict): Тело запроса
+            result (dict): Поле result ответа
+            text (str): Сгенерированный текст
+        """
+        if self.usage is None:
+            return
+        usage = result.get("usage") or {}
+        if "inputTextTokens" in usage:
+            input_tokens = int(usage["inputTextTokens"])
+            output_tokens = int(usage.get("completionTokens", 0))
+            estimated = False
+        else:
+            input_tokens, output_tokens = self.estimate_prompt_tokens(payload), estimate_tokens(text)
+            estimated = True
+        self.usage.record(self.session_id, self.endpoint, input_tokens, output_tokens,
+                          document_id=self.document_id, model_uri=payload.get("modelUri"), estimated=estimated)
     
-    def _send_request(self, payload):
+    def _send_request(self, payload, cacheable=None):
+        """
+        Отправка запроса к YandexGPT с использованием кэша ответов
+        
+        Одновременные одинаковые запросы выполняются один раз независимо от
+        того, кэшируется ли ответ.
+        
+        Args:
+            payload (dict): Тело запроса
+            cacheable (bool, optional): Кэшировать ли ответ (см. _cache_lookup)
+            
+        Returns:
+            str: Текст ответа модели
+        """
+        cache_key, cached = self._cache_lookup(payload, cacheable)
+        if cached is not None:
+            return cached
+        if cache_key is None:
+            if self.single_flight is None:
+                return self._request_completion(payload)
+            # Некэшируемый ответ нельзя получить из общего кэша, поэтому одинаковые
+            # запросы объединяются только внутри процесса (без аренды между воркерами)
+            return self.single_flight.do(self.cache_key(payload), lambda: self._request_completion(payload))
+        
+        def complete():
+            text = self._request_completion(payload)
+            self.cache.set(cache_key, text)
+            return text
+        
+        if self.single_flight is None:
+            return complete()
+        # Одинаковые запросы, уже выполняющиеся в других потоках или воркерах, не дублируются
+        return self.single_flight.do(cache_key, complete, lambda: self.cache.get(cache_key))
+    
+    def _stream_request(self, payload, cacheable=None):
+        """
+        Потоковый запрос к YandexGPT с использованием кэша ответов
+        
+        Ответ из кэша отдается одним фрагментом; полностью полученный потоковый
+        ответ сохраняется в кэш. Кэш и бюджет токенов проверяются сразу при
+        вызове, а не при первом обращении к итератору: маршрут успевает
+        ответить 429 до начала потокового ответа.
+        
+        Args:
+            payload (dict): Тело запроса
+            cacheable (bool, optional): Кэшировать ли ответ (см. _cache_lookup)
+            
+        Returns:
+            iterator: Очередные фрагменты ответа
+            
+        Raises:
+            TokenBudgetExceeded: Если запрос не помещается в бюджет сессии
+        """
+        cache_key, cached = self._cache_lookup(payload, cacheable)
+        if cached is not None:
+            return iter([cached])
+        self._check_budget(payload)
+        return self._stream_and_cache(payload, cache_key)
+    
+    def _stream_and_cache(self, payload, cache_key):
+        parts = []
+        for delta in self._stream_completion(payload):
+            parts.append(delta)
+            yield delta
+        if cache_key is not None:
+            self.cache.set(cache_key, "".join(parts))
+    
+    def _stream_completion(self, payload):
+        """
+        Потоковое получение ответа YandexGPT
+        
+        API возвращает последовательность JSON-объектов по одному в строке; в
+        каждом содержится весь сгенерированный к этому моменту текст, поэтому
+        наружу отдается только прирост. Бюджет проверяет _stream_request.
+        
+        Args:
+            payload (dict): Тело запроса (поле stream будет установлено в True)
+            
+        Yields:
+            str: Новые фрагменты текста
+        """
+        payload = dict(payload, completionOptions=dict(payload["completionOptions"], stream=True))
+        # Слот планировщика занят, пока модель генерирует ответ
+        with self.scheduler.slot(self.session_id):
+            iam_token = self.iam_token
+            started = time.monotonic()
+            response = http_client.post(self.gpt_url, upstream='gpt', headers=self._build_headers(iam_token),
+                                        json=payload, stream=True)
+            if response.status_code == 401:
+                response.close()
+                self.logger.warning("Токен для GPT истек. Обновление...")
+                self.refresh_token(stale_token=iam_token)
+                started = time.monotonic()
+                response = http_client.post(self.gpt_url, upstream='gpt', headers=self.headers, json=payload, stream=True)
+            
+            completed = False
+            try:
+                if response.status_code != 200:
+                    error_msg = f"Ошибка при обращении к YandexGPT: {response.status_code} - {response.text}"
+                    self.logger.error(error_msg)
+                    raise Exception(error_msg)
+                
+                generated = ""
+                result = {}
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        error_msg = f"Ошибка генерации YandexGPT: {chunk['error'].get('message', chunk['error'])}"
+                        self.logger.error(error_msg)
+                        raise Exception(error_msg)
+                    result = chunk["result"]
+                    text = result["alternatives"][0]["message"]["text"]
+                    if len(text) > len(generated):
+                        yield text[len(generated):]
+                        generated = text
+                completed = True
+                # Последний фрагмент содержит итоговый расход токенов
+                self._record_usage(payload, result, generated)
+            finally:
+                response.close()
+                # Прерванный клиентом поток не считается ни успехом, ни ошибкой модели
+                if completed or response.status_code != 200:
+                    self._observe_latency(payload, started, completed)
+    
+    def _request_completion(self, payload):
         """Отправка запроса к API YandexGPT с автоматическим обновлением токена при необходимости"""
         try:
-            response = requests.post(self.gpt_url, headers=self.headers, json=payload)
+            self._check_budget(payload)
+            iam_token = self.iam_token
+            with self.scheduler.slot(self.session_id):
+                started = time.monotonic()
+                response = http_client.post(self.gpt_url, upstream='gpt', headers=self._build_headers(iam_token), json=payload)
+            if response.status_code != 401:
+                self._observe_latency(payload, started, response.status_code == 200)
             
             if response.status_code == 200:
-                result = response.json()
-                return result["result"]["alternatives"][0]["message"]["text"]
+                return self._parse_completion(payload, response)
             elif response.status_code == 401:
                 # Если 401 (неавторизован), обновляем токен и повторяем запрос
                 self.logger.warning("Токен для GPT истек. Обновление...")
-                self.refresh_token()
+                self.refresh_token(stale_token=iam_token)
                 
                 # Повторяем запрос с новым токеном
-                retry_response = requests.post(self.gpt_url, headers=self.headers, json=payload)
+                with self.scheduler.slot(self.session_id):
+                    started = time.monotonic()
+                    retry_response = http_client.post(self.gpt_url, upstream='gpt', headers=self.headers, json=payload)
+                self._observe_latency(payload, started, retry_response.status_code == 200)
                 
                 if retry_response.status_code == 200:
-                    result = retry_response.json()
-                    return result["result"]["alternatives"][0]["message"]["text"]
+                    return self._parse_completion(payload, retry_response)
                 else:
                     error_msg = f"Ошибка при обращении к YandexGPT после обновления токена: {retry_response.status_code} - {retry_response.text}"
                     self.logger.error(error_msg)
@@ -164,4 +763,11 @@ class GPTService:
                 raise Exception(error_msg)
         except Exception as e:
             self.logger.error(f"Ошибка при отправке запроса к YandexGPT: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    def _parse_completion(self, payload, response):
+        """Текст ответа YandexGPT с учетом израсходованных токенов"""
+        result = response.json()["result"]
+        text = result["alternatives"][0]["message"]["text"]
+        self._record_usage(payload, result, text)
+        return text
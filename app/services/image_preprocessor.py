@@ -0,0 +1,202 @@
+import io
+import json
+import time
+import logging
+from threading import Lock
+from typing import Dict, Any, Tuple
+import numpy as np
+from PIL import Image
+from app.config import Config
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+class ImagePreprocessor:
+    """
+    Подготовка изображений перед отправкой в OCR.
+
+    Уменьшает объем загружаемых данных: переводит изображение в оттенки
+    серого, уменьшает до целевого разрешения, перекодирует форматы без
+    потерь (PNG, TIFF, BMP) в JPEG и при необходимости выравнивает наклон.
+    Для каждой стадии учитываются размер результата и затраченное время.
+    """
+
+    LOSSLESS_FORMATS = {'PNG', 'TIFF', 'BMP', 'GIF'}
+
+    def __init__(self, grayscale: bool = None, target_dpi: int = None, max_megapixels: float = None,
+                 jpeg_quality: int = None, deskew: bool = None):
+        """
+        Args:
+            grayscale: Переводить изображение в оттенки серого
+            target_dpi: Целевое разрешение; изображения с большим DPI уменьшаются
+            max_megapixels: Ограничение размера изображения в мегапикселях
+            jpeg_quality: Качество JPEG при перекодировании
+            deskew: Выравнивать наклон текста (требуется OpenCV)
+        """
+        self.grayscale = Config.OCR_GRAYSCALE if grayscale is None else grayscale
+        self.target_dpi = target_dpi or Config.OCR_TARGET_DPI
+        self.max_megapixels = max_megapixels or Config.OCR_MAX_MEGAPIXELS
+        self.jpeg_quality = jpeg_quality or Config.OCR_JPEG_QUALITY
+        self.deskew = Config.OCR_DESKEW if deskew is None else deskew
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = Lock()
+        self._totals = {'images': 0, 'input_bytes': 0, 'output_bytes': 0, 'seconds': 0.0, 'stages': {}}
+
+    def fingerprint(self) -> str:
+        """
+        Параметры предобработки, влияющие на результат распознавания.
+        """
+        return json.dumps({
+            'grayscale': self.grayscale,
+            'target_dpi': self.target_dpi,
+            'max_megapixels': self.max_megapixels,
+            'jpeg_quality': self.jpeg_quality,
+            'deskew': self.deskew,
+        }, sort_keys=True)
+
+    def process(self, image_bytes: bytes) -> Tuple[bytes, Dict[str, Any]]:
+        """
+        Выполняет предобработку изображения.
+
+        Args:
+            image_bytes: Исходные байты изображения (bytes, memoryview или mmap)
+
+        Returns:
+            Байты для отправки в OCR и отчет по стадиям. Если предобработка не
+            уменьшила размер (и наклон не исправлялся), возвращаются исходные байты
+        """
+        started = time.perf_counter()
+        stages = []
+
+        def stage(name, stage_started, size=None):
+            stages.append({'name': name, 'seconds': round(time.perf_counter() - stage_started, 4), 'bytes': size})
+
+        stage_started = time.perf_counter()
+        image = self._open(image_bytes)
+        source_format = image.format
+        changed = False
+        deskewed = False
+        stage('open', stage_started)
+
+        if self.grayscale and image.mode != 'L':
+            stage_started = time.perf_counter()
+            image = image.convert('L')
+            changed = True
+            stage('grayscale', stage_started)
+
+        scale = self._scale_factor(image)
+        if scale < 1:
+            stage_started = time.perf_counter()
+            size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+            changed = True
+            stage('downscale', stage_started)
+
+        if self.deskew and cv2 is not None:
+            stage_started = time.perf_counter()
+            rotated = self._deskew(image)
+            if rotated is not None:
+                image = rotated
+                changed = deskewed = True
+            stage('deskew', stage_started)
+
+        output = image_bytes
+        if changed or source_format in self.LOSSLESS_FORMATS:
+            stage_started = time.perf_counter()
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
+            encoded = buffer.getvalue()
+            stage('encode', stage_started, len(encoded))
+            # Выровненное изображение отправляется даже если оно не стало меньше
+            if deskewed or len(encoded) < len(image_bytes):
+                output = encoded
+
+        report = {
+            'format': source_format,
+            'input_bytes': len(image_bytes),
+            'output_bytes': len(output),
+            'bytes_saved': len(image_bytes) - len(output),
+            'seconds': round(time.perf_counter() - started, 4),
+            'stages': stages,
+        }
+        self._record(report)
+        return output, report
+
+    @staticmethod
+    def _open(image_bytes) -> Image.Image:
+        """
+        Открывает изображение без копирования буфера.
+        
+        Пиксели декодируются лениво, только если требуется преобразование.
+        """
+        if hasattr(image_bytes, 'seek'):
+            # mmap поддерживает файловый интерфейс
+            image_bytes.seek(0)
+            return Image.open(image_bytes)
+        return Image.open(io.BytesIO(image_bytes))
+
+    def _scale_factor(self, image: Image.Image) -> float:
+        """
+        Коэффициент уменьшения с учетом DPI изображения и ограничения по пикселям.
+        """
+        scale = 1.0
+        dpi = image.info.get('dpi')
+        if dpi and dpi[0] and float(dpi[0]) > self.target_dpi:
+            scale = self.target_dpi / float(dpi[0])
+        pixels = image.width * image.height * scale * scale
+        max_pixels = self.max_megapixels * 1000000
+        if pixels > max_pixels:
+            scale *= (max_pixels / pixels) ** 0.5
+        return scale
+
+    def _deskew(self, image: Image.Image):
+        """
+        Выравнивает наклон текста по минимальному ограничивающему прямоугольнику.
+
+        Returns:
+            Выровненное изображение или None, если наклон незначителен
+        """
+        gray = np.asarray(image.convert('L'))
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        coords = np.column_stack(np.where(binary > 0))
+        if len(coords) < 100:
+            return None
+        angle = cv2.minAreaRect(coords.astype(np.float32))[-1]
+        # Приводим угол OpenCV к диапазону (-45, 45]
+        if angle > 45:
+            angle -= 90
+        elif angle < -45:
+            angle += 90
+        if abs(angle) < 0.5 or abs(angle) > 15:
+            return None
+        fill = 255 if image.mode == 'L' else (255, 255, 255)
+        return image.rotate(-angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+    def _record(self, report: Dict[str, Any]):
+        """Накапливает статистику по обработанным изображениям"""
+        with self._lock:
+            self._totals['images'] += 1
+            self._totals['input_bytes'] += report['input_bytes']
+            self._totals['output_bytes'] += report['output_bytes']
+            self._totals['seconds'] += report['seconds']
+            for item in report['stages']:
+                self._totals['stages'][item['name']] = self._totals['stages'].get(item['name'], 0.0) + item['seconds']
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Суммарная статистика предобработки.
+
+        Returns:
+            Количество изображений, размеры до и после и время по стадиям
+        """
+        with self._lock:
+            stats = dict(self._totals)
+            stats['stages'] = {name: round(seconds, 4) for name, seconds in self._totals['stages'].items()}
+        stats['seconds'] = round(stats['seconds'], 4)
+        stats['bytes_saved'] = stats['input_bytes'] - stats['output_bytes']
+        return stats
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app.config import Config
+from app.database.db import db_session, write_transaction
+from app.models.job import Job
+
+class JobContext:
+    """Контекст выполнения задачи, передаваемый обработчику"""
+
+    def __init__(self, service, job):
+        self.service = service
+        self.job_id = job.id
+        self.session_id = job.session_id
+        self.payload = job.get_payload()
+        # Сведения о стадиях, сохраненные предыдущими попытками выполнения
+        self.stages = job.get_stages()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Выполнение стадии задачи с записью статуса и времени в базу данных
+
+        Args:
+            name (str): Название стадии
+        """
+        started = time.perf_counter()
+        self.update_stage(name, status='running', started_at=datetime.utcnow().isoformat())
+        try:
+            yield
+        except Exception as e:
+            self.update_stage(name, status='failed', error=str(e),
+                              seconds=round(time.perf_counter() - started, 3))
+            raise
+        self.update_stage(name, status='done', finished_at=datetime.utcnow().isoformat(),
+                          seconds=round(time.perf_counter() - started, 3))
+
+    def update_stage(self, name, **fields):
+        """
+        Обновляет сведения о стадии (статус, прогресс и т.п.)
+
+        Args:
+            name (str): Название стадии
+            **fields: Поля для обновления
+        """
+        self.service.update_stage(self.job_id, name, **fields)
+
+class JobService:
+    """
+    Фоновое выполнение задач OCR/GPT
+
+    Задачи хранятся в таблице jobs и переживают перезапуск приложения.
+    Ограниченный пул потоков забирает задачи из очереди; захват выполняется
+    атомарным UPDATE, поэтому несколько воркеров gunicorn могут работать с
+    одной очередью. Задачи, зависшие в статусе running дольше срока аренды
+    (например, после падения процесса), возвращаются в очередь.
+    """
+
+    # Сколько самых старых задач из очереди рассматривать при выборе следующей
+    CLAIM_WINDOW = 50
+
+    def __init__(self, session=None, max_workers=None, poll_interval=None, lease_seconds=None, max_attempts=None):
+        """
+        Args:
+            session: scoped_session SQLAlchemy (по умолчанию общий db_session)
+            max_workers (int, optional): Количество потоков-обработчиков
+            poll_interval (float, optional): Интервал опроса очереди, секунды
+            lease_seconds (int, optional): Срок, после которого незавершенная задача считается зависшей
+            max_attempts (int, optional): Максимальное число попыток выполнения
+        """
+        self.session = session or db_session
+        self.max_workers = max_workers or Config.JOB_WORKERS
+        self.poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts or Config.JOB_MAX_ATTEMPTS
+        self.logger = logging.getLogger(__name__)
+
+        self._handlers = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._started_pid = None
+        self._lock = threading.Lock()
+
+    def register(self, job_type, handler, stages=None):
+        """
+        Регистрация обработчика задач
+
+        Args:
+            job_type (str): Тип задачи
+            handler: Функция handler(context) -> dict с результатом
+            stages (list, optional): Названия стадий для отображения статуса
+        """
+        self._handlers[job_type] = (handler, list(stages or []))
+
+    def submit(self, job_type, payload, session_id=None):
+        """
+        Постановка задачи в очередь
+
+        Args:
+            job_type (str): Тип задачи
+            payload (dict): Входные данные задачи
+            session_id (str, optional): Идентификатор сессии пользователя
+
+        Returns:
+            str: Идентификатор задачи
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+        job = Job(job_type, payload=payload, session_id=session_id, stages=self._handlers[job_type][1])
+        with write_transaction(self.session):
+            self.session.add(job)
+        self.start()
+        self._wakeup.set()
+        return job.id
+
+    def get_job(self, job_id):
+        """
+        Получение задачи по идентификатору
+
+        Returns:
+            Job: Задача или None
+        """
+        return self.session.query(Job).filter_by(id=job_id).first()
+
+    def start(self):
+        """Запуск потоков-обработчиков (однократно в каждом процессе)"""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._stopping.clear()
+            self._threads = []
+            for index in range(self.max_workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self.logger.info(f"Запущено {self.max_workers} обработчиков фоновых задач")
+
+    def stop(self, timeout=None):
+        """Остановка потоков-обработчиков"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._lock:
+            self._started_pid = None
+
+    def _worker_loop(self):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        while not self._stopping.is_set():
+            try:
+                self._requeue_stale()
+                job_id = self._claim_next(worker_id)
+                if job_id:
+                    self._run(job_id)
+                    continue
+            except Exception as e:
+                self.logger.error(f"Ошибка обработчика фоновых задач: {str(e)}")
+            finally:
+                self.session.remove()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim_next(self, worker_id):
+        """
+        Атомарно захватывает следующую задачу из очереди
+
+        Returns:
+            str: Идентификатор задачи или None, если очередь пуста
+        """
+        for _ in range(5):
+            with write_transaction(self.session) as session:
+                candidates = (session.query(Job.id, Job.session_id)
+                              .filter(Job.status == 'queued')
+                              .order_by(Job.created_at)
+                              .limit(self.CLAIM_WINDOW)
+                              .all())
+                if not candidates:
+                    return None
+                # Первой берется самая старая задача сессии с наименьшим числом выполняемых задач,
+                # чтобы длинная очередь одной сессии не задерживала остальных пользователей
+                running = dict(session.query(Job.session_id, func.count(Job.id))
+                               .filter(Job.status == 'running')
+                               .group_by(Job.session_id)
+                               .all())
+                candidate = min(candidates, key=lambda item: running.get(item.session_id, 0))
+                now = datetime.utcnow()
+                claimed = (session.query(Job)
+                           .filter(Job.id == candidate.id, Job.status == 'queued')
+                           .update({'status': 'running', 'worker_id': worker_id, 'started_at': now,
+                                    'updated_at': now, 'attempts': Job.attempts + 1},
+                                   synchronize_session=False))
+            if claimed:
+                return candidate.id
+        return None
+
+    def _requeue_stale(self):
+        """Возвращает в очередь задачи, аренда которых истекла"""
+        deadline = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        with write_transaction(self.session) as session:
+            stale = session.query(Job).filter(Job.status == 'running', Job.updated_at < deadline).all()
+            for job in stale:
+                self.logger.warning(f"Задача {job.id} зависла у {job.worker_id}, попытка {job.attempts} из {self.max_attempts}")
+                if job.attempts >= self.max_attempts:
+                    job.status = 'failed'
+                    job.error = 'Превышено число попыток выполнения'
+                    job.finished_at = datetime.utcnow()
+                else:
+                    job.status = 'queued'
+                    job.worker_id = None
+
+    def _run(self, job_id):
+        job = self.get_job(job_id)
+        handler, _ = self._handlers.get(job.job_type, (None, None))
+        context = JobContext(self, job)
+        try:
+            if handler is None:
+                raise ValueError(f"Нет обработчика для задачи типа {job.job_type}")
+            result = handler(context)
+            self._finish(job_id, status='done', result=result)
+        except Exception as e:
+            self.session.rollback()
+            self.logger.error(f"Задача {job_id} завершилась с ошибкой: {str(e)}")
+            self._finish(job_id, status='failed', error=str(e))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with write_transaction(self.session):
+            job = self.get_job(job_id)
+            job.status = status
+            job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+            job.error = error
+            job.finished_at = datetime.utcnow()
+
+    def update_stage(self, job_id, name, **fields):
+        """
+        Обновляет сведения о стадии задачи (также продлевает аренду)
+
+        Args:
+            job_id (str): Идентификатор задачи
+            name (str): Название стадии
+            **fields: Поля для обновления
+        """
+        with write_transaction(self.session):
+            job = self.get_job(job_id)
+            stages = job.get_stages()
+            stages.setdefault(name, {}).update(fields)
+            job.stages = json.dumps(stages, ensure_ascii=False)
+            job.updated_at = datetime.utcnow()
+
+# Общий для процесса экземпляр сервиса задач
+job_service = JobService()
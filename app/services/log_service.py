@@ -48,7 +48,8 @@ class LogService:
         # Обработчик для файла
         log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
         os.makedirs(log_dir, exist_ok=True)
-        file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'), encoding='utf-8')
+        # Файл создается при первой записи, а не при импорте модуля
+        file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'), encoding='utf-8', delay=True)
         file_handler.setLevel(logging.INFO)
         file_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         file_handler.setFormatter(file_format)
@@ -0,0 +1,215 @@
+import math
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from app.config import Config
+
+# Границы корзин гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+class _ModelLatency:
+    """Задержки ответов одной модели: гистограмма за все время и окно для перцентилей"""
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = deque()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds, now):
+        self.samples.append((now, seconds))
+        self.count += 1
+        self.total += seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def recent(self, now):
+        """Задержки за последние window секунд"""
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        return [seconds for _, seconds in self.samples]
+
+def percentile(values, fraction):
+    """
+    Перцентиль по ближайшему рангу
+
+    Args:
+        values (list): Значения
+        fraction (float): Доля от 0 до 1 (0.95 для p95)
+
+    Returns:
+        float: Значение перцентиля или None для пустого списка
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+class ModelRouter:
+    """
+    Выбор модели YandexGPT для каждого запроса
+
+    По умолчанию все запросы уходят в быструю модель (yandexgpt-lite). Большая
+    модель выбирается только для заданий, явно перечисленных в настройках
+    (GPT_ROUTER_LARGE_TASKS), если промпт не слишком длинный и ее p95 задержки
+    за последнее окно укладывается в SLO. Когда старые замеры выходят из окна,
+    большая модель снова получает запросы, поэтому после восстановления
+    сервиса маршрутизация возвращается сама.
+    """
+
+    def __init__(self, fast_model_uri, large_model_uri, large_tasks=(),
+                 large_max_prompt_tokens=3000, slo_seconds=20.0, window=300, min_samples=10):
+        """
+        Args:
+            fast_model_uri (str): URI быстрой модели
+            large_model_uri (str): URI большой модели
+            large_tasks (iterable): Типы заданий, для которых предпочтительна большая модель
+                (по умолчанию нет: все запросы идут в быструю модель)
+            large_max_prompt_tokens (int): Более длинные промпты отправляются в быструю модель
+            slo_seconds (float): Допустимый p95 задержки большой модели
+            window (float): Окно замеров для перцентилей, секунды
+            min_samples (int): Минимум замеров в окне для сравнения с SLO
+        """
+        self.fast_model_uri = fast_model_uri
+        self.large_model_uri = large_model_uri
+        self.large_tasks = set(large_tasks)
+        self.large_max_prompt_tokens = large_max_prompt_tokens
+        self.slo_seconds = slo_seconds
+        self.window = window
+        self.min_samples = min_samples
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._decisions = defaultdict(lambda: defaultdict(int))
+        self._slo_breached = False
+
+    def _model(self, model_uri):
+        latency = self._latencies.get(model_uri)
+        if latency is None:
+            latency = self._latencies[model_uri] = _ModelLatency(self.window)
+        return latency
+
+    def choose(self, task, prompt_tokens):
+        """
+        Выбор модели для запроса
+
+        Args:
+            task (str): Тип задания: explain, answer или examples
+            prompt_tokens (int): Оценка длины промпта в токенах
+
+        Returns:
+            str: URI модели
+        """
+        if task not in self.large_tasks:
+            model_uri, reason = self.fast_model_uri, 'task'
+        elif prompt_tokens > self.large_max_prompt_tokens:
+            model_uri, reason = self.fast_model_uri, 'prompt_length'
+        elif self._over_slo(self.large_model_uri):
+            model_uri, reason = self.fast_model_uri, 'slo_fallback'
+        else:
+            model_uri, reason = self.large_model_uri, 'task'
+        with self._lock:
+            self._decisions[task][(model_uri, reason)] += 1
+        return model_uri
+
+    def _over_slo(self, model_uri):
+        """Превышает ли p95 модели SLO по замерам в текущем окне"""
+        with self._lock:
+            recent = self._model(model_uri).recent(time.monotonic())
+            breached = len(recent) >= self.min_samples and percentile(recent, 0.95) > self.slo_seconds
+            changed = breached != self._slo_breached
+            self._slo_breached = breached
+        if changed:
+            if breached:
+                self.logger.warning(f"p95 модели {model_uri} превысил {self.slo_seconds} с, запросы переключены на {self.fast_model_uri}")
+            else:
+                self.logger.info(f"Задержка модели {model_uri} вернулась в пределы SLO")
+        return breached
+
+    def observe(self, model_uri, seconds, success=True):
+        """
+        Учет задержки завершенного запроса
+
+        Args:
+            model_uri (str): Модель
+            seconds (float): Время от отправки запроса до получения всего ответа
+            success (bool): Получен ли ответ; ошибки учитываются отдельно и в перцентили не входят
+        """
+        with self._lock:
+            latency = self._model(model_uri)
+            if success:
+                latency.observe(seconds, time.monotonic())
+            else:
+                latency.errors += 1
+
+    def get_stats(self):
+        """
+        Гистограммы задержек по моделям и счетчики решений маршрутизатора
+
+        Returns:
+            dict: models (count, errors, p50/p95 в окне, гистограмма) и decisions по типам заданий
+        """
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for model_uri, latency in self._latencies.items():
+                recent = latency.recent(now)
+                p50, p95 = percentile(recent, 0.5), percentile(recent, 0.95)
+                models[model_uri] = {
+                    'count': latency.count,
+                    'errors': latency.errors,
+                    'mean': round(latency.total / latency.count, 3) if latency.count else None,
+                    'window_samples': len(recent),
+                    'p50': round(p50, 3) if p50 is not None else None,
+                    'p95': round(p95, 3) if p95 is not None else None,
+                    'histogram': {
+                        **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, latency.buckets)},
+                        'inf': latency.buckets[-1]
+                    }
+                }
+            decisions = {}
+            for task, counts in self._decisions.items():
+                decisions[task] = {}
+                for (model_uri, reason), count in counts.items():
+                    decisions[task].setdefault(model_uri, {})[reason] = count
+        return {
+            'slo_seconds': self.slo_seconds,
+            'window_seconds': self.window,
+            'models': models,
+            'decisions': decisions
+        }
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_model_router():
+    """
+    Общий для процесса маршрутизатор моделей
+
+    Returns:
+        ModelRouter: Маршрутизатор или None, если маршрутизация отключена
+    """
+    global _router
+    if not Config.GPT_ROUTING_ENABLED:
+        return None
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(
+                Config.YANDEX_GPT_MODEL,
+                Config.YANDEX_GPT_LARGE_MODEL,
+                large_tasks=[task.strip() for task in Config.GPT_ROUTER_LARGE_TASKS.split(',') if task.strip()],
+                large_max_prompt_tokens=Config.GPT_ROUTER_LARGE_MAX_PROMPT_TOKENS,
+                slo_seconds=Config.GPT_ROUTER_SLO_P95,
+                window=Config.GPT_ROUTER_LATENCY_WINDOW,
+                min_samples=Config.GPT_ROUTER_MIN_SAMPLES
+            )
+        return _router
@@ -1,25 +1,151 @@
 import base64
-import requests
+import hashlib
 import json
+import mmap
 import os
 from pathlib import Path
 from typing import List, Dict, Any
 import logging
-from app.utils.token_manager import get_token
+from app.config import Config
+from app.services.image_preprocessor import ImagePreprocessor
+from app.services.scheduler import get_scheduler
+from app.utils.http_client import http_client
+from app.utils.result_cache import ResultCache
+from app.utils.single_flight import SingleFlight
+from app.utils.token_manager import TokenManager, get_token, token_manager
+
+_ocr_cache = None
+_ocr_single_flight = None
+_image_preprocessor = None
+
+def get_ocr_cache() -> ResultCache:
+    """
+    Общий для процесса кэш результатов OCR.
+    
+    Returns:
+        Кэш или None, если кэширование отключено
+    """
+    global _ocr_cache
+    if _ocr_cache is None and Config.OCR_CACHE_ENABLED:
+        _ocr_cache = ResultCache(
+            'ocr',
+            max_entries=Config.OCR_CACHE_MAX_ENTRIES,
+            db_path=Config.CACHE_DB_PATH,
+            max_disk_entries=Config.OCR_CACHE_MAX_DISK_ENTRIES
+        )
+    return _ocr_cache
+
+def get_ocr_single_flight() -> SingleFlight:
+    """
+    Общий для процесса механизм объединения одинаковых запросов OCR.
+    
+    Returns:
+        SingleFlight или None, если объединение отключено
+    """
+    global _ocr_single_flight
+    if _ocr_single_flight is None and Config.SINGLE_FLIGHT_ENABLED:
+        _ocr_single_flight = SingleFlight(
+            'ocr',
+            db_path=Config.CACHE_DB_PATH,
+            lease_seconds=Config.SINGLE_FLIGHT_LEASE_SECONDS,
+            poll_interval=Config.SINGLE_FLIGHT_POLL_INTERVAL
+        )
+    return _ocr_single_flight
+
+def get_image_preprocessor() -> ImagePreprocessor:
+    """
+    Общий для процесса препроцессор изображений.
+    
+    Returns:
+        Препроцессор или None, если предобработка отключена
+    """
+    global _image_preprocessor
+    if _image_preprocessor is None and Config.OCR_PREPROCESS_ENABLED:
+        _image_preprocessor = ImagePreprocessor()
+    return _image_preprocessor
+
+class StreamingAnalyzeBody:
+    """
+    Тело запроса batchAnalyze, формируемое потоково.
+    
+    Изображения кодируются в base64 небольшими блоками во время отправки,
+    поэтому в памяти не создаются base64-строка, словарь запроса и
+    сериализованный JSON размером с изображение. Длина тела известна заранее,
+    и requests отправляет его с Content-Length. Тело можно перечитывать при
+    повторе запроса.
+    """
+    
+    # Размер блока исходных данных; кратен 3, чтобы блоки base64 склеивались без паддинга
+    CHUNK_SIZE = 3 * 64 * 1024
+    
+    def __init__(self, folder_id: str, specs: List[Dict[str, Any]]):
+        """
+        Args:
+            folder_id: Идентификатор каталога в Яндекс.Облаке
+            specs: Элементы analyzeSpecs, поле content содержит буфер изображения
+        """
+        self._parts = [('{"folderId": %s, "analyzeSpecs": [' % json.dumps(folder_id)).encode('utf-8')]
+        for index, spec in enumerate(specs):
+            rest = {key: value for key, value in spec.items() if key != 'content'}
+            self._parts.append((', ' if index else '').encode('utf-8') + b'{"content": "')
+            # Статические фрагменты JSON хранятся как bytes, изображения - как буферы (memoryview или mmap)
+            content = spec['content']
+            self._parts.append(content if isinstance(content, mmap.mmap) else memoryview(content))
+            self._parts.append(b'", ' + json.dumps(rest).encode('utf-8')[1:] if rest else b'"}')
+        self._parts.append(b']}')
+        self._length = sum(
+            len(part) if isinstance(part, bytes) else self.encoded_length(len(part))
+            for part in self._parts
+        )
+    
+    @staticmethod
+    def encoded_length(size: int) -> int:
+        """Длина base64-представления size байтов"""
+        return (size + 2) // 3 * 4
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            for offset in range(0, len(part), self.CHUNK_SIZE):
+                yield base64.b64encode(part[offset:offset + self.CHUNK_SIZE])
 
 class OCRService:
-    def __init__(self, folder_id: str, iam_token: str = None):
+    def __init__(self, folder_id: str, iam_token: str = None, cache: ResultCache = None,
+                 preprocessor: ImagePreprocessor = None, session_id: str = None, single_flight: SingleFlight = None):
         """
         Инициализация сервиса OCR.
         
         Args:
             folder_id: Идентификатор каталога в Яндекс.Облаке
             iam_token: IAM-токен для аутентификации (опционально, если не указан, токен будет получен из менеджера токенов)
+            cache: Кэш результатов распознавания (опционально, по умолчанию общий кэш процесса)
+            preprocessor: Препроцессор изображений (опционально, по умолчанию общий препроцессор)
+            session_id: Сессия пользователя, от имени которой выполняются запросы (для справедливого планирования)
+            single_flight: Объединение одинаковых одновременных запросов (по умолчанию общее для процесса)
         """
         self.folder_id = folder_id
-        self.iam_token = iam_token or get_token()  # Получаем токен из менеджера, если не передан
+        self._iam_token = iam_token
         self.vision_url = 'https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze'
+        self.language_codes = ['ru', 'en']
+        self.model = 'page'
+        self.cache = cache if cache is not None else get_ocr_cache()
+        self.preprocessor = preprocessor if preprocessor is not None else get_image_preprocessor()
+        self.session_id = session_id
+        self.scheduler = get_scheduler('vision')
+        self.single_flight = single_flight if single_flight is not None else get_ocr_single_flight()
         self.logger = logging.getLogger(__name__)
+    
+    @property
+    def iam_token(self) -> str:
+        """
+        Текущий IAM-токен: явно переданный или общий токен из менеджера токенов
+        """
+        return self._iam_token or get_token()
         
     @staticmethod
     def get_iam_token(oauth_token: str) -> str:
@@ -32,41 +158,46 @@ class OCRService:
         Returns:
             IAM-токен
         """
-        url = 'https://iam.api.cloud.yandex.net/iam/v1/tokens'
-        response = requests.post(
-            url,
-            json={'yandexPassportOauthToken': oauth_token}
-        )
-        
-        if response.status_code == 200:
-            return response.json().get('iamToken')
-        else:
-            error_message = f'Ошибка получения IAM-токена: {response.status_code} - {response.text}'
-            logging.error(error_message)
-            raise Exception(error_message)
+        if oauth_token == token_manager.oauth_token:
+            return get_token()
+        try:
+            iam_token, _ = TokenManager.exchange_oauth_token(oauth_token)
+            return iam_token
+        except Exception as e:
+            logging.error(str(e))
+            raise
     
-    def refresh_token(self):
+    def refresh_token(self, stale_token: str = None):
         """
         Обновляет IAM-токен через менеджер токенов
+        
+        Args:
+            stale_token: Токен, отклоненный API
         """
-        self.iam_token = get_token(force_refresh=True)
+        get_token(force_refresh=True, stale_token=stale_token)
+        self._iam_token = None
         self.logger.info("IAM-токен для OCR обновлен")
     
-    def recognize_file(self, file_path: str) -> str:
+    def recognize_file(self, file_path: str, digest: str = None, raise_errors: bool = False) -> str:
         """
         Распознает текст из файла изображения.
         
+        Файл отображается в память (mmap) и кодируется в base64 по частям прямо
+        в тело запроса, без промежуточных копий всего изображения.
+        
         Args:
             file_path: Путь к файлу изображения
+            digest: SHA-256 содержимого, если уже вычислен при сохранении
+            raise_errors: Передавать исключения вызывающему вместо текста ошибки
             
         Returns:
             Распознанный текст
         """
-        # Чтение и кодирование изображения
         with open(file_path, 'rb') as image_file:
-            image_content = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        return self._perform_recognition(image_content)
+            if os.fstat(image_file.fileno()).st_size == 0:
+                return self.recognize_buffer(b'', digest, raise_errors=raise_errors)
+            with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as image_buffer:
+                return self.recognize_buffer(image_buffer, digest, raise_errors=raise_errors)
     
     def process_image(self, image_bytes: bytes) -> str:
         """
@@ -80,77 +211,342 @@ class OCRService:
         """
         return self.recognize_bytes(image_bytes)
     
-    def recognize_bytes(self, image_bytes: bytes) -> str:
+    def recognize_bytes(self, image_bytes: bytes, raise_errors: bool = False) -> str:
         """
         Распознает текст из байтов изображения.
         
         Args:
             image_bytes: Байты изображения
+            raise_errors: Передавать исключения вызывающему вместо текста ошибки
             
         Returns:
             Распознанный текст
         """
-        image_content = base64.b64encode(image_bytes).decode('utf-8')
-        return self._perform_recognition(image_content)
+        return self.recognize_buffer(image_bytes, raise_errors=raise_errors)
     
-    def _perform_recognition(self, image_content: str) -> str:
+    def recognize_buffer(self, image_buffer, digest: str = None, raise_errors: bool = False) -> str:
         """
-        Выполняет запрос к API распознавания.
+        Распознает текст из буфера изображения (bytes, memoryview или mmap).
         
         Args:
-            image_content: Закодированное в base64 содержимое изображения
+            image_buffer: Буфер с содержимым изображения
+            digest: SHA-256 содержимого, если уже вычислен
+            raise_errors: Передавать исключения вызывающему; по умолчанию вместо
+                текста возвращается сообщение об ошибке
             
         Returns:
             Распознанный текст
         """
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.iam_token}'
-        }
+        cache_key = self.cache_key(image_buffer, digest)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            return self._recognize_once(cache_key, lambda: self._recognize_content(self._prepare_image(image_buffer)))
+        except Exception as e:
+            if raise_errors:
+                raise
+            return str(e)
+    
+    def _recognize_once(self, cache_key: str, recognize) -> str:
+        """
+        Распознает изображение через объединение одинаковых запросов и кэширует текст.
+        
+        Args:
+            cache_key: Ключ кэша изображения
+            recognize: Выполняет запрос к API и возвращает текст
+            
+        Returns:
+            Распознанный текст
+            
+        Raises:
+            Exception: Если API вернул ошибку
+        """
+        def compute():
+            text = recognize()
+            if self.cache is not None:
+                self.cache.set(cache_key, text)
+            return text
         
-        body = {
-            'folderId': self.folder_id,
-            'analyzeSpecs': [
+        if self.single_flight is None:
+            return compute()
+        # Одновременные запросы с тем же изображением ждут результата первого
+        lookup = (lambda: self.cache.get(cache_key)) if self.cache is not None else None
+        return self.single_flight.do(cache_key, compute, lookup)
+    
+    def cache_key(self, image_bytes, digest: str = None) -> str:
+        """
+        Ключ кэша: SHA-256 изображения и параметров распознавания.
+        
+        Args:
+            image_bytes: Байты изображения
+            digest: SHA-256 содержимого, если уже вычислен
+        """
+        return f"{digest or hashlib.sha256(image_bytes).hexdigest()}:{self.config_fingerprint()}"
+    
+    def config_fingerprint(self) -> str:
+        """
+        Отпечаток параметров распознавания: языки, модель и предобработка.
+        
+        Returns:
+            Первые 16 символов SHA-256 параметров
+        """
+        config = json.dumps({
+            'languageCodes': self.language_codes,
+            'model': self.model,
+            'preprocessing': self.preprocessor.fingerprint() if self.preprocessor is not None else None
+        }, sort_keys=True)
+        return hashlib.sha256(config.encode('utf-8')).hexdigest()[:16]
+    
+    def recognize_many(self, images: List[bytes], digests: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        Распознает текст нескольких изображений (страниц) пакетными запросами.
+        
+        Изображения упаковываются в один запрос batchAnalyze в пределах
+        ограничений API на количество и суммарный размер. Страницы, которые не
+        удалось распознать в пакете, повторно отправляются по одной. Уже
+        распознанные изображения берутся из кэша, а одинаковые одновременные
+        пакеты (например, повторная загрузка того же документа) выполняются
+        один раз.
+        
+        Args:
+            images: Список байтов изображений в порядке страниц
+            digests: SHA-256 изображений, если уже вычислены
+            
+        Returns:
+            Для каждого изображения в исходном порядке словарь с текстом и
+            ошибкой (None, если страница распознана)
+        """
+        digests = digests or [None] * len(images)
+        cache_keys = [self.cache_key(image, digest) for image, digest in zip(images, digests)]
+        results: List[Dict[str, Any]] = [None] * len(images)
+        
+        # Повторно распознаем только изображения, которых нет в кэше
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached = self.cache.get(cache_key) if self.cache is not None else None
+            if cached is not None:
+                results[index] = {'text': cached, 'error': None}
+            else:
+                pending.append(index)
+        if not pending:
+            return results
+        
+        def recognize():
+            return self._recognize_batch([images[index] for index in pending], [cache_keys[index] for index in pending])
+        
+        def lookup():
+            # Другой процесс распознал пакет: все страницы уже в кэше
+            texts = [self.cache.get(cache_keys[index]) for index in pending]
+            if any(text is None for text in texts):
+                return None
+            return [{'text': text, 'error': None} for text in texts]
+        
+        if self.single_flight is None:
+            recognized = recognize()
+        else:
+            batch_key = 'batch:' + hashlib.sha256('|'.join(cache_keys[index] for index in pending).encode('utf-8')).hexdigest()
+            recognized = self.single_flight.do(batch_key, recognize, lookup if self.cache is not None else None)
+        for index, result in zip(pending, recognized):
+            results[index] = result
+        return results
+    
+    def _recognize_batch(self, images: List[bytes], cache_keys: List[str]) -> List[Dict[str, Any]]:
+        """
+        Распознает изображения, которых нет в кэше, и кэширует успешные результаты.
+        
+        Args:
+            images: Байты изображений
+            cache_keys: Ключи кэша изображений
+            
+        Returns:
+            Словари с текстом и ошибкой для каждого изображения
+        """
+        results: List[Dict[str, Any]] = [None] * len(images)
+        prepared = [self._prepare_image(image) for image in images]
+        
+        for batch in self._split_batches(prepared):
+            try:
+                response_json = self._send_specs([self._build_spec(prepared[index]) for index in batch])
+                batch_results = response_json.get('results', [])
+            except Exception as e:
+                self.logger.warning(f'Пакетное распознавание {len(batch)} страниц не удалось, повтор по одной: {e}')
+                batch_results = []
+            
+            for position, index in enumerate(batch):
+                result = batch_results[position] if position < len(batch_results) else None
+                try:
+                    if result is None or self._result_has_error(result):
+                        # Частичный сбой пакета: распознаем страницу отдельным запросом
+                        text = self._recognize_once(cache_keys[index], lambda: self._recognize_content(prepared[index]))
+                    else:
+                        text = self._extract_text_from_result(result)
+                        if self.cache is not None:
+                            self.cache.set(cache_keys[index], text)
+                except Exception as e:
+                    results[index] = {'text': '', 'error': str(e)}
+                else:
+                    results[index] = {'text': text, 'error': None}
+        
+        return results
+    
+    def _prepare_image(self, image_buffer):
+        """
+        Предобрабатывает изображение перед отправкой.
+        
+        Args:
+            image_buffer: Исходный буфер изображения
+            
+        Returns:
+            Буфер для отправки: результат предобработки или исходный буфер
+        """
+        if self.preprocessor is not None:
+            try:
+                image_buffer, report = self.preprocessor.process(image_buffer)
+                self.logger.info(
+                    f"Предобработка изображения: {report['input_bytes']} -> {report['output_bytes']} байт "
+                    f"за {report['seconds']} с ({', '.join(stage['name'] for stage in report['stages'])})"
+                )
+            except Exception as e:
+                self.logger.warning(f"Предобработка изображения пропущена: {e}")
+        return image_buffer
+    
+    def _split_batches(self, images: List[bytes]) -> List[List[int]]:
+        """
+        Разбивает изображения на пакеты с учетом ограничений batchAnalyze.
+        
+        Args:
+            images: Подготовленные к отправке изображения
+            
+        Returns:
+            Списки индексов изображений для каждого пакета
+        """
+        batches = []
+        current: List[int] = []
+        current_size = 0
+        for index, image in enumerate(images):
+            size = StreamingAnalyzeBody.encoded_length(len(image))
+            if current and (len(current) >= Config.OCR_BATCH_MAX_IMAGES or current_size + size > Config.OCR_BATCH_MAX_BYTES):
+                batches.append(current)
+                current, current_size = [], 0
+            current.append(index)
+            current_size += size
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _build_spec(self, image) -> Dict[str, Any]:
+        """
+        Формирует элемент analyzeSpecs для одного изображения.
+        
+        Args:
+            image: Буфер изображения; в base64 кодируется при отправке
+        """
+        return {
+            'content': image,
+            'features': [
                 {
-                    'content': image_content,
-                    'features': [
-                        {
-                            'type': 'TEXT_DETECTION',
-                            'textDetectionConfig': {
-                                'languageCodes': ['ru', 'en'],
-                                'model': 'page'
-                            }
-                        }
-                    ]
+                    'type': 'TEXT_DETECTION',
+                    'textDetectionConfig': {
+                        'languageCodes': self.language_codes,
+                        'model': self.model
+                    }
                 }
             ]
         }
+    
+    def _perform_recognition(self, image) -> str:
+        """
+        Выполняет запрос к API распознавания.
         
-        response = requests.post(self.vision_url, headers=headers, json=body)
+        Args:
+            image: Буфер изображения
+            
+        Returns:
+            Распознанный текст
+        """
+        try:
+            return self._recognize_content(image)
+        except Exception as e:
+            return str(e)
+    
+    def _recognize_content(self, image) -> str:
+        """
+        Распознает одно изображение.
+        
+        Args:
+            image: Буфер изображения
+            
+        Returns:
+            Распознанный текст
+            
+        Raises:
+            Exception: Если API вернул ошибку
+        """
+        response_json = self._send_specs([self._build_spec(image)])
+        return self._extract_text_from_response(response_json)
+    
+    def _send_specs(self, specs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Отправляет запрос batchAnalyze, обновляя токен при ответе 401.
+        
+        Args:
+            specs: Элементы analyzeSpecs с буферами изображений в поле content
+            
+        Returns:
+            JSON-ответ от API
+            
+        Raises:
+            Exception: Если API вернул ошибку
+        """
+        iam_token = self.iam_token
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {iam_token}'
+        }
+        
+        body = StreamingAnalyzeBody(self.folder_id, specs)
+        
+        # Слот планировщика: стоимость пакета равна числу страниц в нем
+        with self.scheduler.slot(self.session_id, cost=len(specs)):
+            response = http_client.post(self.vision_url, upstream='vision', headers=headers, data=body)
         
         if response.status_code == 200:
-            return self._extract_text_from_response(response.json())
+            return response.json()
         elif response.status_code == 401:
             # Если 401 (Unauthorized), пробуем обновить токен и повторить запрос
             self.logger.warning("Токен истек. Пробуем обновить и повторить запрос")
-            self.refresh_token()
+            self.refresh_token(stale_token=iam_token)
             
             # Обновляем заголовки с новым токеном
             headers['Authorization'] = f'Bearer {self.iam_token}'
             
             # Повторяем запрос
-            retry_response = requests.post(self.vision_url, headers=headers, json=body)
+            with self.scheduler.slot(self.session_id, cost=len(specs)):
+                retry_response = http_client.post(self.vision_url, upstream='vision', headers=headers, data=body)
             
             if retry_response.status_code == 200:
-                return self._extract_text_from_response(retry_response.json())
-            else:
-                error_msg = f'Ошибка распознавания после обновления токена: {retry_response.status_code} - {retry_response.text}'
-                self.logger.error(error_msg)
-                return error_msg
+                return retry_response.json()
+            error_msg = f'Ошибка распознавания после обновления токена: {retry_response.status_code} - {retry_response.text}'
         else:
             error_msg = f'Ошибка распознавания: {response.status_code} - {response.text}'
-            self.logger.error(error_msg)
-            return error_msg
+        
+        self.logger.error(error_msg)
+        raise Exception(error_msg)
+    
+    @staticmethod
+    def _result_has_error(result: Dict[str, Any]) -> bool:
+        """
+        Проверяет, содержит ли результат для одного изображения ошибку.
+        """
+        if result.get('error'):
+            return True
+        inner_results = result.get('results')
+        if not inner_results:
+            return True
+        return any(item.get('error') for item in inner_results)
     
     def _extract_text_from_response(self, response_json: Dict[str, Any]) -> str:
         """
@@ -163,7 +559,25 @@ class OCRService:
             Извлеченный текст
         """
         try:
-            text_results = response_json['results'][0]['results'][0]['textDetection']['pages']
+            return self._extract_text_from_result(response_json['results'][0])
+        except (KeyError, IndexError) as e:
+            error_msg = f"Ошибка при извлечении текста из ответа: {e}"
+            self.logger.error(error_msg)
+            self.logger.debug(f"Ответ API: {json.dumps(response_json, indent=2, ensure_ascii=False)}")
+            return ''
+    
+    def _extract_text_from_result(self, result: Dict[str, Any]) -> str:
+        """
+        Извлекает текст из результата для одного изображения.
+        
+        Args:
+            result: Элемент results ответа API
+            
+        Returns:
+            Извлеченный текст
+        """
+        try:
+            text_results = result['results'][0]['textDetection']['pages']
             full_text = ''
             for page in text_results:
                 for block in page.get('blocks', []):
@@ -174,5 +588,5 @@ class OCRService:
         except (KeyError, IndexError) as e:
             error_msg = f"Ошибка при извлечении текста из ответа: {e}"
             self.logger.error(error_msg)
-            self.logger.debug(f"Ответ API: {json.dumps(response_json, indent=2, ensure_ascii=False)}")
-            return ''
\ No newline at end of file
+            self.logger.debug(f"Результат API: {json.dumps(result, indent=2, ensure_ascii=False)}")
+            return ''
@@ -0,0 +1,177 @@
+import time
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, List
+from app.config import Config
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+class PDFService:
+    """
+    Потоковая обработка PDF-документов.
+
+    Конвейер из трех стадий: извлечение встроенного текстового слоя,
+    растеризация только тех страниц, где его нет, и параллельный OCR этих
+    страниц пакетами (один запрос batchAnalyze на несколько подряд идущих
+    страниц) ограниченным пулом потоков. Результаты отдаются по страницам в
+    исходном порядке по мере готовности, а в памяти одновременно находится
+    не больше нескольких пакетов растеризованных страниц.
+    """
+
+    def __init__(self, ocr_service, max_workers: int = None, dpi: int = None, min_text_chars: int = None,
+                 batch_size: int = None):
+        """
+        Инициализация сервиса PDF.
+
+        Args:
+            ocr_service: Сервис OCR для страниц без текстового слоя
+            max_workers: Количество параллельных OCR-запросов
+            dpi: Разрешение растеризации страниц
+            min_text_chars: Минимальная длина текстового слоя, при которой OCR не нужен
+            batch_size: Число страниц в одном запросе OCR
+        """
+        self.ocr_service = ocr_service
+        self.max_workers = max_workers or Config.PDF_OCR_WORKERS
+        self.dpi = dpi or Config.PDF_RASTER_DPI
+        self.min_text_chars = Config.PDF_MIN_TEXT_CHARS if min_text_chars is None else min_text_chars
+        self.batch_size = batch_size or Config.OCR_BATCH_MAX_IMAGES
+        # Пакеты растеризованных, но еще не распознанных страниц, удерживаемые в памяти
+        self.max_in_flight = self.max_workers + 1
+        self.logger = logging.getLogger(__name__)
+
+    def iter_pages(self, file_path: str, page_numbers=None) -> Iterator[Dict[str, Any]]:
+        """
+        Обрабатывает PDF и отдает результаты по страницам в порядке следования.
+
+        Args:
+            file_path: Путь к PDF-файлу
+            page_numbers: Номера страниц (с 1), которые нужно обработать; по умолчанию все
+
+        Yields:
+            Словарь с номером страницы (с 1), текстом, источником текста
+            (text_layer или ocr), SHA-256 растеризованного изображения, статусом
+            (done или failed), ошибкой OCR и временем обработки в секундах
+        """
+        if pymupdf is None:
+            raise RuntimeError("Для обработки PDF необходимо установить PyMuPDF (pip install PyMuPDF)")
+
+        document = pymupdf.open(file_path)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pdf-ocr') as executor:
+                window = deque()
+                # Подряд идущие страницы без текстового слоя, собираемые в пакет.
+                # Пакет отправляется, когда заполнен или встретилась страница с
+                # текстом, поэтому его состав зависит только от документа
+                batch = []
+
+                if page_numbers is None:
+                    pages = document
+                else:
+                    # Загружаются только выбранные страницы, остальные не читаются
+                    pages = (document.load_page(number - 1) for number in sorted(page_numbers)
+                             if 1 <= number <= document.page_count)
+
+                for page in pages:
+                    page_number = page.number + 1
+                    started = time.perf_counter()
+                    text = page.get_text().strip()
+
+                    if len(text) >= self.min_text_chars:
+                        if batch:
+                            window.append(executor.submit(self._recognize_pages, batch))
+                            batch = []
+                        window.append(self._page_result(page_number, text, 'text_layer', started))
+                    else:
+                        if not batch:
+                            # Ограничиваем число пакетов, ожидающих OCR
+                            pending = [item for item in window if not isinstance(item, dict) and not item.done()]
+                            if len(pending) >= self.max_in_flight:
+                                wait(pending, return_when=FIRST_COMPLETED)
+
+                        batch.append((page_number, self._rasterize(page), started))
+                        if len(batch) >= self.batch_size:
+                            window.append(executor.submit(self._recognize_pages, batch))
+                            batch = []
+
+                    while window and (isinstance(window[0], dict) or window[0].done()):
+                        yield from self._resolve(window.popleft())
+
+                if batch:
+                    window.append(executor.submit(self._recognize_pages, batch))
+                while window:
+                    yield from self._resolve(window.popleft())
+        finally:
+            document.close()
+
+    @staticmethod
+    def page_count(file_path: str) -> int:
+        """
+        Число страниц PDF-документа.
+        """
+        if pymupdf is None:
+            raise RuntimeError("Для обработки PDF необходимо установить PyMuPDF (pip install PyMuPDF)")
+        with pymupdf.open(file_path) as document:
+            return document.page_count
+
+    def extract_text(self, file_path: str) -> str:
+        """
+        Извлекает полный текст PDF-документа.
+
+        Args:
+            file_path: Путь к PDF-файлу
+
+        Returns:
+            Текст всех страниц, разделенный пустыми строками
+        """
+        return '\n\n'.join(page['text'] for page in self.iter_pages(file_path) if page['text'])
+
+    def _rasterize(self, page) -> bytes:
+        """
+        Растеризует страницу в PNG в оттенках серого.
+        """
+        pixmap = page.get_pixmap(dpi=self.dpi, colorspace=pymupdf.csGRAY)
+        return pixmap.tobytes('png')
+
+    def _recognize_pages(self, batch) -> List[Dict[str, Any]]:
+        """
+        Распознает пакет растеризованных страниц; ошибка OCR отмечается в результате страницы.
+
+        Args:
+            batch: Кортежи (номер страницы, PNG, время начала обработки)
+        """
+        image_hashes = [hashlib.sha256(image_bytes).hexdigest() for _, image_bytes, _ in batch]
+        try:
+            recognized = self.ocr_service.recognize_many([image_bytes for _, image_bytes, _ in batch], image_hashes)
+        except Exception as e:
+            recognized = [{'text': '', 'error': str(e)}] * len(batch)
+        results = []
+        for (page_number, _, started), image_hash, page in zip(batch, image_hashes, recognized):
+            if page['error']:
+                self.logger.error(f"Ошибка OCR страницы {page_number}: {page['error']}")
+            results.append(self._page_result(page_number, page['text'], 'ocr', started, image_hash, error=page['error']))
+        return results
+
+    @staticmethod
+    def _resolve(item) -> List[Dict[str, Any]]:
+        return [item] if isinstance(item, dict) else item.result()
+
+    @staticmethod
+    def _page_result(page_number: int, text: str, source: str, started: float,
+                     image_hash: str = None, error: str = None) -> Dict[str, Any]:
+        return {
+            'page_number': page_number,
+            'text': text,
+            'source': source,
+            'image_hash': image_hash,
+            'status': 'failed' if error else 'done',
+            'error': error,
+            'elapsed': round(time.perf_counter() - started, 4)
+        }
@@ -0,0 +1,354 @@
+import os
+import time
+import hashlib
+from app.config import Config
+from app.database.db import db_session, write_transaction
+from app.models.document import Document
+from app.models.document_page import DocumentPage
+from app.services.ocr_service import OCRService
+from app.services.pdf_service import PDFService
+from app.services.log_service import LogService
+from app.services.job_service import job_service
+from app.services.retrieval_service import retrieval_service
+from app.services.document_service import save_page, assemble_content
+
+log_service = LogService()
+
+# Стадии обработки загруженного файла
+UPLOAD_STAGES = ['ocr', 'store', 'explain']
+# Стадии повторной обработки страниц документа
+REPROCESS_STAGES = ['ocr', 'store']
+# failed - страницы с ошибкой или не обработанные; stale - также страницы,
+# распознанные с другими настройками OCR; all - все страницы
+REPROCESS_MODES = ('failed', 'stale', 'all')
+
+NO_TEXT_MESSAGE = "Не удалось распознать текст. Пожалуйста, загрузите изображение лучшего качества."
+
+def create_document(file_path, title, file_type=None, content=None):
+    """
+    Создает запись документа до обработки страниц
+
+    Args:
+        file_path (str): Путь к сохраненному файлу
+        title (str): Название документа
+        file_type (str, optional): Расширение файла (по умолчанию из file_path)
+        content (str, optional): Текст документа, если он уже известен
+
+    Returns:
+        str: UUID документа
+    """
+    document = Document(
+        title=title,
+        content=content,
+        file_path=file_path,
+        file_type=file_type or os.path.splitext(file_path)[1].lower()
+    )
+    with write_transaction(db_session):
+        db_session.add(document)
+    return document.uuid
+
+def store_content(document_uuid, content):
+    """
+    Сохраняет собранный текст документа и строит индекс для ответов на вопросы
+
+    Args:
+        document_uuid (str): UUID документа
+        content (str): Текст документа
+    """
+    with write_transaction(db_session):
+        document = db_session.query(Document).filter_by(uuid=document_uuid).one()
+        document.content = content
+    # Индекс для выбора фрагментов при ответах на вопросы строится один раз
+    retrieval_service.build_index(document_uuid, content)
+
+def get_gpt_service(session_id=None, document_id=None):
+    """
+    Создает GPT-сервис из настроек приложения
+
+    Args:
+        session_id (str, optional): Сессия пользователя для планировщика запросов
+        document_id (str, optional): Документ, на который записывается расход токенов
+
+    Returns:
+        GPTService: Сервис или None, если настройки GPT не заданы
+    """
+    if not (Config.YANDEX_GPT_URL and Config.YANDEX_FOLDER_ID and Config.YANDEX_GPT_MODEL):
+        return None
+    from app.services.gpt_service import GPTService
+    from app.services.model_router import get_model_router
+    return GPTService(
+        gpt_url=Config.YANDEX_GPT_URL,
+        folder_id=Config.YANDEX_FOLDER_ID,
+        model_uri=Config.YANDEX_GPT_MODEL,
+        session_id=session_id,
+        endpoint='upload',
+        document_id=document_id,
+        router=get_model_router()
+    )
+
+def is_pdf(file_path):
+    return file_path.lower().endswith('.pdf')
+
+def count_pages(file_path):
+    """Число страниц файла: страницы PDF или одно изображение"""
+    return PDFService.page_count(file_path) if is_pdf(file_path) else 1
+
+def iter_file_pages(file_path, ocr_service, page_numbers=None, digest=None):
+    """
+    Обрабатывает страницы PDF или изображение как единственную страницу
+
+    Args:
+        file_path (str): Путь к файлу
+        ocr_service (OCRService): Сервис OCR
+        page_numbers (iterable, optional): Номера страниц (с 1); по умолчанию все
+        digest (str, optional): SHA-256 изображения, если уже вычислен
+
+    Yields:
+        dict: Результат страницы в формате PDFService.iter_pages
+    """
+    if is_pdf(file_path):
+        yield from PDFService(ocr_service).iter_pages(
+            file_path, set(page_numbers) if page_numbers is not None else None)
+        return
+    if page_numbers is not None and 1 not in page_numbers:
+        return
+    started = time.perf_counter()
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+    try:
+        text, error = ocr_service.recognize_file(file_path, digest=digest, raise_errors=True), None
+    except Exception as e:
+        text, error = '', str(e)
+    yield {
+        'page_number': 1,
+        'text': text,
+        'source': 'ocr',
+        'image_hash': digest,
+        'status': 'failed' if error else 'done',
+        'error': error,
+        'elapsed': round(time.perf_counter() - started, 4)
+    }
+
+def process_pages(document_uuid, file_path, ocr_service, page_numbers, session_id=None, digest=None, on_page=None):
+    """
+    Распознает страницы документа, сохраняя каждую отдельной транзакцией
+
+    Args:
+        document_uuid (str): UUID документа
+        file_path (str): Путь к исходному файлу
+        ocr_service (OCRService): Сервис OCR
+        page_numbers (list): Номера страниц для обработки
+        session_id (str, optional): Идентификатор сессии для логов
+        digest (str, optional): SHA-256 изображения
+        on_page (callable, optional): Вызывается с результатом каждой страницы
+
+    Returns:
+        tuple: Списки номеров обработанных и завершившихся ошибкой страниц
+    """
+    processed, failed = [], []
+    if not page_numbers:
+        return processed, failed
+    ocr_config = ocr_service.config_fingerprint()
+    for page in iter_file_pages(file_path, ocr_service, page_numbers, digest=digest):
+        save_page(db_session, document_uuid, page, ocr_config)
+        processed.append(page['page_number'])
+        if page['status'] == 'failed':
+            failed.append(page['page_number'])
+            log_service.warning(f"Страница {page['page_number']} не распознана: {page['error']}", session_id)
+        else:
+            source = 'текстовый слой' if page['source'] == 'text_layer' else 'OCR'
+            log_service.info(f"Страница {page['page_number']} обработана ({source}, {page['elapsed']} с)", session_id)
+        if on_page:
+            on_page(page)
+    return processed, failed
+
+def select_pages(document_uuid, total, mode='failed', ocr_config=None, page_numbers=None):
+    """
+    Номера страниц, которые нужно обработать повторно
+
+    Страницы, которых нет в таблице document_pages (документ загружен до
+    постраничного хранения или обработка прервалась), выбираются в любом режиме.
+
+    Args:
+        document_uuid (str): UUID документа
+        total (int): Число страниц в исходном файле
+        mode (str): failed, stale или all (см. REPROCESS_MODES)
+        ocr_config (str, optional): Текущий отпечаток настроек OCR для режима stale
+        page_numbers (iterable, optional): Рассматривать только эти страницы
+
+    Returns:
+        list: Номера страниц по возрастанию
+    """
+    if mode not in REPROCESS_MODES:
+        raise ValueError(f"Недопустимый режим повторной обработки: {mode}")
+    pages = {
+        page.page_number: page
+        for page in db_session.query(DocumentPage.page_number, DocumentPage.status,
+                                     DocumentPage.source, DocumentPage.ocr_config)
+        .filter(DocumentPage.document_uuid == document_uuid)
+    }
+    candidates = sorted(set(page_numbers)) if page_numbers else range(1, total + 1)
+    selected = []
+    for number in candidates:
+        if not 1 <= number <= total:
+            continue
+        page = pages.get(number)
+        if mode == 'all' or page is None or page.status != 'done':
+            selected.append(number)
+        elif mode == 'stale' and page.source == 'ocr' and page.ocr_config != ocr_config:
+            selected.append(number)
+    return selected
+
+def process_upload(job):
+    """
+    Обработчик задачи upload: OCR -> сохранение документа -> объяснение GPT
+
+    Документ создается до распознавания, а страницы сохраняются по мере
+    обработки. При повторном запуске задачи (после сбоя воркера) документ
+    из сведений стадии ocr используется снова и уже распознанные страницы
+    пропускаются.
+
+    Args:
+        job (JobContext): Контекст задачи; payload содержит file_path, filename и sha256
+
+    Returns:
+        dict: Распознанный текст, объяснение и идентификатор документа
+    """
+    payload = job.payload
+    session_id = job.session_id
+    file_path = payload['file_path']
+
+    with job.stage('ocr'):
+        ocr_service = OCRService(Config.YANDEX_FOLDER_ID, session_id=session_id)
+        document_id = job.stages.get('ocr', {}).get('document_id')
+        if not document_id or db_session.query(Document.id).filter_by(uuid=document_id).first() is None:
+            log_service.info('Создание документа', session_id)
+            document_id = create_document(file_path, payload.get('filename') or os.path.basename(file_path))
+
+        total = count_pages(file_path)
+        done = {
+            number for (number,) in db_session.query(DocumentPage.page_number)
+            .filter_by(document_uuid=document_id, status='done')
+        }
+        pending = [number for number in range(1, total + 1) if number not in done]
+        job.update_stage('ocr', document_id=document_id, pages=total, pages_done=len(done))
+        if done:
+            log_service.info(f'Продолжение обработки: распознано {len(done)} из {total} страниц', session_id)
+        elif is_pdf(file_path):
+            log_service.info('Начало обработки PDF по страницам', session_id)
+        else:
+            log_service.info('Начало распознавания текста (OCR)', session_id)
+
+        pages_done = []
+
+        def on_page(page):
+            pages_done.append(page['page_number'])
+            job.update_stage('ocr', pages_done=len(done) + len(pages_done))
+
+        _, failed = process_pages(document_id, file_path, ocr_service, pending, session_id,
+                                  digest=payload.get('sha256'), on_page=on_page)
+        if failed:
+            job.update_stage('ocr', pages_failed=len(failed))
+
+        extracted_text = assemble_content(db_session, document_id)
+        if not extracted_text:
+            log_service.warning('Не удалось распознать текст в изображении', session_id)
+            extracted_text = NO_TEXT_MESSAGE
+        else:
+            log_service.success('Текст успешно распознан', session_id)
+
+    with job.stage('store'):
+        log_service.info('Сохранение текста документа', session_id)
+        store_content(document_id, extracted_text)
+
+    if not payload.get('explain', True):
+        # Объяснение запрашивается клиентом отдельно в потоковом режиме
+        job.update_stage('explain', status='skipped')
+        return {
+            'status': 'success',
+            'extracted_text': extracted_text,
+            'explanation': None,
+            'document_id': document_id
+        }
+
+    with job.stage('explain'):
+        gpt_service = get_gpt_service(session_id, document_id)
+        if gpt_service is None:
+            log_service.warning('Отсутствуют необходимые конфигурации GPT', session_id)
+            explanation = "Объяснение недоступно. Пожалуйста, настройте необходимые параметры GPT-сервиса."
+        else:
+            try:
+                log_service.info('Запрос объяснения от YandexGPT', session_id)
+                explanation = gpt_service.explain_content(
+                    extracted_text,
+                    on_progress=lambda done, total: job.update_stage('explain', chunks_done=done, chunks=total)
+                )
+                log_service.success('Получено объяснение от YandexGPT', session_id)
+            except Exception as gpt_error:
+                log_service.error(f'Ошибка при работе с GPT: {str(gpt_error)}', session_id)
+                explanation = f"Не удалось получить объяснение: {str(gpt_error)}"
+
+    return {
+        'status': 'success',
+        'extracted_text': extracted_text,
+        'explanation': explanation,
+        'document_id': document_id
+    }
+
+def process_reprocess(job):
+    """
+    Обработчик задачи reprocess: повторное распознавание страниц документа
+
+    Args:
+        job (JobContext): Контекст задачи; payload содержит document_id,
+            mode (см. REPROCESS_MODES) и необязательный список pages
+
+    Returns:
+        dict: Номера обработанных страниц и страниц с ошибками
+    """
+    payload = job.payload
+    session_id = job.session_id
+    document_id = payload['document_id']
+    mode = payload.get('mode', 'failed')
+
+    with job.stage('ocr'):
+        document = db_session.query(Document).filter_by(uuid=document_id).first()
+        if document is None:
+            raise ValueError(f"Документ {document_id} не найден")
+        file_path = document.file_path
+        if not file_path or not os.path.exists(file_path):
+            raise FileNotFoundError(f"Исходный файл документа {document_id} недоступен")
+        ocr_service = OCRService(Config.YANDEX_FOLDER_ID, session_id=session_id)
+        page_numbers = select_pages(document_id, count_pages(file_path), mode,
+                                    ocr_config=ocr_service.config_fingerprint(),
+                                    page_numbers=payload.get('pages'))
+        job.update_stage('ocr', pages=len(page_numbers), pages_done=0)
+        log_service.info(f'Повторная обработка документа {document_id} ({mode}): страниц {len(page_numbers)}', session_id)
+        pages_done = []
+
+        def on_page(page):
+            pages_done.append(page['page_number'])
+            job.update_stage('ocr', pages_done=len(pages_done))
+
+        processed, failed = process_pages(document_id, file_path, ocr_service, page_numbers, session_id, on_page=on_page)
+
+    with job.stage('store'):
+        if processed:
+            content = assemble_content(db_session, document_id) or NO_TEXT_MESSAGE
+            store_content(document_id, content)
+            log_service.success(f'Документ {document_id} обновлен', session_id)
+
+    return {
+        'status': 'success',
+        'document_id': document_id,
+        'mode': mode,
+        'pages_processed': processed,
+        'pages_failed': failed
+    }
+
+job_service.register('upload', process_upload, stages=UPLOAD_STAGES)
+job_service.register('reprocess', process_reprocess, stages=REPROCESS_STAGES)
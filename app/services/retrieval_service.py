@@ -0,0 +1,270 @@
+import io
+import re
+import logging
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+from app.config import Config
+from app.database.db import db_session, write_transaction
+from app.models.document_index import DocumentIndex
+from app.utils.text_chunker import split_text
+
+_TOKEN = re.compile(r'\w+')
+
+# Частые слова, не помогающие найти нужный фрагмент
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так', 'его',
+    'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от',
+    'меня', 'еще', 'нет', 'о', 'из', 'ему', 'ли', 'если', 'или', 'ни', 'быть', 'был', 'до', 'для', 'это',
+    'этот', 'эта', 'эти', 'при', 'чем', 'где', 'какой', 'какая', 'какие', 'почему', 'зачем', 'кто',
+    'the', 'a', 'an', 'of', 'to', 'in', 'is', 'are', 'and', 'or', 'what', 'why', 'how', 'which', 'for', 'on',
+}
+
+# Длина основы: вместо морфологического анализа слова обрезаются до префикса,
+# чтобы разные падежные формы совпадали
+STEM_LENGTH = 6
+
+def tokenize(text):
+    """
+    Разбивает текст на основы слов для поиска
+
+    Args:
+        text (str): Текст
+
+    Returns:
+        list: Основы слов без стоп-слов
+    """
+    return [token[:STEM_LENGTH] for token in _TOKEN.findall(text.lower())
+            if token not in STOP_WORDS and (len(token) > 1 or token.isdigit())]
+
+class BM25Index:
+    """
+    Индекс BM25 по фрагментам одного документа
+
+    Статистика хранится в массивах NumPy в формате разреженной матрицы по
+    столбцам: для каждого термина - номера фрагментов и готовые веса BM25.
+    Поиск складывает веса терминов вопроса и выбирает top-k фрагментов.
+    """
+
+    def __init__(self, terms, indptr, indices, weights, passage_count):
+        """
+        Args:
+            terms (list): Словарь терминов
+            indptr (np.ndarray): Границы списков вхождений каждого термина
+            indices (np.ndarray): Номера фрагментов
+            weights (np.ndarray): Веса BM25 вхождений
+            passage_count (int): Число фрагментов
+        """
+        self.terms = list(terms)
+        self.vocabulary = {term: term_id for term_id, term in enumerate(self.terms)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.passage_count = passage_count
+
+    @classmethod
+    def build(cls, passages, k1=1.5, b=0.75):
+        """
+        Построение индекса
+
+        Args:
+            passages (list): Тексты фрагментов
+            k1 (float): Параметр насыщения частоты термина
+            b (float): Параметр нормализации по длине фрагмента
+
+        Returns:
+            BM25Index: Индекс
+        """
+        vocabulary = {}
+        term_ids, passage_ids, frequencies = [], [], []
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        for passage_id, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            lengths[passage_id] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                passage_ids.append(passage_id)
+                frequencies.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        passage_ids = np.asarray(passage_ids, dtype=np.int32)
+        frequencies = np.asarray(frequencies, dtype=np.float32)
+
+        order = np.lexsort((passage_ids, term_ids))
+        term_ids, passage_ids, frequencies = term_ids[order], passage_ids[order], frequencies[order]
+
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary)).astype(np.float32)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(document_frequency)
+
+        count = len(passages)
+        idf = np.log1p((count - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = float(lengths.mean()) if count else 0.0
+        average_length = average_length or 1.0
+        norm = k1 * (1 - b + b * lengths[passage_ids] / average_length)
+        weights = (idf[term_ids] * frequencies * (k1 + 1) / (frequencies + norm)).astype(np.float32)
+
+        terms = [None] * len(vocabulary)
+        for term, term_id in vocabulary.items():
+            terms[term_id] = term
+        return cls(terms, indptr, passage_ids, weights, count)
+
+    def search(self, query, top_k):
+        """
+        Поиск фрагментов, релевантных вопросу
+
+        Args:
+            query (str): Вопрос
+            top_k (int): Число фрагментов
+
+        Returns:
+            list: Пары (номер фрагмента, оценка) по убыванию оценки; только фрагменты с совпадениями
+        """
+        scores = np.zeros(self.passage_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            # Номера фрагментов в списке одного термина уникальны
+            scores[self.indices[start:end]] += self.weights[start:end]
+
+        top_k = min(top_k, self.passage_count)
+        if top_k <= 0:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(index), float(scores[index])) for index in candidates if scores[index] > 0]
+
+    def to_bytes(self):
+        """Сериализация индекса в формат npz"""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, terms=np.array(self.terms, dtype=str), indptr=self.indptr,
+                            indices=self.indices, weights=self.weights,
+                            passage_count=np.array([self.passage_count]))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Загрузка индекса, сохраненного to_bytes"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(arrays['terms'].tolist(), arrays['indptr'], arrays['indices'], arrays['weights'],
+                       int(arrays['passage_count'][0]))
+
+class RetrievalService:
+    """
+    Выбор фрагментов документа, относящихся к вопросу
+
+    Индекс строится один раз при загрузке документа и хранится в таблице
+    document_indexes; недавно использованные индексы держатся в памяти.
+    Перед использованием индекса из памяти сверяется время его построения
+    в базе, поэтому перестройка в другом воркере (повторная обработка)
+    не оставляет устаревших фрагментов.
+    """
+
+    def __init__(self, session=None, cache_size=None):
+        """
+        Args:
+            session: scoped_session SQLAlchemy (по умолчанию общий db_session)
+            cache_size (int, optional): Сколько индексов хранить в памяти
+        """
+        self.session = session or db_session
+        self.cache_size = cache_size or Config.RETRIEVAL_INDEX_CACHE_SIZE
+        self.logger = logging.getLogger(__name__)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build_index(self, document_uuid, content):
+        """
+        Строит и сохраняет индекс документа
+
+        Args:
+            document_uuid (str): UUID документа
+            content (str): Текст документа
+
+        Returns:
+            tuple: (фрагменты, индекс)
+        """
+        passages = split_text(content or '', Config.RETRIEVAL_PASSAGE_TOKENS)
+        index = BM25Index.build(passages)
+        record = DocumentIndex(document_uuid, passages, index.to_bytes())
+        built_at = record.created_at
+        with write_transaction(self.session):
+            self.session.merge(record)
+        self._remember(document_uuid, built_at, (passages, index))
+        self.logger.info(f"Построен поисковый индекс документа {document_uuid}: {len(passages)} фрагментов, {len(index.terms)} терминов")
+        return passages, index
+
+    def get_index(self, document_uuid):
+        """
+        Индекс документа из памяти или базы данных
+
+        Returns:
+            tuple: (фрагменты, индекс) или None, если индекс не построен
+        """
+        built_at = (self.session.query(DocumentIndex.created_at)
+                    .filter_by(document_uuid=document_uuid).scalar())
+        with self._lock:
+            cached = self._cache.get(document_uuid)
+            if cached is not None and built_at is not None and cached[0] == built_at:
+                self._cache.move_to_end(document_uuid)
+                return cached[1]
+            # Индекс удален или перестроен другим процессом
+            self._cache.pop(document_uuid, None)
+        if built_at is None:
+            return None
+        record = (self.session.query(DocumentIndex).filter_by(document_uuid=document_uuid)
+                  .populate_existing().first())
+        if record is None:
+            return None
+        entry = (record.get_passages(), BM25Index.from_bytes(record.data))
+        self._remember(document_uuid, record.created_at, entry)
+        return entry
+
+    def select_context(self, document_uuid, content, question, top_k=None):
+        """
+        Текст для ответа на вопрос: top-k фрагментов в порядке следования в документе
+
+        Короткий документ возвращается целиком. Если индекса нет, он строится.
+
+        Args:
+            document_uuid (str): UUID документа
+            content (str или callable): Полный текст документа или функция,
+                возвращающая его; текст нужен только для построения индекса
+            question (str): Вопрос
+            top_k (int, optional): Число фрагментов
+
+        Returns:
+            str: Контекст для запроса к GPT
+        """
+        top_k = top_k or Config.RETRIEVAL_TOP_K
+        entry = self.get_index(document_uuid)
+        if entry is None:
+            if callable(content):
+                content = content()
+            if not content:
+                return ''
+            entry = self.build_index(document_uuid, content)
+        passages, index = entry
+        if len(passages) <= top_k:
+            return '\n\n'.join(passages)
+        hits = index.search(question, top_k)
+        # Если совпадений нет, отдаем начало документа
+        selected = sorted(passage_id for passage_id, _ in hits) or list(range(top_k))
+        return '\n\n'.join(passages[passage_id] for passage_id in selected)
+
+    def delete_index(self, document_uuid):
+        """Удаляет индекс документа (без фиксации транзакции)"""
+        with self._lock:
+            self._cache.pop(document_uuid, None)
+        self.session.query(DocumentIndex).filter_by(document_uuid=document_uuid).delete()
+
+    def _remember(self, document_uuid, built_at, entry):
+        with self._lock:
+            self._cache[document_uuid] = (built_at, entry)
+            self._cache.move_to_end(document_uuid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+# Общий для процесса экземпляр сервиса поиска
+retrieval_service = RetrievalService()
@@ -0,0 +1,213 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from app.config import Config
+
+ANONYMOUS_SESSION = 'anonymous'
+
+class _Waiter:
+    """Запрос на выполнение, ожидающий свободного слота"""
+
+    __slots__ = ('session_id', 'cost', 'event', 'enqueued_at', 'granted')
+
+    def __init__(self, session_id, cost):
+        self.session_id = session_id
+        self.cost = cost
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+class _SessionState:
+    """Очередь и счетчики одной сессии"""
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.waiters = deque()
+        self.deficit = 0.0
+        self.running = 0
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+class FairScheduler:
+    """
+    Справедливый планировщик обращений к внешнему API
+
+    У каждой сессии своя очередь; слоты раздаются по алгоритму deficit
+    round-robin: при каждом обходе сессия получает квант, пропорциональный
+    весу, и запускает запросы, пока их стоимость укладывается в накопленный
+    дефицит. Число одновременно выполняемых запросов ограничено глобально и
+    для каждой сессии, поэтому загрузка большой книги одной сессией не
+    блокирует интерактивные запросы остальных пользователей.
+    """
+
+    # Сколько неактивных сессий хранить в статистике
+    MAX_TRACKED_SESSIONS = 1000
+
+    def __init__(self, name, max_concurrency, session_concurrency, quantum=1.0):
+        """
+        Args:
+            name (str): Название планировщика (например, vision или gpt)
+            max_concurrency (int): Глобальное ограничение одновременных запросов
+            session_concurrency (int): Ограничение одновременных запросов одной сессии
+            quantum (float): Квант дефицита, начисляемый сессии за один обход
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.session_concurrency = session_concurrency
+        self.quantum = quantum
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._running = 0
+
+    @contextmanager
+    def slot(self, session_id=None, cost=1, weight=1.0, timeout=None):
+        """
+        Выполнение запроса в слоте планировщика
+
+        Args:
+            session_id (str, optional): Идентификатор сессии пользователя
+            cost (float): Стоимость запроса (например, число страниц в пакете)
+            weight (float): Вес сессии; больший вес дает большую долю слотов
+            timeout (float, optional): Максимальное время ожидания слота, секунды
+
+        Raises:
+            TimeoutError: Если слот не получен за timeout секунд
+        """
+        waiter = self.acquire(session_id, cost, weight, timeout)
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    def acquire(self, session_id=None, cost=1, weight=1.0, timeout=None):
+        """
+        Ожидание слота
+
+        Returns:
+            _Waiter: Выданный слот, который нужно вернуть через release
+        """
+        session_id = session_id or ANONYMOUS_SESSION
+        waiter = _Waiter(session_id, cost)
+        with self._lock:
+            state = self._get_state(session_id)
+            state.weight = weight
+            state.waiters.append(waiter)
+            self._dispatch()
+
+        if not waiter.event.wait(timeout):
+            with self._lock:
+                if not waiter.granted:
+                    self._sessions[session_id].waiters.remove(waiter)
+                    raise TimeoutError(f"Не удалось получить слот {self.name} за {timeout} с")
+        return waiter
+
+    def release(self, waiter):
+        """Возврат слота и запуск следующих запросов из очередей"""
+        with self._lock:
+            self._running -= 1
+            self._sessions[waiter.session_id].running -= 1
+            self._dispatch()
+
+    def _get_state(self, session_id):
+        """Состояние сессии; при необходимости удаляет давно неактивные сессии"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionState(1.0)
+            if len(self._sessions) > self.MAX_TRACKED_SESSIONS:
+                for stale_id in list(self._sessions):
+                    stale = self._sessions[stale_id]
+                    if not stale.waiters and not stale.running:
+                        del self._sessions[stale_id]
+                        break
+        return state
+
+    def _dispatch(self):
+        """Раздача свободных слотов по deficit round-robin (вызывается под блокировкой)"""
+        while self._running < self.max_concurrency:
+            eligible = [session_id for session_id, state in self._sessions.items()
+                        if state.waiters and state.running < self.session_concurrency]
+            if not eligible:
+                return
+            for session_id in eligible:
+                if self._running >= self.max_concurrency:
+                    return
+                state = self._sessions[session_id]
+                state.deficit += self.quantum * state.weight
+                # Обслуженная сессия уходит в конец круга
+                self._sessions.move_to_end(session_id)
+                while (state.waiters and state.waiters[0].cost <= state.deficit
+                       and state.running < self.session_concurrency
+                       and self._running < self.max_concurrency):
+                    self._grant(state, state.waiters.popleft())
+                if not state.waiters:
+                    # Пустая очередь не накапливает дефицит
+                    state.deficit = 0.0
+
+    def _grant(self, state, waiter):
+        wait = time.monotonic() - waiter.enqueued_at
+        state.deficit -= waiter.cost
+        state.running += 1
+        state.granted += 1
+        state.total_wait += wait
+        state.max_wait = max(state.max_wait, wait)
+        self._running += 1
+        waiter.granted = True
+        waiter.event.set()
+
+    def get_stats(self):
+        """
+        Статистика планировщика
+
+        Returns:
+            dict: Загрузка, глубина очередей и время ожидания по сессиям
+        """
+        now = time.monotonic()
+        with self._lock:
+            sessions = {}
+            for session_id, state in self._sessions.items():
+                oldest = now - state.waiters[0].enqueued_at if state.waiters else 0.0
+                sessions[session_id] = {
+                    'queued': len(state.waiters),
+                    'running': state.running,
+                    'granted': state.granted,
+                    'avg_wait': round(state.total_wait / state.granted, 4) if state.granted else 0.0,
+                    'max_wait': round(state.max_wait, 4),
+                    'oldest_wait': round(oldest, 4),
+                }
+            return {
+                'name': self.name,
+                'max_concurrency': self.max_concurrency,
+                'session_concurrency': self.session_concurrency,
+                'running': self._running,
+                'queued': sum(item['queued'] for item in sessions.values()),
+                'sessions': sessions,
+            }
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(upstream):
+    """
+    Общий для процесса планировщик обращений к внешнему API
+
+    Args:
+        upstream (str): vision или gpt
+
+    Returns:
+        FairScheduler: Планировщик указанного API
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(upstream)
+        if scheduler is None:
+            limits = {
+                'vision': (Config.SCHEDULER_OCR_CONCURRENCY, Config.SCHEDULER_OCR_SESSION_CONCURRENCY),
+                'gpt': (Config.SCHEDULER_GPT_CONCURRENCY, Config.SCHEDULER_GPT_SESSION_CONCURRENCY),
+            }
+            max_concurrency, session_concurrency = limits[upstream]
+            scheduler = _schedulers[upstream] = FairScheduler(upstream, max_concurrency, session_concurrency)
+        return scheduler
@@ -0,0 +1,237 @@
+import re
+import logging
+from sqlalchemy import text, DateTime
+from app.services.retrieval_service import STEM_LENGTH, STOP_WORDS
+
+_TOKEN = re.compile(r'\w+')
+# Окончания, отбрасываемые от слов запроса, чтобы совпадали другие формы слова
+_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее',
+    'ую', 'юю', 'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ы', 'и', 'а', 'я', 'о', 'е', 'у', 'ю', 'ь',
+), key=len, reverse=True)
+# Основа короче этого ищется как целое слово
+MIN_STEM_LENGTH = 4
+PREFIX_LENGTHS = ' '.join(str(length) for length in range(MIN_STEM_LENGTH, STEM_LENGTH + 1))
+
+# Индекс не хранит копию текста (external content), а читает его для snippet()
+# через представление documents_fts_source: content хранится сжатым
+# (CompressedText) и распаковывается функцией SQL decompress_text.
+# unicode61 приводит кириллицу и латиницу к нижнему регистру и убирает диакритику
+# (ё -> е); porter дополнительно стеммит английские слова. Индексы префиксов
+# ускоряют поиск по основам слов (см. build_match_query).
+CREATE_SOURCE_VIEW = """
+CREATE VIEW IF NOT EXISTS documents_fts_source AS
+SELECT id, title, decompress_text(content) AS content FROM documents
+"""
+
+CREATE_FTS_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, content,
+    content='documents_fts_source', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2',
+    prefix='{PREFIX_LENGTHS}'
+)
+"""
+
+# Удаление из external content индекса строки, которой в нем нет, портит индекс,
+# поэтому старые значения удаляются, только если строка уже проиндексирована
+# (документы, загруженные до появления индекса, добавляет backfill)
+_DELETE_OLD = """
+    INSERT INTO documents_fts(documents_fts, rowid, title, content)
+    SELECT 'delete', old.id, old.title, decompress_text(old.content)
+    WHERE EXISTS (SELECT 1 FROM documents_fts_docsize WHERE id = old.id);
+"""
+
+TRIGGERS = ('documents_fts_insert', 'documents_fts_delete', 'documents_fts_update')
+
+CREATE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, decompress_text(new.content));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+        {_DELETE_OLD}
+    END
+    """,
+    # Сжатие уже сохраненного текста (compress_column) не меняет его и не переиндексирует документ
+    f"""
+    CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF title, content ON documents
+    WHEN old.title IS NOT new.title OR decompress_text(old.content) IS NOT decompress_text(new.content) BEGIN
+        {_DELETE_OLD}
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, decompress_text(new.content));
+    END
+    """,
+)
+
+def is_supported(engine):
+    """Полнотекстовый поиск реализован на FTS5 и доступен только для SQLite"""
+    return engine.dialect.name == 'sqlite'
+
+def _upgrade_search_index(connection):
+    """
+    Пересоздает индекс, читавший текст прямо из таблицы documents
+
+    Такой индекс и его триггеры не умеют читать сжатый текст. Индекс
+    перестраивается из представления, поэтому после обновления повторный
+    backfill не нужен.
+    """
+    definition = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'"
+    )).scalar()
+    if definition is None or 'documents_fts_source' in definition:
+        return
+    logging.getLogger(__name__).info('Обновление индекса полнотекстового поиска для сжатого содержимого')
+    for trigger in TRIGGERS:
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+    connection.execute(text('DROP TABLE documents_fts'))
+    connection.execute(text(CREATE_SOURCE_VIEW))
+    connection.execute(text(CREATE_FTS_TABLE))
+    connection.execute(text("INSERT INTO documents_fts(documents_fts) VALUES('rebuild')"))
+
+def init_search_index(engine):
+    """
+    Создает индекс FTS5 и триггеры синхронизации с таблицей documents
+
+    Уже существующие документы в индекс не попадают: их добавляет backfill_search_index.
+    """
+    if not is_supported(engine):
+        return
+    with engine.begin() as connection:
+        _upgrade_search_index(connection)
+        connection.execute(text(CREATE_SOURCE_VIEW))
+        connection.execute(text(CREATE_FTS_TABLE))
+        for statement in CREATE_TRIGGERS:
+            connection.execute(text(statement))
+
+def backfill_search_index(engine, batch_size=500, on_batch=None):
+    """
+    Добавляет в индекс документы, которых в нем еще нет
+
+    Документы обрабатываются пакетами по возрастанию id, каждый пакет
+    фиксируется отдельной транзакцией, поэтому прерванное заполнение
+    продолжается с места остановки, а приложение может работать параллельно.
+
+    Args:
+        engine: Engine SQLAlchemy
+        batch_size (int): Документов в одной транзакции
+        on_batch (callable, optional): Вызывается как on_batch(добавлено всего, последний id)
+
+    Returns:
+        int: Число добавленных документов
+    """
+    if not is_supported(engine):
+        raise RuntimeError('Полнотекстовый поиск поддерживается только для SQLite')
+    init_search_index(engine)
+    indexed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            ids = connection.execute(text(
+                'SELECT id FROM documents WHERE id > :last_id '
+                'AND NOT EXISTS (SELECT 1 FROM documents_fts_docsize WHERE documents_fts_docsize.id = documents.id) '
+                'ORDER BY id LIMIT :batch_size'
+            ), {'last_id': last_id, 'batch_size': batch_size}).scalars().all()
+            if not ids:
+                break
+            connection.execute(text(
+                'INSERT INTO documents_fts(rowid, title, content) '
+                'SELECT id, title, decompress_text(content) FROM documents WHERE id BETWEEN :first AND :last '
+                'AND NOT EXISTS (SELECT 1 FROM documents_fts_docsize WHERE documents_fts_docsize.id = documents.id)'
+            ), {'first': ids[0], 'last': ids[-1]})
+        indexed += len(ids)
+        last_id = ids[-1]
+        if on_batch:
+            on_batch(indexed, last_id)
+    return indexed
+
+def _stem(token):
+    """Основа слова для поиска по префиксу или None, если слово слишком короткое"""
+    for ending in _ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM_LENGTH:
+            token = token[:-len(ending)]
+            break
+    if len(token) < MIN_STEM_LENGTH:
+        return None
+    return token[:STEM_LENGTH]
+
+def build_match_query(query):
+    """
+    Преобразует пользовательский запрос в выражение MATCH
+
+    Слова экранируются кавычками, поэтому операторы FTS5 во вводе не
+    интерпретируются. У слов отбрасывается окончание, и основа (не длиннее
+    STEM_LENGTH, как в поиске фрагментов для /ask) ищется как префикс, чтобы
+    совпадали разные падежные формы.
+
+    Args:
+        query (str): Текст запроса
+
+    Returns:
+        str: Выражение MATCH или None, если в запросе нет значимых слов
+    """
+    terms = []
+    for token in _TOKEN.findall(query.lower()):
+        if token in STOP_WORDS:
+            continue
+        stem = _stem(token)
+        terms.append(f'"{stem}"*' if stem else f'"{token}"')
+    return ' '.join(dict.fromkeys(terms)) or None
+
+class SearchService:
+    """Полнотекстовый поиск документов по названию и распознанному тексту"""
+
+    # Вес совпадений в названии относительно совпадений в тексте
+    TITLE_WEIGHT = 5.0
+
+    def __init__(self, session):
+        """
+        Args:
+            session: Сессия SQLAlchemy
+        """
+        self.session = session
+        self.logger = logging.getLogger(__name__)
+
+    def search(self, query, limit=20, offset=0, snippet_tokens=16):
+        """
+        Поиск документов, ранжированный по BM25
+
+        Args:
+            query (str): Текст запроса
+            limit (int): Размер страницы
+            offset (int): Сколько результатов пропустить
+            snippet_tokens (int): Длина фрагмента с совпадениями, в словах
+
+        Returns:
+            dict: results (uuid, title, score, snippet) и next_offset (None для последней страницы)
+        """
+        match = build_match_query(query)
+        if match is None:
+            return {'results': [], 'next_offset': None}
+        # ORDER BY rank сортирует совпадения внутри FTS5, и snippet() вычисляется
+        # только для строк страницы, а не для всех найденных документов
+        rows = self.session.execute(text(
+            'SELECT d.id, d.uuid, d.title, d.file_type, d.created_at, hits.score, hits.snippet FROM ('
+            ' SELECT rowid, rank AS score,'
+            " snippet(documents_fts, 1, '[', ']', '…', :snippet_tokens) AS snippet"
+            ' FROM documents_fts WHERE documents_fts MATCH :match AND rank MATCH :rank'
+            ' ORDER BY rank LIMIT :limit OFFSET :offset'
+            ') AS hits JOIN documents d ON d.id = hits.rowid ORDER BY hits.score, d.id'
+        ).columns(created_at=DateTime), {'match': match, 'rank': f'bm25({self.TITLE_WEIGHT}, 1.0)', 'snippet_tokens': snippet_tokens,
+            'limit': limit + 1, 'offset': offset}).all()
+
+        results = [
+            {
+                'id': row.id,
+                'uuid': row.uuid,
+                'title': row.title,
+                'file_type': row.file_type,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                # bm25() в FTS5 отрицателен: чем меньше, тем релевантнее
+                'score': round(-row.score, 4),
+                'snippet': row.snippet
+            }
+            for row in rows[:limit]
+        ]
+        return {'results': results, 'next_offset': offset + limit if len(rows) > limit else None}
@@ -1,151 +1,474 @@
 import os
+import gzip
 import json
+import hashlib
+import logging
+import tempfile
 from datetime import datetime
+from app.utils.file_lock import FileLock
 
 class StorageService:
-    """Сервис для хранения и управления данными документов"""
-    
-    def __init__(self, storage_dir):
+    """
+    Сервис для хранения и управления данными документов
+
+    Список документов хранится в памяти и восстанавливается при запуске из
+    снимка metadata.json и журнала metadata.journal. Сохранение и удаление
+    дописывают в журнал одну строку под межпроцессной блокировкой вместо
+    перезаписи всего файла метаданных. Когда записей в журнале становится
+    больше половины числа документов, журнал сжимается: снимок записывается во
+    временный файл и атомарно переименовывается, журнал начинается заново.
+    Операции журнала идемпотентны, поэтому сбой на любом шаге не повреждает
+    индекс: недописанная последняя строка отбрасывается, а повторное
+    применение журнала к новому снимку дает тот же результат.
+
+    Файлы документов по умолчанию раскладываются по 256 поддиректориям
+    documents/ab/ по первым символам SHA-1 от ID (равномерно при любом
+    формате ID; до 100 тысяч файлов в директории при 25 миллионах
+    документов) и пишутся компактным JSON, при
+    необходимости сжатым gzip. Формат хранилища записан в layout.json;
+    хранилище без него считается прежним: плоская директория и JSON с
+    отступами. Перевести хранилище в другой формат можно методом migrate.
+    """
+
+    # Минимальное число записей журнала, после которого выполняется сжатие
+    COMPACT_MIN_ENTRIES = 1000
+    # Прежний формат: все файлы в documents/, JSON с отступами
+    LEGACY_LAYOUT = {"layout": "flat", "compact": False, "compress": False}
+    LAYOUTS = ("flat", "sharded")
+
+    def __init__(self, storage_dir, fsync=True, compact_min_entries=None, layout="sharded", compact=True, compress=False):
         """
         Инициализация сервиса хранения
-        
+
         Args:
             storage_dir (str): Директория для хранения данных
+            fsync (bool): Сбрасывать записи на диск до возврата из операции
+            compact_min_entries (int, optional): Порог сжатия журнала
+            layout (str): Раскладка файлов нового хранилища: sharded или flat
+            compact (bool): Компактный JSON без отступов для нового хранилища
+            compress (bool): Сжимать файлы документов нового хранилища gzip
         """
         self.storage_dir = storage_dir
         self.documents_dir = os.path.join(storage_dir, "documents")
         self.metadata_file = os.path.join(storage_dir, "metadata.json")
-        
+        self.journal_file = os.path.join(storage_dir, "metadata.journal")
+        self.layout_file = os.path.join(storage_dir, "layout.json")
+        self.fsync = fsync
+        self.compact_min_entries = compact_min_entries or self.COMPACT_MIN_ENTRIES
+        self.logger = logging.getLogger(__name__)
+
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"Недопустимая раскладка хранилища: {layout}")
+
         # Создание директорий, если не существуют
+        new_store = not os.path.exists(self.documents_dir)
         os.makedirs(self.documents_dir, exist_ok=True)
-        
-        # Инициализация метаданных
-        if not os.path.exists(self.metadata_file):
-            self._save_metadata({
-                "documents": [],
-                "last_updated": datetime.now().isoformat()
-            })
-    
+        self.lock = FileLock(os.path.join(storage_dir, "metadata.lock"))
+        # Созданные директории шардов, чтобы не вызывать makedirs на каждое сохранение
+        self._shard_dirs = set()
+
+        # Индекс в памяти: id -> метаданные документа в порядке добавления
+        # (dict сохраняет порядок и перебирается быстрее OrderedDict)
+        self._documents = {}
+        # Открытый дескриптор журнала не дает системе переиспользовать его
+        # inode, поэтому замену журнала при сжатии можно обнаружить по inode
+        self._journal_fd = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+        with self.lock:
+            if os.path.exists(self.layout_file):
+                with open(self.layout_file, 'r', encoding='utf-8') as f:
+                    self.layout = json.load(f)
+            elif new_store or not os.path.exists(self.metadata_file):
+                self.layout = {"layout": layout, "compact": compact, "compress": compress}
+                self._save_layout(self.layout)
+            else:
+                self.layout = dict(self.LEGACY_LAYOUT)
+            if not os.path.exists(self.metadata_file):
+                self._save_metadata({
+                    "documents": [],
+                    "last_updated": datetime.now().isoformat()
+                })
+            self._load()
+
     def save_document(self, document):
         """
         Сохранение документа
-        
+
         Args:
             document: Документ для сохранения
-            
+
         Returns:
             str: ID документа
         """
         # Сохранение содержимого документа в отдельный файл
-        document_path = os.path.join(self.documents_dir, f"{document.id}.json")
-        with open(document_path, 'w', encoding='utf-8') as f:
-            json.dump(document.to_dict(), f, ensure_ascii=False, indent=2)
-        
+        self._write_document(self._document_path(document.id), document.to_dict())
+
         # Обновление метаданных
-        metadata = self._get_metadata()
-        metadata["documents"].append({
+        entry = {
             "id": document.id,
             "filename": document.filename,
             "created_at": document.created_at.isoformat()
-        })
-        metadata["last_updated"] = datetime.now().isoformat()
-        self._save_metadata(metadata)
-        
+        }
+        with self.lock:
+            self._refresh()
+            self._append({"op": "put", "document": entry})
+            self._documents[document.id] = entry
+            self._maybe_compact()
+
         return document.id
-    
+
     def get_document(self, document_id):
         """
         Получение документа по ID
-        
+
         Args:
             document_id (str): ID документа
-            
+
         Returns:
             dict: Данные документа или None, если документ не найден
         """
-        document_path = os.path.join(self.documents_dir, f"{document_id}.json")
-        if not os.path.exists(document_path):
+        document_path = self._find_document(document_id)
+        if document_path is None:
             return None
-        
-        with open(document_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    
+
+        return self._read_document(document_path)
+
     def update_document(self, document_id, update_data):
         """
         Обновление данных документа
-        
+
         Args:
             document_id (str): ID документа
             update_data (dict): Данные для обновления
-            
+
         Returns:
             bool: True в случае успеха, False если документ не найден
         """
         document = self.get_document(document_id)
         if not document:
             return False
-        
+
         # Обновление данных
         document.update(update_data)
-        
-        # Сохранение обновленных данных
-        document_path = os.path.join(self.documents_dir, f"{document_id}.json")
-        with open(document_path, 'w', encoding='utf-8') as f:
-            json.dump(document, f, ensure_ascii=False, indent=2)
-        
+
+        # Сохранение обновленных данных (документ в прежнем формате переносится)
+        document_path = self._document_path(document_id)
+        previous_path = self._find_document(document_id)
+        self._write_document(document_path, document)
+        if previous_path is not None and previous_path != document_path:
+            self._remove_file(previous_path)
+
         return True
-    
+
     def delete_document(self, document_id):
         """
         Удаление документа
-        
+
         Args:
             document_id (str): ID документа
-            
+
         Returns:
             bool: True в случае успеха, False если документ не найден
         """
-        document_path = os.path.join(self.documents_dir, f"{document_id}.json")
-        if not os.path.exists(document_path):
+        document_path = self._find_document(document_id)
+        if document_path is None:
             return False
-        
+
+        # Запись в журнал выполняется до удаления файла: после сбоя в индексе
+        # не останется документа без файла
+        with self.lock:
+            self._refresh()
+            self._append({"op": "delete", "id": document_id})
+            self._documents.pop(document_id, None)
+            self._maybe_compact()
+
         # Удаление файла документа
-        os.remove(document_path)
-        
-        # Обновление метаданных
-        metadata = self._get_metadata()
-        metadata["documents"] = [doc for doc in metadata["documents"] if doc["id"] != document_id]
-        metadata["last_updated"] = datetime.now().isoformat()
-        self._save_metadata(metadata)
-        
+        self._remove_file(document_path)
+
         return True
-    
+
     def get_all_documents(self):
         """
         Получение списка всех документов
-        
+
+        Записи, добавленные другими процессами, читаются из журнала
+        инкрементально. Словари метаданных общие с индексом и не должны
+        изменяться вызывающим.
+
         Returns:
             list: Список метаданных документов
         """
-        metadata = self._get_metadata()
-        return metadata["documents"]
-    
+        with self.lock:
+            self._refresh()
+            return list(self._documents.values())
+
+    def compact(self):
+        """
+        Сжатие журнала: запись снимка всех метаданных и очистка журнала
+        """
+        with self.lock:
+            self._refresh()
+            self._save_metadata({
+                "documents": list(self._documents.values()),
+                "last_updated": datetime.now().isoformat()
+            })
+            # Журнал заменяется новым файлом: другие процессы заметят смену
+            # файла и перечитают снимок
+            self._replace_file(self.journal_file, b'')
+            self._open_journal()
+            self._journal_offset = 0
+            self._journal_entries = 0
+
+    def close(self):
+        """Закрытие файла журнала"""
+        with self.lock:
+            if self._journal_fd is not None:
+                os.close(self._journal_fd)
+                self._journal_fd = None
+
+    def migrate(self, layout="sharded", compact=True, compress=False, on_progress=None):
+        """
+        Перевод файлов документов в другой формат на месте
+
+        Сначала записывается новый формат хранилища, затем каждый файл
+        переписывается атомарно и старый файл удаляется. Документы еще не
+        перенесенных файлов читаются по прежним путям, поэтому прерванную
+        миграцию можно просто запустить снова. Процессы, открывшие хранилище
+        до миграции, продолжают писать в прежнем формате до перезапуска.
+
+        Args:
+            layout (str): sharded или flat
+            compact (bool): JSON без отступов
+            compress (bool): Сжатие gzip
+            on_progress (callable, optional): Вызывается как on_progress(просмотрено, перенесено)
+
+        Returns:
+            tuple: Число просмотренных и перенесенных файлов
+        """
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"Недопустимая раскладка хранилища: {layout}")
+        target = {"layout": layout, "compact": compact, "compress": compress}
+        with self.lock:
+            self._save_layout(target)
+            self.layout = target
+        scanned = migrated = 0
+        for directory, _, filenames in os.walk(self.documents_dir):
+            for filename in filenames:
+                document_id = self._document_id(filename)
+                if document_id is None:
+                    continue
+                scanned += 1
+                path = os.path.join(directory, filename)
+                target_path = self._document_path(document_id)
+                if path != target_path:
+                    self._write_document(target_path, self._read_document(path))
+                    self._remove_file(path)
+                    migrated += 1
+                if on_progress and scanned % 1000 == 0:
+                    on_progress(scanned, migrated)
+        if on_progress:
+            on_progress(scanned, migrated)
+        self._remove_empty_dirs()
+        return scanned, migrated
+
+    def _document_path(self, document_id, layout=None):
+        layout = layout or self.layout
+        filename = f"{document_id}.json.gz" if layout["compress"] else f"{document_id}.json"
+        if layout["layout"] == "sharded":
+            digest = hashlib.sha1(document_id.encode('utf-8')).hexdigest()
+            return os.path.join(self.documents_dir, digest[:2], filename)
+        return os.path.join(self.documents_dir, filename)
+
+    def _find_document(self, document_id):
+        """Путь к файлу документа в текущем или, после неполной миграции, прежнем формате"""
+        document_path = self._document_path(document_id)
+        if os.path.exists(document_path):
+            return document_path
+        for layout in self.LAYOUTS:
+            for compress in (False, True):
+                path = self._document_path(document_id, {"layout": layout, "compress": compress})
+                if path != document_path and os.path.exists(path):
+                    return path
+        return None
+
+    @staticmethod
+    def _document_id(filename):
+        if filename.startswith('.tmp-'):
+            return None
+        for suffix in (".json.gz", ".json"):
+            if filename.endswith(suffix):
+                return filename[:-len(suffix)]
+        return None
+
+    def _read_document(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        if path.endswith('.gz'):
+            content = gzip.decompress(content)
+        return json.loads(content)
+
+    def _write_document(self, path, data):
+        """Атомарная запись файла документа в формате хранилища"""
+        if self.layout["compact"]:
+            content = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        else:
+            content = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        if path.endswith('.gz'):
+            content = gzip.compress(content, mtime=0)
+        directory = os.path.dirname(path)
+        if directory not in self._shard_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._shard_dirs.add(directory)
+        try:
+            self._replace_file(path, content)
+        except FileNotFoundError:
+            # Пустую директорию шарда удалила миграция в другом процессе
+            os.makedirs(directory, exist_ok=True)
+            self._replace_file(path, content)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_empty_dirs(self):
+        """Удаление пустых директорий шардов после миграции в плоский формат"""
+        for directory, _, _ in os.walk(self.documents_dir, topdown=False):
+            if directory != self.documents_dir:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        self._shard_dirs.clear()
+
+    def _save_layout(self, layout):
+        self._replace_file(self.layout_file, json.dumps(layout).encode('utf-8'))
+
     def _get_metadata(self):
         """
-        Получение метаданных
-        
+        Получение метаданных из снимка
+
         Returns:
             dict: Метаданные
         """
         with open(self.metadata_file, 'r', encoding='utf-8') as f:
             return json.load(f)
-    
+
     def _save_metadata(self, metadata):
         """
-        Сохранение метаданных
-        
+        Атомарная запись снимка метаданных
+
         Args:
             metadata (dict): Метаданные для сохранения
         """
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+        self._replace_file(self.metadata_file, json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def _open_journal(self):
+        if self._journal_fd is not None:
+            os.close(self._journal_fd)
+            self._journal_fd = None
+        try:
+            self._journal_fd = os.open(self.journal_file, os.O_RDONLY)
+        except FileNotFoundError:
+            pass
+
+    def _load(self):
+        """Построение индекса из снимка и всего журнала (под блокировкой)"""
+        self._documents = {entry["id"]: entry for entry in self._get_metadata()["documents"]}
+        self._open_journal()
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._replay()
+
+    def _refresh(self):
+        """Применение записей, добавленных в журнал другими процессами (под блокировкой)"""
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            stat = None
+        if self._journal_fd is None:
+            if stat is not None:
+                self._load()
+            return
+        opened = os.fstat(self._journal_fd)
+        if stat is None or (stat.st_dev, stat.st_ino) != (opened.st_dev, opened.st_ino):
+            # Журнал сжат другим процессом
+            self._load()
+        elif stat.st_size != self._journal_offset:
+            self._replay()
+
+    def _replay(self):
+        """Чтение журнала с текущей позиции и применение операций к индексу"""
+        if self._journal_fd is None:
+            return
+        size = os.fstat(self._journal_fd).st_size
+        if size <= self._journal_offset:
+            return
+        os.lseek(self._journal_fd, self._journal_offset, os.SEEK_SET)
+        data = os.read(self._journal_fd, size - self._journal_offset)
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            # Под блокировкой никто не пишет: неполная строка осталась после сбоя
+            self.logger.warning(f"Отброшена недописанная запись журнала {self.journal_file}")
+            os.truncate(self.journal_file, self._journal_offset + end)
+        for line in data[:end].splitlines():
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.logger.warning(f"Пропущена поврежденная запись журнала {self.journal_file}")
+                continue
+            if record.get("op") == "put":
+                self._documents[record["document"]["id"]] = record["document"]
+            elif record.get("op") == "delete":
+                self._documents.pop(record["id"], None)
+            self._journal_entries += 1
+        self._journal_offset += end
+
+    def _append(self, record):
+        """Дописывание операции в журнал одной записью (под блокировкой)"""
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        if self._journal_fd is None:
+            self._open_journal()
+        self._journal_offset += len(line)
+        self._journal_entries += 1
+
+    def _maybe_compact(self):
+        # Стоимость сжатия пропорциональна числу документов и делится на столько же операций
+        if self._journal_entries > max(self.compact_min_entries, len(self._documents) // 2):
+            self.compact()
+
+    def _replace_file(self, path, content):
+        """Атомарная замена файла: временный файл в той же директории и переименование"""
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            # Переименование становится устойчивым к сбою после сброса директории
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
@@ -0,0 +1,151 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from app.config import Config
+from app.database.db import engine
+from app.models.token_usage import TokenUsage
+from app.services.scheduler import ANONYMOUS_SESSION
+
+class TokenBudgetExceeded(Exception):
+    """Запрос превысил бы бюджет токенов сессии"""
+
+    def __init__(self, session_id, used, requested, budget):
+        self.session_id = session_id
+        self.used = used
+        self.requested = requested
+        self.budget = budget
+        super().__init__(f"Превышен лимит токенов YandexGPT: израсходовано {used} из {budget}, "
+                         f"запрос требует около {requested}")
+
+class UsageService:
+    """
+    Учет токенов YandexGPT по сессиям, документам и маршрутам
+
+    Каждый ответ модели записывается в таблицу token_usage отдельной короткой
+    транзакцией: запросы выполняются и из потоков map-reduce, и из фоновых
+    задач, где общий db_session не используется. Бюджет сессии проверяется
+    до отправки запроса по сумме токенов за скользящее окно. Запросы без
+    сессии учитываются и ограничиваются общим бюджетом ANONYMOUS_SESSION.
+    """
+
+    GROUP_COLUMNS = {
+        'session': TokenUsage.session_id,
+        'document': TokenUsage.document_id,
+        'endpoint': TokenUsage.endpoint,
+        'model': TokenUsage.model_uri,
+    }
+
+    def __init__(self, bind=None, budget=None, window=None):
+        """
+        Args:
+            bind: Engine SQLAlchemy (по умолчанию общий engine приложения)
+            budget (int, optional): Токенов на сессию за окно; 0 - без ограничения
+            window (int, optional): Длительность окна бюджета, секунды
+        """
+        self.session_factory = sessionmaker(bind=bind or engine)
+        self.budget = Config.GPT_SESSION_TOKEN_BUDGET if budget is None else budget
+        self.window = window or Config.GPT_BUDGET_WINDOW
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, session_id, endpoint, input_tokens, output_tokens, document_id=None, model_uri=None, estimated=False):
+        """
+        Сохраняет расход токенов одного запроса
+
+        Ошибка записи не должна прерывать ответ пользователю, поэтому только логируется.
+        """
+        try:
+            with self.session_factory() as session:
+                session.add(TokenUsage(session_id or ANONYMOUS_SESSION, endpoint, input_tokens, output_tokens,
+                                       document_id=document_id, model_uri=model_uri, estimated=estimated))
+                session.commit()
+        except Exception as e:
+            self.logger.error(f"Ошибка записи расхода токенов: {str(e)}")
+
+    def get_session_usage(self, session_id):
+        """
+        Токены, израсходованные сессией за текущее окно бюджета
+
+        Returns:
+            int: Сумма input и output токенов
+        """
+        since = datetime.utcnow() - timedelta(seconds=self.window)
+        with self.session_factory() as session:
+            used = session.query(func.coalesce(func.sum(TokenUsage.total_tokens), 0)) \
+                .filter(TokenUsage.session_id == session_id, TokenUsage.created_at >= since).scalar()
+        return int(used)
+
+    def check_budget(self, session_id, requested_tokens):
+        """
+        Проверка бюджета перед отправкой запроса
+
+        Args:
+            session_id (str): Сессия пользователя (без сессии - общий бюджет ANONYMOUS_SESSION)
+            requested_tokens (int): Оценка токенов запроса
+
+        Raises:
+            TokenBudgetExceeded: Если запрос не помещается в остаток бюджета
+        """
+        if not self.budget:
+            return
+        session_id = session_id or ANONYMOUS_SESSION
+        used = self.get_session_usage(session_id)
+        if used + requested_tokens > self.budget:
+            self.logger.warning(f"Сессия {session_id} превысила бюджет токенов: {used} + {requested_tokens} > {self.budget}")
+            raise TokenBudgetExceeded(session_id, used, requested_tokens, self.budget)
+
+    def get_budget_status(self, session_id):
+        """
+        Расход и остаток бюджета сессии
+
+        Returns:
+            dict: used, budget (None - без ограничения), remaining и окно в секундах
+        """
+        used = self.get_session_usage(session_id or ANONYMOUS_SESSION)
+        return {
+            'used': used,
+            'budget': self.budget or None,
+            'remaining': max(0, self.budget - used) if self.budget else None,
+            'window_seconds': self.window,
+        }
+
+    def get_summary(self, group_by='endpoint', since_seconds=None, limit=100):
+        """
+        Суммарный расход токенов, сгруппированный по полю
+
+        Args:
+            group_by (str): session, document, endpoint или model
+            since_seconds (int, optional): Учитывать только последние N секунд
+            limit (int): Максимальное число групп (по убыванию расхода)
+
+        Returns:
+            list: Словари с ключом группы, числом запросов и суммами токенов
+        """
+        column = self.GROUP_COLUMNS.get(group_by)
+        if column is None:
+            raise ValueError(f"Недопустимая группировка: {group_by}")
+        total = func.sum(TokenUsage.total_tokens)
+        with self.session_factory() as session:
+            query = session.query(
+                column,
+                func.count(TokenUsage.id),
+                func.sum(TokenUsage.input_tokens),
+                func.sum(TokenUsage.output_tokens),
+                total
+            )
+            if since_seconds:
+                query = query.filter(TokenUsage.created_at >= datetime.utcnow() - timedelta(seconds=since_seconds))
+            rows = query.group_by(column).order_by(total.desc()).limit(limit).all()
+        return [
+            {
+                group_by: key,
+                'requests': requests,
+                'input_tokens': int(input_tokens or 0),
+                'output_tokens': int(output_tokens or 0),
+                'total_tokens': int(total_tokens or 0),
+            }
+            for key, requests, input_tokens, output_tokens, total_tokens in rows
+        ]
+
+# Общий для процесса экземпляр учета токенов
+usage_service = UsageService()
@@ -0,0 +1,51 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только между потоками процесса
+    fcntl = None
+
+class FileLock:
+    """
+    Эксклюзивная блокировка на основе файла для потоков и процессов
+
+    Между процессами (воркеры gunicorn, служебные команды) используется
+    flock, между потоками одного процесса - RLock: flock не разделяет
+    потоки, работающие через один файловый дескриптор. Блокировка
+    повторно входимая в пределах потока.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Путь к файлу блокировки (создается при необходимости)
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._pid = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            if self._fd is None or self._pid != os.getpid():
+                # Дескриптор, унаследованный после fork, разделяет блокировку с родителем
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
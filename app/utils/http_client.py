@@ -0,0 +1,252 @@
+import time
+import random
+import logging
+from threading import Lock
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from app.config import Config
+from app.utils.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+class HTTPClient:
+    """
+    Общий HTTP-клиент для обращений к API Yandex Cloud
+
+    Для каждого внешнего хоста создается отдельная сессия requests с пулом
+    keep-alive соединений, поэтому повторные запросы к Vision, YandexGPT и IAM
+    не тратят время на новое TCP+TLS рукопожатие.
+
+    Запросы к известному сервису проходят через его ограничитель скорости, а
+    ответы 429/5xx и ошибки соединения повторяются с экспоненциальной
+    задержкой со случайным разбросом, пока не истечет срок повтора.
+    """
+
+    # Коды ответов, после которых запрос повторяется
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool_maxsize=None, connect_timeout=None, read_timeouts=None, rate_limits=None,
+                 retry_deadline=None, max_attempts=None, backoff_base=None, backoff_max=None):
+        """
+        Args:
+            pool_maxsize (int, optional): Размер пула соединений для одного хоста
+            connect_timeout (float, optional): Таймаут установки соединения, секунды
+            read_timeouts (dict, optional): Таймауты чтения по имени внешнего сервиса
+            rate_limits (dict, optional): Ограничения по имени сервиса: (запросов в секунду, одновременных запросов)
+            retry_deadline (float, optional): Сколько секунд запрос может ждать и повторяться
+            max_attempts (int, optional): Максимальное число попыток
+            backoff_base (float, optional): Начальная задержка перед повтором, секунды
+            backoff_max (float, optional): Максимальная задержка перед повтором, секунды
+        """
+        self.pool_maxsize = pool_maxsize or Config.HTTP_POOL_MAXSIZE
+        self.connect_timeout = connect_timeout or Config.HTTP_CONNECT_TIMEOUT
+        self.read_timeouts = {
+            'vision': Config.HTTP_READ_TIMEOUT,
+            'gpt': Config.YANDEX_GPT_READ_TIMEOUT,
+            'iam': Config.YANDEX_IAM_READ_TIMEOUT,
+        }
+        if read_timeouts:
+            self.read_timeouts.update(read_timeouts)
+        self.rate_limits = {
+            'vision': (Config.YANDEX_VISION_RPS, Config.YANDEX_VISION_MAX_CONCURRENCY),
+            'gpt': (Config.YANDEX_GPT_RPS, Config.YANDEX_GPT_MAX_CONCURRENCY),
+            'iam': (Config.YANDEX_IAM_RPS, Config.YANDEX_IAM_MAX_CONCURRENCY),
+        }
+        if rate_limits:
+            self.rate_limits.update(rate_limits)
+        self.retry_deadline = retry_deadline or Config.HTTP_RETRY_DEADLINE
+        self.max_attempts = max_attempts or Config.HTTP_RETRY_MAX_ATTEMPTS
+        self.backoff_base = backoff_base or Config.HTTP_BACKOFF_BASE
+        self.backoff_max = backoff_max or Config.HTTP_BACKOFF_MAX
+        self._limiters = {}
+        self.logger = logging.getLogger(__name__)
+        self._sessions = {}
+        self._lock = Lock()
+
+    def get_timeout(self, upstream=None):
+        """
+        Возвращает таймаут (connect, read) для внешнего сервиса
+
+        Args:
+            upstream (str, optional): Имя сервиса: vision, gpt или iam
+        """
+        return (self.connect_timeout, self.read_timeouts.get(upstream, Config.HTTP_READ_TIMEOUT))
+
+    def get_session(self, url):
+        """
+        Возвращает сессию с пулом соединений для хоста из URL
+
+        Args:
+            url (str): URL запроса
+        """
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._sessions[host] = session
+                    self.logger.info(f"Создан пул соединений для {host} (размер {self.pool_maxsize})")
+        return session
+
+    def get_limiter(self, upstream):
+        """
+        Возвращает ограничитель скорости внешнего сервиса
+
+        Args:
+            upstream (str): Имя сервиса
+
+        Returns:
+            AdaptiveRateLimiter: Ограничитель или None, если для сервиса нет ограничений
+        """
+        limiter = self._limiters.get(upstream)
+        if limiter is None and upstream in self.rate_limits:
+            with self._lock:
+                limiter = self._limiters.get(upstream)
+                if limiter is None:
+                    rate, max_concurrency = self.rate_limits[upstream]
+                    limiter = AdaptiveRateLimiter(upstream, rate, max_concurrency=max_concurrency)
+                    self._limiters[upstream] = limiter
+        return limiter
+
+    def post(self, url, upstream=None, timeout=None, **kwargs):
+        """
+        POST-запрос через пул соединений хоста
+
+        Для известного сервиса запрос ждет разрешения ограничителя скорости и
+        повторяется при 429/5xx и ошибках соединения. Если повторить не удалось,
+        возвращается последний ответ (или пробрасывается последняя ошибка).
+
+        Args:
+            url (str): URL запроса
+            upstream (str, optional): Имя сервиса для выбора таймаута и ограничителя
+            timeout (optional): Явный таймаут, заменяет таймаут сервиса
+            **kwargs: Параметры requests (headers, json, data, stream)
+
+        Returns:
+            requests.Response: Ответ сервера
+
+        Raises:
+            TimeoutError: Если разрешение на запрос не получено до истечения срока повтора
+        """
+        session = self.get_session(url)
+        timeout = timeout or self.get_timeout(upstream)
+        limiter = self.get_limiter(upstream)
+        if limiter is None:
+            return session.post(url, timeout=timeout, **kwargs)
+
+        deadline = time.monotonic() + self.retry_deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            if not limiter.acquire(deadline):
+                raise TimeoutError(f"Превышено время ожидания запроса к {upstream} ({self.retry_deadline} с)")
+            response = None
+            try:
+                response = session.post(url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                error = e
+            finally:
+                limiter.release(response.status_code if response is not None else None)
+
+            if response is not None and response.status_code not in self.RETRY_STATUSES:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+            if retry_after is not None:
+                limiter.pause(retry_after)
+            delay = self._backoff(attempt, retry_after)
+            if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+
+            status = response.status_code if response is not None else type(error).__name__
+            if response is not None:
+                # Потоковый ответ (stream=True) иначе держит соединение пула до сборки мусора
+                response.close()
+            self.logger.warning(f"{upstream}: {status}, повтор {attempt} из {self.max_attempts - 1} через {delay:.2f} с")
+            limiter.record_retry()
+            time.sleep(delay)
+
+    def _backoff(self, attempt, retry_after=None):
+        """
+        Задержка перед повтором: экспоненциальная со случайным разбросом (full jitter)
+
+        Args:
+            attempt (int): Номер неудавшейся попытки (с 1)
+            retry_after (float, optional): Задержка, указанная сервером
+
+        Returns:
+            float: Задержка в секундах
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            # Разброс поверх Retry-After, чтобы потоки не повторяли запрос одновременно
+            delay = retry_after + random.uniform(0, self.backoff_base)
+        return delay
+
+    def get_rate_limit_stats(self):
+        """
+        Статистика ограничителей скорости
+
+        Returns:
+            dict: Окно, ожидание и число перегрузок по каждому сервису
+        """
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {upstream: limiter.get_stats() for upstream, limiter in limiters}
+
+    def get_stats(self):
+        """
+        Счетчики использования пулов соединений
+
+        Запрос, не потребовавший нового соединения, считается попаданием в пул.
+
+        Returns:
+            dict: Статистика по каждому хосту
+        """
+        stats = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for host, session in sessions:
+            requests_count = 0
+            connections = 0
+            for adapter in {id(a): a for a in session.adapters.values()}.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    try:
+                        pool = pools[key]
+                    except KeyError:
+                        continue
+                    requests_count += pool.num_requests
+                    connections += pool.num_connections
+            stats[host] = {
+                'requests': requests_count,
+                'pool_hits': max(requests_count - connections, 0),
+                'pool_misses': connections,
+                'pool_maxsize': self.pool_maxsize,
+            }
+        return stats
+
+    def close(self):
+        """Закрывает все соединения"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+# Общий для процесса экземпляр клиента
+http_client = HTTPClient()
+
+def get_http_client():
+    """
+    Получение общего HTTP-клиента
+
+    Returns:
+        HTTPClient: Клиент с пулами соединений
+    """
+    return http_client
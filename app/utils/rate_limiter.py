@@ -0,0 +1,165 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+class AdaptiveRateLimiter:
+    """
+    Ограничитель запросов к внешнему API
+
+    Скорость ограничивается корзиной токенов, размер которой соответствует
+    квоте сервиса. Число одновременных запросов регулируется по схеме AIMD:
+    каждый успешный ответ понемногу увеличивает окно, а ответ 429 (или 503)
+    уменьшает его вдвое. Заголовок Retry-After приостанавливает выдачу
+    разрешений для всех потоков процесса до указанного момента.
+    """
+
+    # Минимальный интервал между уменьшениями окна: пачка 429 от одновременно
+    # отправленных запросов считается одним сигналом перегрузки
+    DECREASE_COOLDOWN = 1.0
+
+    def __init__(self, name, rate, burst=None, max_concurrency=10, min_concurrency=1):
+        """
+        Args:
+            name (str): Имя внешнего сервиса
+            rate (float): Разрешенное число запросов в секунду
+            burst (float, optional): Емкость корзины токенов (по умолчанию rate)
+            max_concurrency (int): Верхняя граница окна одновременных запросов
+            min_concurrency (int): Нижняя граница окна
+        """
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._stats = {'requests': 0, 'throttled': 0, 'retries': 0, 'wait_seconds': 0.0}
+
+    def acquire(self, deadline=None):
+        """
+        Ожидание разрешения на запрос
+
+        Args:
+            deadline (float, optional): Момент time.monotonic(), после которого ждать не нужно
+
+        Returns:
+            bool: True, если разрешение получено; False, если истек срок ожидания
+        """
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= int(self._limit):
+                    wait = None
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self._stats['requests'] += 1
+                    self._stats['wait_seconds'] += now - started
+                    return True
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def release(self, status_code=None):
+        """
+        Возврат разрешения с учетом результата запроса
+
+        Args:
+            status_code (int, optional): Код ответа; None, если ответ не получен
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if status_code is not None and 200 <= status_code < 300:
+                # Аддитивное увеличение: примерно +1 к окну за окно успешных ответов
+                self._limit = min(self.max_concurrency, self._limit + 1.0 / self._limit)
+            elif status_code in (429, 503):
+                self._stats['throttled'] += 1
+                now = time.monotonic()
+                if now - self._decreased_at >= self.DECREASE_COOLDOWN:
+                    self._decreased_at = now
+                    self._limit = max(self.min_concurrency, self._limit / 2)
+                    self.logger.warning(f"{self.name}: перегрузка ({status_code}), окно уменьшено до {int(self._limit)}")
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """
+        Приостановка запросов (по заголовку Retry-After)
+
+        Args:
+            seconds (float): Длительность паузы
+        """
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def record_retry(self):
+        """Учет повторной отправки запроса"""
+        with self._cond:
+            self._stats['retries'] += 1
+
+    def _refill(self, now):
+        """Пополнение корзины токенов (вызывается под блокировкой)"""
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def get_stats(self):
+        """
+        Статистика ограничителя
+
+        Returns:
+            dict: Текущее окно, число запросов в полете и счетчики перегрузок
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'rate': self.rate,
+                'concurrency_limit': int(self._limit),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 3),
+            })
+        stats['wait_seconds'] = round(stats['wait_seconds'], 4)
+        return stats
+
+def parse_retry_after(value):
+    """
+    Разбор заголовка Retry-After
+
+    Args:
+        value (str): Число секунд или дата в формате HTTP
+
+    Returns:
+        float: Задержка в секундах или None, если заголовок отсутствует или некорректен
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
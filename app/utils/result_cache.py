@@ -0,0 +1,218 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    Двухуровневый кэш результатов обращений к внешним API
+
+    Первый уровень - ограниченный LRU-кэш в памяти процесса. Второй - таблица
+    SQLite на диске, которая переживает перезапуск и общая для всех воркеров
+    gunicorn. Значения хранятся как строки.
+    """
+
+    # Как часто (в записях) проверять размер дискового уровня
+    DISK_PRUNE_INTERVAL = 100
+
+    def __init__(self, namespace, max_entries=1024, db_path=None, max_disk_entries=None, ttl=None):
+        """
+        Args:
+            namespace (str): Пространство имен ключей (например, ocr или gpt)
+            max_entries (int): Максимальное количество записей в памяти
+            db_path (str, optional): Путь к файлу SQLite. Если None, кэш только в памяти
+            max_disk_entries (int, optional): Ограничение числа записей на диске
+            ttl (float, optional): Время жизни записи в секундах
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+        }
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._init_db()
+
+    def _connect(self):
+        """Соединение SQLite для текущего потока и процесса"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        """Создает таблицу кэша"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                ' namespace TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' value TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL,'
+                ' PRIMARY KEY (namespace, key))'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed '
+                'ON cache_entries (namespace, accessed_at)'
+            )
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and created_at + self.ttl <= now
+
+    def get(self, key):
+        """
+        Получение значения по ключу
+
+        Args:
+            key (str): Ключ
+
+        Returns:
+            str: Значение или None, если записи нет или она устарела
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+        if self.db_path:
+            try:
+                row = self._get_from_disk(key, now)
+            except sqlite3.Error as e:
+                self.logger.warning(f"Ошибка чтения дискового кэша {self.namespace}: {e}")
+                row = None
+            if row is not None:
+                value, created_at = row
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                    self._put_memory(key, value, created_at)
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def _get_from_disk(self, key, now):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?',
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[1], now):
+            with conn:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key))
+            return None
+        with conn:
+            conn.execute(
+                'UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                (now, self.namespace, key)
+            )
+        return row
+
+    def set(self, key, value):
+        """
+        Сохранение значения
+
+        Args:
+            key (str): Ключ
+            value (str): Значение
+        """
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            self._writes += 1
+            prune = self.max_disk_entries and self._writes % self.DISK_PRUNE_INTERVAL == 0
+
+        if self.db_path:
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, accessed_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (self.namespace, key, value, now, now)
+                    )
+                if prune:
+                    self._prune_disk()
+            except sqlite3.Error as e:
+                self.logger.warning(f"Ошибка записи в дисковый кэш {self.namespace}: {e}")
+
+    def _put_memory(self, key, value, created_at):
+        """Добавляет запись в LRU-кэш в памяти (вызывается под блокировкой)"""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _prune_disk(self):
+        """Удаляет давно не использовавшиеся записи сверх лимита дискового уровня"""
+        conn = self._connect()
+        with conn:
+            count = conn.execute(
+                'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (self.namespace,)
+            ).fetchone()[0]
+            excess = count - self.max_disk_entries
+            if excess > 0:
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE rowid IN ('
+                    ' SELECT rowid FROM cache_entries WHERE namespace = ?'
+                    ' ORDER BY accessed_at LIMIT ?)',
+                    (self.namespace, excess)
+                )
+                with self._lock:
+                    self._stats['disk_evictions'] += excess
+
+    def get_stats(self):
+        """
+        Статистика кэша
+
+        Returns:
+            dict: Счетчики попаданий, промахов и вытеснений
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        stats['namespace'] = self.namespace
+        stats['max_entries'] = self.max_entries
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Очистка кэша в памяти и на диске"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
@@ -0,0 +1,189 @@
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых запросов к внешним API
+
+    Внутри процесса первый поток с данным ключом становится ведущим, а
+    остальные ждут его Future. Между воркерами gunicorn ведущий определяется
+    арендой ключа в таблице SQLite: воркер, не получивший аренду, ждет, пока
+    результат появится в общем кэше, и выполняет запрос сам, только если
+    аренда освободилась или истекла без результата.
+    """
+
+    def __init__(self, namespace, db_path=None, lease_seconds=180, poll_interval=0.2):
+        """
+        Args:
+            namespace (str): Пространство имен ключей (например, ocr или gpt)
+            db_path (str, optional): Путь к файлу SQLite для аренды между процессами.
+                Если None, объединение работает только внутри процесса
+            lease_seconds (float): Срок аренды; после него ключ считается брошенным
+            poll_interval (float): Интервал проверки результата другого процесса, секунды
+        """
+        self.namespace = namespace
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(__name__)
+
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {'leaders': 0, 'local_waits': 0, 'remote_waits': 0, 'remote_hits': 0, 'takeovers': 0}
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS inflight_leases ('
+                    ' namespace TEXT NOT NULL,'
+                    ' key TEXT NOT NULL,'
+                    ' owner TEXT NOT NULL,'
+                    ' expires_at REAL NOT NULL,'
+                    ' PRIMARY KEY (namespace, key))'
+                )
+
+    @property
+    def owner(self):
+        """Владелец аренды: хост и процесс (вычисляется заново после fork)"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connect(self):
+        """Соединение SQLite для текущего потока и процесса"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def do(self, key, compute, lookup=None):
+        """
+        Выполняет compute один раз для всех одновременных вызовов с ключом key
+
+        Args:
+            key (str): Ключ запроса (тот же, что и в кэше результатов)
+            compute (callable): Выполняет запрос и сохраняет результат в кэш
+            lookup (callable, optional): Возвращает результат из общего кэша или None;
+                без него аренда между процессами не используется
+
+        Returns:
+            Результат compute (или результат ведущего потока/процесса)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self._stats['leaders'] += 1
+            else:
+                self._stats['local_waits'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._run_leader(key, compute, lookup)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _run_leader(self, key, compute, lookup):
+        """Выполнение запроса ведущим потоком с учетом аренды между процессами"""
+        if not self.db_path or lookup is None:
+            return compute()
+
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                acquired = self._acquire_lease(key)
+            except sqlite3.Error as e:
+                self.logger.warning(f"Ошибка аренды {self.namespace}: {e}")
+                return compute()
+            if acquired:
+                if waited:
+                    # Другой процесс не оставил результата: выполняем запрос сами
+                    cached = lookup()
+                    if cached is not None:
+                        self._release_lease(key)
+                        return cached
+                    with self._lock:
+                        self._stats['takeovers'] += 1
+                try:
+                    return compute()
+                finally:
+                    self._release_lease(key)
+
+            if not waited:
+                waited = True
+                with self._lock:
+                    self._stats['remote_waits'] += 1
+            time.sleep(self.poll_interval)
+            cached = lookup()
+            if cached is not None:
+                with self._lock:
+                    self._stats['remote_hits'] += 1
+                return cached
+            # Страховка от зависшей аренды: к этому моменту она должна была истечь
+            if time.monotonic() - started > 2 * self.lease_seconds:
+                return compute()
+
+    def _acquire_lease(self, key):
+        """
+        Пытается получить аренду ключа
+
+        Returns:
+            bool: True, если аренда получена этим процессом
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'DELETE FROM inflight_leases WHERE namespace = ? AND key = ? AND expires_at <= ?',
+                (self.namespace, key, now)
+            )
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO inflight_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, self.owner, now + self.lease_seconds)
+            )
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key):
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'DELETE FROM inflight_leases WHERE namespace = ? AND key = ? AND owner = ?',
+                    (self.namespace, key, self.owner)
+                )
+        except sqlite3.Error as e:
+            self.logger.warning(f"Ошибка освобождения аренды {self.namespace}: {e}")
+
+    def get_stats(self):
+        """
+        Статистика объединения запросов
+
+        Returns:
+            dict: Число ведущих вызовов и вызовов, дождавшихся чужого результата
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inflight'] = len(self._inflight)
+        stats['namespace'] = self.namespace
+        return stats
@@ -0,0 +1,89 @@
+import json
+import asyncio
+from flask import Response, stream_with_context
+
+def sse_event(data, event=None):
+    """
+    Форматирует событие Server-Sent Events
+
+    Args:
+        data (dict): Данные события (сериализуются в JSON)
+        event (str, optional): Тип события
+
+    Returns:
+        str: Событие в формате text/event-stream
+    """
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def sse_stream(events, log=None):
+    """
+    Потоковый ответ из последовательности событий SSE
+
+    После последнего события отправляется событие done, а при ошибке - событие error.
+
+    Args:
+        events: Итератор пар (тип события или None, данные)
+        log (callable, optional): Функция для записи ошибки
+
+    Returns:
+        flask.Response: Ответ с типом text/event-stream
+    """
+    def generate():
+        try:
+            for event, data in events:
+                yield sse_event(data, event=event)
+            yield sse_event({}, event='done')
+        except Exception as e:
+            if log:
+                log(str(e))
+            yield sse_event({'error': str(e)}, event='error')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_response(chunks, log=None):
+    """
+    Потоковый ответ с фрагментами текста в виде событий SSE
+
+    Каждый фрагмент отправляется событием с полем text.
+
+    Args:
+        chunks: Итератор фрагментов текста
+        log (callable, optional): Функция для записи ошибки
+
+    Returns:
+        flask.Response: Ответ с типом text/event-stream
+    """
+    return sse_stream(((None, {'text': chunk}) for chunk in chunks), log=log)
+
+def iterate_async(async_iterator):
+    """
+    Синхронный обход асинхронного итератора в отдельном цикле событий
+
+    Позволяет отдавать результаты корутин из обычного обработчика Flask. При
+    досрочном закрытии (например, клиент отключился) незавершенные задачи
+    отменяются.
+
+    Args:
+        async_iterator: Асинхронный генератор
+
+    Yields:
+        Элементы асинхронного генератора
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(async_iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(async_iterator.aclose())
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
@@ -0,0 +1,90 @@
+import re
+import math
+from app.config import Config
+
+# Границы предложений: знак конца предложения и пробел перед следующим
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+')
+# Абзацы и страницы разделяются пустыми строками
+_PARAGRAPH_BOUNDARY = re.compile(r'\n\s*\n')
+
+def estimate_tokens(text):
+    """
+    Приблизительное число токенов YandexGPT в тексте
+
+    Args:
+        text (str): Текст
+
+    Returns:
+        int: Оценка сверху по среднему числу символов на токен
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / Config.GPT_CHARS_PER_TOKEN)
+
+def truncate_text(text, max_tokens):
+    """
+    Обрезает текст до оценки в max_tokens токенов
+
+    Args:
+        text (str): Текст
+        max_tokens (int): Ограничение в токенах
+        
+    Returns:
+        str: Текст без изменений, если он помещается, иначе его начало
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:int(max_tokens * Config.GPT_CHARS_PER_TOKEN)].rstrip()
+
+def split_paragraphs(text):
+    """
+    Разбивает текст на абзацы по пустым строкам
+
+    Args:
+        text (str): Текст
+
+    Returns:
+        list: Непустые абзацы без лишних пробелов по краям
+    """
+    return [paragraph.strip() for paragraph in _PARAGRAPH_BOUNDARY.split(text or '') if paragraph.strip()]
+
+def split_text(text, max_tokens):
+    """
+    Разбивает текст на фрагменты не длиннее max_tokens
+
+    Фрагменты собираются из целых абзацев (страниц); слишком длинный абзац
+    делится по предложениям, а слишком длинное предложение - по символам.
+
+    Args:
+        text (str): Текст
+        max_tokens (int): Ограничение размера фрагмента в токенах
+
+    Returns:
+        list: Фрагменты в исходном порядке
+    """
+    pieces = []
+    for paragraph in split_paragraphs(text):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_BOUNDARY.split(paragraph):
+            if estimate_tokens(sentence) <= max_tokens:
+                pieces.append(sentence)
+            else:
+                size = int(max_tokens * Config.GPT_CHARS_PER_TOKEN)
+                pieces.extend(sentence[offset:offset + size] for offset in range(0, len(sentence), size))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        # Разделитель между частями тоже занимает токены
+        piece_tokens = estimate_tokens(piece) + 1
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
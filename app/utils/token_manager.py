@@ -1,102 +1,202 @@
 import os
-import requests
+import re
+import threading
 import json
 from datetime import datetime, timedelta
 import logging
+from app.utils.http_client import http_client
 
 class TokenManager:
     """Менеджер токенов для Yandex Cloud API"""
-    
-    def __init__(self):
+
+    IAM_URL = 'https://iam.api.cloud.yandex.net/iam/v1/tokens'
+
+    # Токен перестает выдаваться запросам за 5 минут до истечения срока действия
+    EXPIRY_MARGIN = timedelta(minutes=5)
+    # Фоновое обновление запускается заранее, чтобы запросы не ждали обмена токена
+    REFRESH_AHEAD = timedelta(hours=1)
+    # Пауза перед повторной попыткой фонового обновления после ошибки
+    RETRY_DELAY = 60
+
+    def __init__(self, oauth_token=None, background_refresh=True):
         self.iam_token = None
         self.token_expires_at = None
-        self.oauth_token = os.environ.get('YANDEX_OAUTH_TOKEN')
+        self.oauth_token = oauth_token or os.environ.get('YANDEX_OAUTH_TOKEN')
+        self.background_refresh = background_refresh
         self.logger = logging.getLogger(__name__)
-    
-    def get_iam_token(self, force_refresh=False):
+
+        # Блокировка обмена токена: при одновременных запросах обмен выполняет только один поток
+        self._refresh_lock = threading.Lock()
+        self._timer_lock = threading.Lock()
+        self._refresh_timer = None
+
+        # Без OAuth-токена используем статический IAM-токен из окружения (обновление невозможно)
+        if not self.oauth_token:
+            self.iam_token = os.environ.get('YANDEX_IAM_TOKEN') or None
+
+    def get_iam_token(self, force_refresh=False, stale_token=None):
         """
         Получение или обновление IAM-токена
-        
+
         Args:
             force_refresh: Принудительное обновление токена
-            
+            stale_token: Токен, который был отклонен API. Если другой поток уже
+                заменил его, повторный обмен не выполняется
+
         Returns:
             str: Действующий IAM-токен
         """
-        # Проверяем, нужно ли обновить токен
-        if force_refresh or self.token_needs_refresh():
-            self.refresh_iam_token()
-        
+        if not self.oauth_token and self.iam_token:
+            return self.iam_token
+
+        if force_refresh:
+            self._refresh(stale_token=stale_token, force=stale_token is None)
+            return self.iam_token
+
+        token = self.iam_token
+        if token and not self.token_needs_refresh():
+            if self.background_refresh and self._refresh_due():
+                self._schedule_refresh(0)
+            return token
+
+        self._refresh(stale_token=token)
         return self.iam_token
-    
+
     def token_needs_refresh(self):
         """
         Проверяет, нужно ли обновить токен
-        
+
         Returns:
             bool: True, если токен отсутствует или истекает в ближайшие 5 минут
         """
         if not self.iam_token or not self.token_expires_at:
             return True
-        
-        # Обновляем токен за 5 минут до истечения срока его действия
-        return datetime.now() + timedelta(minutes=5) >= self.token_expires_at
-    
+
+        return datetime.utcnow() + self.EXPIRY_MARGIN >= self.token_expires_at
+
+    def _refresh_due(self):
+        """Проверяет, наступило ли время упреждающего фонового обновления"""
+        return datetime.utcnow() + self.REFRESH_AHEAD >= self.token_expires_at
+
+    def _refresh(self, stale_token=None, force=False):
+        """
+        Обновляет токен под блокировкой (single-flight)
+
+        Потоки, дождавшиеся блокировки после чужого обновления, получают уже
+        обновленный токен без повторного обращения к IAM.
+        """
+        with self._refresh_lock:
+            if not force and self.iam_token and self.iam_token != stale_token and not self.token_needs_refresh():
+                return
+            self.refresh_iam_token()
+
     def refresh_iam_token(self):
         """
         Обновляет IAM-токен, используя OAuth-токен
-        
+
         Raises:
             Exception: Если не удалось получить новый IAM-токен
         """
         if not self.oauth_token:
             self.logger.error("OAuth-токен не установлен. Необходимо установить YANDEX_OAUTH_TOKEN в переменных окружения.")
             raise ValueError("OAuth-токен не установлен. Установите YANDEX_OAUTH_TOKEN в переменных окружения.")
-        
-        url = 'https://iam.api.cloud.yandex.net/iam/v1/tokens'
-        
+
         try:
-            response = requests.post(
-                url,
-                json={'yandexPassportOauthToken': self.oauth_token}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.iam_token = data.get('iamToken')
-                
-                # Устанавливаем время истечения срока действия токена
-                # Обычно IAM токены действуют 12 часов
-                expires_at = data.get('expiresAt')
-                if expires_at:
-                    # Конвертируем строку в datetime
-                    self.token_expires_at = datetime.strptime(
-                        expires_at.replace('Z', '+0000'),
-                        '%Y-%m-%dT%H:%M:%S%z'
-                    ).replace(tzinfo=None)
-                else:
-                    # Если срок действия не указан, устанавливаем 11 часов
-                    self.token_expires_at = datetime.now() + timedelta(hours=11)
-                
-                self.logger.info(f"IAM токен успешно обновлен. Действителен до: {self.token_expires_at}")
-            else:
-                self.logger.error(f"Ошибка получения IAM-токена: {response.status_code} - {response.text}")
-                raise Exception(f"Ошибка получения IAM-токена: {response.status_code} - {response.text}")
+            iam_token, expires_at = self.exchange_oauth_token(self.oauth_token)
+            self.token_expires_at = expires_at
+            self.iam_token = iam_token
+            self.logger.info(f"IAM токен успешно обновлен. Действителен до: {self.token_expires_at} UTC")
         except Exception as e:
             self.logger.error(f"Ошибка при обновлении IAM токена: {str(e)}")
             raise
 
+        if self.background_refresh:
+            delay = (self.token_expires_at - self.REFRESH_AHEAD - datetime.utcnow()).total_seconds()
+            self._schedule_refresh(max(delay, self.RETRY_DELAY))
+
+    @classmethod
+    def exchange_oauth_token(cls, oauth_token):
+        """
+        Обменивает OAuth-токен на IAM-токен
+
+        Args:
+            oauth_token: OAuth-токен Яндекс.Паспорта
+
+        Returns:
+            tuple: IAM-токен и время истечения его срока действия (UTC)
+        """
+        response = http_client.post(
+            cls.IAM_URL,
+            upstream='iam',
+            json={'yandexPassportOauthToken': oauth_token}
+        )
+
+        if response.status_code != 200:
+            raise Exception(f"Ошибка получения IAM-токена: {response.status_code} - {response.text}")
+
+        data = response.json()
+        expires_at = data.get('expiresAt')
+        if expires_at:
+            expires_at = cls._parse_expires_at(expires_at)
+        else:
+            # Если срок действия не указан, считаем токен действительным 11 часов
+            expires_at = datetime.utcnow() + timedelta(hours=11)
+        return data.get('iamToken'), expires_at
+
+    @staticmethod
+    def _parse_expires_at(value):
+        """Разбирает expiresAt из ответа IAM (RFC 3339, возможно с наносекундами)"""
+        value = re.sub(r'\.\d+', '', value).replace('Z', '+0000')
+        parsed = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+        return (parsed - parsed.utcoffset()).replace(tzinfo=None)
+
+    def _schedule_refresh(self, delay):
+        """Планирует фоновое обновление токена через delay секунд"""
+        with self._timer_lock:
+            if self._refresh_timer is not None and self._refresh_timer.is_alive():
+                if delay > 0:
+                    self._refresh_timer.cancel()
+                else:
+                    return
+            self._refresh_timer = threading.Timer(delay, self._background_refresh)
+            self._refresh_timer.daemon = True
+            self._refresh_timer.start()
+
+    def _background_refresh(self):
+        """Фоновое обновление токена до истечения срока действия"""
+        with self._timer_lock:
+            self._refresh_timer = None
+        try:
+            with self._refresh_lock:
+                # Токен мог быть уже обновлен другим потоком
+                if self.iam_token and self.token_expires_at and not self._refresh_due():
+                    return
+                self.refresh_iam_token()
+            self.logger.info("IAM-токен обновлен в фоновом режиме")
+        except Exception as e:
+            self.logger.warning(f"Фоновое обновление IAM-токена не удалось, повтор через {self.RETRY_DELAY} с: {str(e)}")
+            if self.token_expires_at and datetime.utcnow() < self.token_expires_at:
+                self._schedule_refresh(self.RETRY_DELAY)
+
+    def stop(self):
+        """Останавливает фоновое обновление"""
+        with self._timer_lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+
 # Создаем singleton-экземпляр менеджера токенов
 token_manager = TokenManager()
 
-def get_token(force_refresh=False):
+def get_token(force_refresh=False, stale_token=None):
     """
     Получение IAM-токена
-    
+
     Args:
         force_refresh: Принудительное обновление токена
-        
+        stale_token: Токен, отклоненный API (для объединения одновременных обновлений)
+
     Returns:
         str: Действующий IAM-токен
     """
-    return token_manager.get_iam_token(force_refresh)
\ No newline at end of file
+    return token_manager.get_iam_token(force_refresh, stale_token)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сжатия текста документов в SQLite (CompressedText).
+
+Для каждого алгоритма создает временную базу, записывает одинаковый корпус
+синтетических страниц учебника (распознанный текст с формулами и
+повторяющейся лексикой) и сравнивает размер файла базы, время записи,
+чтение текста документов и сканирование таблицы без текста.
+
+Пример:
+    python benchmarks/bench_compression.py --documents 2000 --pages 20
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.config import Config
+from app.database.db import Base
+from app.database.compression import storage_report, zstandard
+from app.models.document import Document
+
+WORDS = ('закон сила тока напряжение сопротивление участка цепи проводника энергия работа мощность '
+         'формула величина единица измерения определение задача решение пример рисунок таблица '
+         'параграф глава упражнение ответ вопрос опыт результат скорость ускорение масса тело '
+         'движение время путь температура давление объем вещество молекула атом заряд поле').split()
+
+SYLLABLES = ['ка', 'ло', 'ми', 'ра', 'то', 'не', 'зи', 'ку', 'ва', 'ре', 'до', 'пу', 'ся', 'бе', 'го', 'ша']
+ENDINGS = ['', 'а', 'ы', 'ом', 'ами', 'ей', 'ого', 'ие']
+
+def make_vocabulary(rng, size):
+    words = set(WORDS)
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return list(WORDS) + sorted(words - set(WORDS))
+
+def make_page(rng, vocabulary, words):
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        # Распределение Ципфа: предметная лексика частая, остальные слова редкие
+        sentence = ' '.join(vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)] + rng.choice(ENDINGS)
+                            for _ in range(rng.randint(6, 14)))
+        if rng.random() < 0.2:
+            sentence += f' {rng.choice("IURPA")} = {rng.randint(1, 99)},{rng.randint(0, 9)} {rng.choice(["В", "А", "Ом", "Вт", "Дж"])}'
+        sentences.append(sentence.capitalize() + '.')
+    return ' '.join(sentences)
+
+def run(codec, corpus, batch_size):
+    Config.CONTENT_COMPRESSION = codec
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        engine = create_engine(f'sqlite:///{path}')
+        Base.metadata.create_all(bind=engine, tables=[Document.__table__])
+        session = sessionmaker(bind=engine)()
+
+        started = time.perf_counter()
+        for offset in range(0, len(corpus), batch_size):
+            session.add_all([Document(title=f'Учебник {offset + index}', content=content)
+                             for index, content in enumerate(corpus[offset:offset + batch_size])])
+            session.commit()
+        write_seconds = time.perf_counter() - started
+
+        ids = [row[0] for row in session.query(Document.id)]
+        session.expunge_all()
+        started = time.perf_counter()
+        total_chars = sum(len(session.query(Document.content).filter_by(id=document_id).scalar()) for document_id in ids)
+        read_seconds = time.perf_counter() - started
+
+        with engine.connect() as connection:
+            started = time.perf_counter()
+            connection.execute(text("SELECT count(*) FROM documents WHERE title LIKE '%99%'")).scalar()
+            scan_seconds = time.perf_counter() - started
+
+        report = storage_report(engine, 'documents', 'content')
+        session.close()
+        engine.dispose()
+        return {
+            'file_mb': os.path.getsize(path) / 1024 / 1024,
+            'ratio': report['ratio'],
+            'write_ms': write_seconds / len(corpus) * 1000,
+            'read_ms': read_seconds / len(ids) * 1000,
+            'scan_ms': scan_seconds * 1000,
+            'chars': total_chars
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Размер базы и накладные расходы сжатия содержимого документов')
+    parser.add_argument('--documents', type=int, default=2000, help='Число документов')
+    parser.add_argument('--pages', type=int, default=20, help='Страниц в документе')
+    parser.add_argument('--words', type=int, default=300, help='Слов на странице')
+    parser.add_argument('--batch-size', type=int, default=100, help='Документов в транзакции')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng, 20000)
+    corpus = ['\n\n'.join(make_page(rng, vocabulary, args.words) for _ in range(args.pages)) for _ in range(args.documents)]
+    raw_mb = sum(len(content.encode('utf-8')) for content in corpus) / 1024 / 1024
+    codecs = ['none', 'zlib'] + (['zstd'] if zstandard is not None else [])
+
+    print(f'Документов: {args.documents}, страниц: {args.pages}, текст: {raw_mb:.1f} МБ')
+    print(f"{'сжатие':<8} {'файл, МБ':>9} {'коэф.':>6} {'запись, мс/док':>15} {'чтение, мс/док':>15} {'скан, мс':>9}")
+    for codec in codecs:
+        result = run(codec, corpus, args.batch_size)
+        print(f"{codec:<8} {result['file_mb']:>9.1f} {result['ratio'] or 1:>6} {result['write_ms']:>15.3f} "
+              f"{result['read_ms']:>15.3f} {result['scan_ms']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентного доступа к SQLite из нескольких процессов.
+
+Несколько процессов (как воркеры gunicorn) одновременно читают документы и
+выполняют транзакции "прочитать -> изменить -> зафиксировать", как загрузка
+и удаление документов. Сравниваются engine с настройками по умолчанию
+(create_engine) и create_db_engine (WAL, busy_timeout, synchronous=NORMAL).
+
+Пример:
+    python benchmarks/bench_db_concurrency.py --workers 4 --seconds 5 --write-ratio 0.2
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.database.db import Base, create_db_engine
+from app.models.document import Document
+
+SEED_DOCUMENTS = 2000
+
+def make_engine(mode, uri):
+    return create_db_engine(uri) if mode == 'tuned' else create_engine(uri)
+
+def seed(uri):
+    engine = create_engine(uri)
+    Base.metadata.create_all(bind=engine, tables=[Document.__table__])
+    session = sessionmaker(bind=engine)()
+    session.bulk_save_objects([Document(title=f'Документ {index}', content='текст страницы ' * 200)
+                               for index in range(SEED_DOCUMENTS)])
+    session.commit()
+    session.close()
+    engine.dispose()
+
+def worker(mode, uri, seconds, write_ratio, seed_value, results):
+    rng = random.Random(seed_value)
+    engine = make_engine(mode, uri)
+    Session = sessionmaker(bind=engine)
+    reads = writes = errors = 0
+    write_latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        session = Session()
+        started = time.monotonic()
+        try:
+            if rng.random() < write_ratio:
+                # Как удаление/загрузка: чтение, затем запись в той же транзакции
+                document = session.get(Document, rng.randint(1, SEED_DOCUMENTS))
+                if document is not None:
+                    document.title = f'Документ {rng.random():.6f}'
+                session.add(Document(title='Новый', content='текст страницы ' * 200))
+                session.commit()
+                writes += 1
+                write_latencies.append(time.monotonic() - started)
+            else:
+                session.get(Document, rng.randint(1, SEED_DOCUMENTS))
+                session.query(Document.id, Document.title).order_by(Document.id.desc()).limit(20).all()
+                session.commit()
+                reads += 1
+        except OperationalError:
+            # database is locked
+            session.rollback()
+            errors += 1
+        finally:
+            session.close()
+    engine.dispose()
+    results.put((reads, writes, errors, write_latencies))
+
+def run(mode, workers, seconds, write_ratio):
+    tmpdir = tempfile.mkdtemp()
+    uri = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    seed(uri)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(mode, uri, seconds, write_ratio, index, results))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    reads = sum(item[0] for item in collected)
+    writes = sum(item[1] for item in collected)
+    errors = sum(item[2] for item in collected)
+    latencies = sorted(latency for item in collected for latency in item[3])
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    median = statistics.median(latencies) if latencies else 0.0
+    return reads / seconds, writes / seconds, errors, median, p95
+
+def main():
+    parser = argparse.ArgumentParser(description='Чтение и запись SQLite из нескольких процессов')
+    parser.add_argument('--workers', type=int, default=4, help='Число процессов')
+    parser.add_argument('--seconds', type=float, default=5, help='Длительность каждого прогона')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Доля пишущих транзакций')
+    args = parser.parse_args()
+
+    print(f'Процессов: {args.workers}, длительность: {args.seconds} с, доля записи: {args.write_ratio}')
+    print(f"{'engine':<10} {'чтений/с':>10} {'записей/с':>10} {'ошибок':>8} {'запись p50, мс':>15} {'запись p95, мс':>15}")
+    for mode in ('default', 'tuned'):
+        reads, writes, errors, median, p95 = run(mode, args.workers, args.seconds, args.write_ratio)
+        print(f'{mode:<10} {reads:>10.0f} {writes:>10.0f} {errors:>8} {median * 1000:>15.1f} {p95 * 1000:>15.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк полнотекстового поиска по документам (SQLite FTS5).
+
+Создает временную базу с синтетическими документами, заполняет индекс
+командой backfill и сравнивает время поиска через FTS5 со сканированием
+LIKE по столбцу content. Также измеряется стоимость поддержания индекса
+триггерами при вставке новых документов.
+
+Пример:
+    python benchmarks/bench_search.py --documents 10000 --words 400
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database.db import Base
+from app.models.document import Document
+from app.services.search_service import backfill_search_index, SearchService
+
+SYLLABLES = ['ка', 'ло', 'ми', 'ра', 'то', 'не', 'зи', 'ку', 'ва', 'ре', 'до', 'пу', 'ся', 'бе', 'го', 'ша']
+ENDINGS = ['', 'а', 'ы', 'ом', 'ами', 'ей', 'ого', 'ие']
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_document(rng, vocabulary, words):
+    # Распределение Ципфа: частые и редкие слова, как в реальном тексте
+    tokens = [vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)] + rng.choice(ENDINGS)
+              for _ in range(words)]
+    return ' '.join(tokens)
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск FTS5 против LIKE на синтетической библиотеке')
+    parser.add_argument('--documents', type=int, default=10000, help='Число документов')
+    parser.add_argument('--words', type=int, default=400, help='Слов в документе')
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого запроса')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng, 20000)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+        Base.metadata.create_all(bind=engine, tables=[Document.__table__])
+        session = sessionmaker(bind=engine)()
+
+        # Документы, загруженные до появления индекса
+        session.bulk_save_objects([Document(title=f'Учебник {index}', content=make_document(rng, vocabulary, args.words))
+                                   for index in range(args.documents)])
+        session.commit()
+
+        started = time.perf_counter()
+        indexed = backfill_search_index(engine, batch_size=1000)
+        backfill_seconds = time.perf_counter() - started
+
+        # Вставка с поддержанием индекса триггерами
+        extra = [Document(title=f'Новый {index}', content=make_document(rng, vocabulary, args.words)) for index in range(500)]
+        started = time.perf_counter()
+        session.add_all(extra)
+        session.commit()
+        insert_ms = (time.perf_counter() - started) / len(extra) * 1000
+
+        search = SearchService(session)
+        queries = [vocabulary[5], vocabulary[500], vocabulary[5000], f'{vocabulary[10]} {vocabulary[300]}']
+        print(f'Документов: {args.documents + len(extra)}, слов в документе: {args.words}')
+        print(f'Backfill: {indexed} документов за {backfill_seconds:.2f} с; вставка с триггером: {insert_ms:.2f} мс/документ')
+        print(f"{'запрос':<28} {'найдено':>8} {'FTS5, мс':>10} {'LIKE, мс':>10}")
+        for query in queries:
+            first_word = query.split()[0]
+            fts = timed(lambda: search.search(query, limit=20), args.repeat)
+            like = timed(lambda: session.execute(text(
+                'SELECT id, title FROM documents WHERE decompress_text(content) LIKE :pattern LIMIT 20'), {'pattern': f'%{first_word}%'}).all(),
+                args.repeat)
+            total = session.execute(text('SELECT count(*) FROM documents_fts WHERE documents_fts MATCH :q'),
+                                    {'q': f'"{first_word}"'}).scalar()
+            print(f'{query:<28} {total:>8} {fts * 1000:>10.2f} {like * 1000:>10.2f}')
+        session.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк метаданных StorageService: журнал против перезаписи metadata.json.
+
+Создает библиотеку из N документов (снимок метаданных без файлов
+документов) и измеряет запуск сервиса (построение индекса), сохранение
+документа и получение списка всех документов. Для сравнения измеряется
+прежняя схема: чтение всего metadata.json, добавление записи и запись
+файла целиком с indent=2.
+
+Пример:
+    python benchmarks/bench_storage.py --documents 1000000 --saves 200
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.storage_service import StorageService
+
+class BenchDocument:
+    def __init__(self, document_id):
+        self.id = document_id
+        self.filename = f'{document_id}.pdf'
+        self.created_at = datetime.now()
+
+    def to_dict(self):
+        return {'id': self.id, 'filename': self.filename, 'content': 'Текст страницы учебника'}
+
+def make_metadata(count):
+    created_at = datetime(2024, 1, 1).isoformat()
+    return {
+        'documents': [{'id': f'doc-{index:08d}', 'filename': f'doc-{index:08d}.pdf', 'created_at': created_at}
+                      for index in range(count)],
+        'last_updated': created_at
+    }
+
+def legacy_save(metadata_file, document):
+    with open(metadata_file, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    metadata['documents'].append({'id': document.id, 'filename': document.filename,
+                                  'created_at': document.created_at.isoformat()})
+    metadata['last_updated'] = datetime.now().isoformat()
+    with open(metadata_file, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Журнал метаданных StorageService против полной перезаписи')
+    parser.add_argument('--documents', type=int, default=100000, help='Документов в библиотеке')
+    parser.add_argument('--saves', type=int, default=200, help='Сохранений для замера')
+    parser.add_argument('--legacy-saves', type=int, default=5, help='Сохранений по прежней схеме')
+    parser.add_argument('--fsync', action='store_true', help='Сбрасывать записи на диск')
+    args = parser.parse_args()
+
+    metadata = make_metadata(args.documents)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy_dir = os.path.join(tmpdir, 'legacy')
+        os.makedirs(legacy_dir)
+        legacy_file = os.path.join(legacy_dir, 'metadata.json')
+        with open(legacy_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        legacy = []
+        for index in range(args.legacy_saves):
+            started = time.perf_counter()
+            legacy_save(legacy_file, BenchDocument(f'legacy-{index}'))
+            legacy.append(time.perf_counter() - started)
+
+        journal_dir = os.path.join(tmpdir, 'journal')
+        os.makedirs(journal_dir)
+        with open(os.path.join(journal_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, separators=(',', ':'))
+        del metadata
+
+        started = time.perf_counter()
+        storage = StorageService(journal_dir, fsync=args.fsync)
+        startup = time.perf_counter() - started
+
+        saves = []
+        for index in range(args.saves):
+            document = BenchDocument(f'new-{index}')
+            started = time.perf_counter()
+            storage.save_document(document)
+            saves.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        listed = len(storage.get_all_documents())
+        list_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        storage.compact()
+        compact_seconds = time.perf_counter() - started
+        storage.close()
+
+        started = time.perf_counter()
+        StorageService(journal_dir, fsync=args.fsync).close()
+        reopen = time.perf_counter() - started
+
+    print(f'Документов: {args.documents}, fsync: {args.fsync}')
+    print(f'Прежняя схема: сохранение {statistics.median(legacy) * 1000:.1f} мс (медиана)')
+    print(f'Журнал: сохранение {statistics.median(saves) * 1000:.3f} мс (медиана), '
+          f'p99 {sorted(saves)[int(len(saves) * 0.99) - 1] * 1000:.3f} мс')
+    print(f'Журнал: список {listed} документов {list_seconds * 1000:.1f} мс, '
+          f'запуск {startup * 1000:.0f} мс, сжатие {compact_seconds * 1000:.0f} мс, запуск после сжатия {reopen * 1000:.0f} мс')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк раскладки файлов документов StorageService.
+
+Для каждого размера библиотеки и каждого формата хранилища записывает N
+документов (распознанный текст страницы и метаданные), затем измеряет
+чтение случайных документов, получение списка документов, обход
+директории documents и занятое место на диске. Прежний формат - плоская
+директория и JSON с отступами.
+
+Пример:
+    python benchmarks/bench_storage_layout.py --sizes 10000 100000 1000000
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.storage_service import StorageService
+
+LAYOUTS = {
+    'flat+indent': {'layout': 'flat', 'compact': False, 'compress': False},
+    'sharded': {'layout': 'sharded', 'compact': True, 'compress': False},
+    'sharded+gzip': {'layout': 'sharded', 'compact': True, 'compress': True},
+}
+
+PAGE = ('Закон Ома для участка цепи: сила тока прямо пропорциональна напряжению '
+        'и обратно пропорциональна сопротивлению проводника. ') * 12
+
+class BenchDocument:
+    def __init__(self, index):
+        self.id = f'{index:032x}'
+        self.filename = f'Учебник {index}.pdf'
+        self.created_at = datetime.now()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'created_at': self.created_at.isoformat(),
+            'content': PAGE,
+            'pages': [{'page_number': number, 'source': 'ocr', 'elapsed': 0.42} for number in range(1, 6)]
+        }
+
+def disk_usage(path):
+    """Суммарный размер файлов и место, занятое блоками файловой системы"""
+    size = allocated = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            stat = os.stat(os.path.join(directory, filename))
+            size += stat.st_size
+            allocated += stat.st_blocks * 512
+    return size, allocated
+
+def run(root, size, options, gets):
+    storage_dir = os.path.join(root, 'store')
+    storage = StorageService(storage_dir, fsync=False, compact_min_entries=size, **options)
+
+    started = time.perf_counter()
+    for index in range(size):
+        storage.save_document(BenchDocument(index))
+    save_seconds = time.perf_counter() - started
+
+    rng = random.Random(1)
+    samples = []
+    for _ in range(gets):
+        document_id = f'{rng.randrange(size):032x}'
+        started = time.perf_counter()
+        storage.get_document(document_id)
+        samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    listed = len(storage.get_all_documents())
+    list_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    files = sum(len(filenames) for _, _, filenames in os.walk(storage.documents_dir))
+    walk_seconds = time.perf_counter() - started
+
+    size_bytes, allocated_bytes = disk_usage(storage.documents_dir)
+    storage.close()
+    shutil.rmtree(storage_dir)
+    assert listed == files == size
+    return {
+        'save_us': save_seconds / size * 1e6,
+        'get_us': statistics.median(samples) * 1e6,
+        'list_ms': list_seconds * 1000,
+        'walk_ms': walk_seconds * 1000,
+        'size_mb': size_bytes / 1024 / 1024,
+        'disk_mb': allocated_bytes / 1024 / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Плоская директория и JSON с отступами против шардов и компактного JSON')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Размеры библиотеки')
+    parser.add_argument('--layouts', nargs='+', choices=list(LAYOUTS), default=list(LAYOUTS), help='Форматы хранилища')
+    parser.add_argument('--gets', type=int, default=2000, help='Чтений случайных документов')
+    parser.add_argument('--dir', default=None, help='Директория для временных файлов (на проверяемой файловой системе)')
+    args = parser.parse_args()
+
+    print(f"{'документов':>10} {'формат':<13} {'запись, мкс':>12} {'чтение, мкс':>12} {'список, мс':>11} "
+          f"{'обход, мс':>10} {'файлы, МБ':>10} {'диск, МБ':>9}")
+    for size in args.sizes:
+        for name in args.layouts:
+            with tempfile.TemporaryDirectory(dir=args.dir) as root:
+                result = run(root, size, LAYOUTS[name], args.gets)
+            print(f"{size:>10} {name:<13} {result['save_us']:>12.1f} {result['get_us']:>12.1f} "
+                  f"{result['list_ms']:>11.1f} {result['walk_ms']:>10.1f} {result['size_mb']:>10.1f} "
+                  f"{result['disk_mb']:>9.1f}", flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пикового потребления памяти на пути загрузка -> OCR-запрос.
+
+Сравнивает прежнюю цепочку (чтение файла целиком, base64-строка, словарь
+запроса и сериализованный JSON) с потоковым телом запроса поверх mmap.
+Сетевой запрос не выполняется: тело запроса вычитывается в пустой приемник,
+как это делает HTTP-клиент при отправке.
+
+Пример:
+    python benchmarks/bench_upload_memory.py --size-mb 16
+"""
+
+import os
+import sys
+import json
+import mmap
+import base64
+import hashlib
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ocr_service import StreamingAnalyzeBody
+
+FEATURES = [{'type': 'TEXT_DETECTION', 'textDetectionConfig': {'languageCodes': ['ru', 'en'], 'model': 'page'}}]
+
+def legacy_path(file_path):
+    """Прежний путь: read() -> b64encode().decode() -> dict -> json.dumps().encode()"""
+    with open(file_path, 'rb') as image_file:
+        image_data = image_file.read()
+    image_content = base64.b64encode(image_data).decode('utf-8')
+    body = {'folderId': 'folder', 'analyzeSpecs': [{'content': image_content, 'features': FEATURES}]}
+    payload = json.dumps(body).encode('utf-8')
+    return hashlib.sha256(image_data).hexdigest(), len(payload)
+
+def streaming_path(file_path):
+    """Новый путь: mmap файла -> base64 по блокам прямо в тело запроса"""
+    with open(file_path, 'rb') as image_file:
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as image_buffer:
+            digest = hashlib.sha256(image_buffer).hexdigest()
+            body = StreamingAnalyzeBody('folder', [{'content': image_buffer, 'features': FEATURES}])
+            sent = 0
+            for chunk in body:
+                sent += len(chunk)
+            return digest, sent
+
+def measure(func, file_path):
+    tracemalloc.start()
+    result = func(file_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+def main():
+    parser = argparse.ArgumentParser(description='Пиковая память при подготовке OCR-запроса')
+    parser.add_argument('--size-mb', type=float, default=16, help='Размер тестового изображения, МБ')
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.bin') as tmp:
+        tmp.write(os.urandom(size))
+        file_path = tmp.name
+
+    try:
+        (legacy_digest, legacy_sent), legacy_peak = measure(legacy_path, file_path)
+        (stream_digest, stream_sent), stream_peak = measure(streaming_path, file_path)
+    finally:
+        os.remove(file_path)
+
+    assert legacy_digest == stream_digest and legacy_sent == stream_sent
+
+    mb = 1024 * 1024
+    print(f"Размер изображения:   {size / mb:8.1f} МБ, тело запроса {stream_sent / mb:.1f} МБ")
+    print(f"Прежний путь:         {legacy_peak / mb:8.1f} МБ пик ({legacy_peak / size:.1f}x размера)")
+    print(f"Потоковый путь:       {stream_peak / mb:8.1f} МБ пик ({stream_peak / size:.2f}x размера)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Служебные команды обслуживания базы данных.
+
+Пример:
+    python manage.py search-backfill --batch-size 500
+    python manage.py compress-content --codec zlib
+    python manage.py storage-migrate data/storage --layout sharded --compress
+"""
+
+import argparse
+import logging
+
+# Столбцы типа CompressedText
+COMPRESSED_COLUMNS = (
+    ('documents', 'content'), ('document_pages', 'text'), ('jobs', 'result'), ('document_indexes', 'passages')
+)
+
+def search_backfill(args):
+    """Добавляет в полнотекстовый индекс документы, загруженные до его появления"""
+    from app.database.db import engine, init_db
+    from app.services.search_service import backfill_search_index
+    init_db()
+    indexed = backfill_search_index(
+        engine,
+        batch_size=args.batch_size,
+        on_batch=lambda total, last_id: print(f'Проиндексировано {total} документов (до id {last_id})')
+    )
+    print(f'Готово: добавлено в индекс {indexed} документов')
+
+def compress_content(args):
+    """Сжимает текст, сохраненный до включения сжатия, и выводит отчет о размере"""
+    from app.database.db import engine, init_db
+    from app.database.compression import compress_column, storage_report
+    init_db()
+    for table, column in COMPRESSED_COLUMNS:
+        if not args.report:
+            scanned, compressed = compress_column(
+                engine, table, column,
+                batch_size=args.batch_size,
+                codec=args.codec,
+                on_batch=lambda total, packed, last_rowid: print(f'{table}.{column}: просмотрено {total}, сжато {packed}')
+            )
+            print(f'{table}.{column}: сжато {compressed} из {scanned} несжатых значений')
+        report = storage_report(engine, table, column)
+        print(f"{table}.{column}: строк {report['rows']}, сжатых {report['compressed_rows']}, "
+              f"текст {report['raw_bytes']} байт, хранится {report['stored_bytes']} байт, коэффициент {report['ratio']}")
+
+def storage_migrate(args):
+    """Переводит файлы документов StorageService в другую раскладку и формат"""
+    from app.services.storage_service import StorageService
+    storage = StorageService(args.storage_dir)
+    print(f'Текущий формат: {storage.layout}')
+    scanned, migrated = storage.migrate(
+        layout=args.layout,
+        compact=not args.indent,
+        compress=args.compress,
+        on_progress=lambda total, moved: print(f'Просмотрено {total} файлов, перенесено {moved}')
+    )
+    storage.close()
+    print(f'Готово: перенесено {migrated} из {scanned} файлов, формат {storage.layout}')
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Обслуживание базы данных textbook analyzer')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('search-backfill', help='Заполнить индекс полнотекстового поиска')
+    backfill.add_argument('--batch-size', type=int, default=500, help='Документов в одной транзакции')
+    backfill.set_defaults(handler=search_backfill)
+
+    compress = commands.add_parser('compress-content', help='Сжать ранее сохраненный текст документов и задач')
+    compress.add_argument('--batch-size', type=int, default=200, help='Строк в одной транзакции')
+    compress.add_argument('--codec', choices=['zlib', 'zstd'], default=None, help='Алгоритм (по умолчанию CONTENT_COMPRESSION)')
+    compress.add_argument('--report', action='store_true', help='Только вывести отчет о размере')
+    compress.set_defaults(handler=compress_content)
+
+    migrate = commands.add_parser('storage-migrate', help='Перевести файлы документов StorageService в другой формат')
+    migrate.add_argument('storage_dir', help='Директория хранилища')
+    migrate.add_argument('--layout', choices=['sharded', 'flat'], default='sharded', help='Раскладка файлов')
+    migrate.add_argument('--indent', action='store_true', help='JSON с отступами (прежний формат)')
+    migrate.add_argument('--compress', action='store_true', help='Сжимать файлы gzip')
+    migrate.set_defaults(handler=storage_migrate)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == '__main__':
+    main()
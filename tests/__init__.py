@@ -0,0 +1,11 @@
+import os
+import atexit
+import shutil
+import tempfile
+
+# Кэш результатов, объединение запросов и база данных по умолчанию создаются
+# во временной директории, а не в рабочей копии репозитория
+_test_dir = tempfile.mkdtemp(prefix='textbook-analyzer-tests-')
+atexit.register(shutil.rmtree, _test_dir, ignore_errors=True)
+os.environ.setdefault('CACHE_DB_PATH', os.path.join(_test_dir, 'results.db'))
+os.environ.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(_test_dir, 'app.db')}")
@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from app.database import db as database
+from app.database.db import create_db_engine
+from app.models.document import Document
+from app.services.document_service import save_page
+from app.services.scheduler import FairScheduler
+from app.utils.result_cache import ResultCache
+
+def _completion(text):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {'result': {'alternatives': [{'message': {'text': text}}]}}
+    return response
+
+class TestConfig:
+    TESTING = True
+    SECRET_KEY = 'test'
+    YANDEX_FOLDER_ID = 'folder'
+    YANDEX_GPT_URL = 'https://llm.example/completion'
+    YANDEX_GPT_MODEL = 'gpt://folder/yandexgpt-lite'
+
+class TestCreateApp(unittest.TestCase):
+    """Маршруты приложения, которое создает create_app (run.py), на временной базе"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.engine = create_db_engine(f"sqlite:///{os.path.join(cls.test_dir, 'app.db')}")
+        TestConfig.UPLOAD_FOLDER = os.path.join(cls.test_dir, 'uploads')
+        database.db_session.remove()
+        database.db_session.configure(bind=cls.engine)
+        cls.patchers = [
+            patch.object(database, 'engine', cls.engine),
+            patch('app.services.job_service.job_service.start'),
+            patch('logging.basicConfig'),
+        ]
+        for patcher in cls.patchers:
+            patcher.start()
+        database.init_db()
+        import app.main
+        from app import create_app
+        cls.main = app.main
+        with patch('logging.FileHandler'):
+            cls.app = create_app(TestConfig)
+
+    @classmethod
+    def tearDownClass(cls):
+        for patcher in reversed(cls.patchers):
+            patcher.stop()
+        database.db_session.remove()
+        database.db_session.configure(bind=database.engine)
+        cls.engine.dispose()
+        shutil.rmtree(cls.test_dir)
+
+    def setUp(self):
+        patcher = patch.object(self.main, 'log_service')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_each_session_gets_its_own_scheduler_key(self):
+        # Arrange
+        scheduler = FairScheduler('gpt', max_concurrency=4, session_concurrency=4)
+        clients = [self.app.test_client(), self.app.test_client()]
+
+        # Act
+        with patch('app.services.gpt_service.get_scheduler', return_value=scheduler), \
+                patch('app.services.gpt_service.get_gpt_cache', return_value=ResultCache('gpt')), \
+                patch('app.services.gpt_service.get_gpt_single_flight', return_value=None), \
+                patch('app.services.gpt_service.Config.GPT_USAGE_TRACKING', False), \
+                patch('app.services.gpt_service.get_token', return_value='token'), \
+                patch('app.services.gpt_service.http_client') as mock_http_client:
+            mock_http_client.post.return_value = _completion('Ответ')
+            for index, client in enumerate(clients):
+                response = client.post('/ask', json={'text': 'Материал', 'question': f'Вопрос {index}?'})
+                self.assertEqual(response.status_code, 200)
+
+        # Assert
+        sessions = scheduler.get_stats()['sessions']
+        self.assertEqual(len(sessions), 2)
+        self.assertNotIn('anonymous', sessions)
+
+    def test_explain_stream_sends_progress_before_text(self):
+        client = self.app.test_client()
+        text = '\n\n'.join(f'Страница {index}. ' + 'слово ' * 20 for index in range(2))
+
+        with patch('app.services.gpt_service.Config.GPT_CHUNK_TOKENS', 50), \
+                patch('app.services.gpt_service.get_gpt_cache', return_value=ResultCache('gpt')), \
+                patch('app.services.gpt_service.get_gpt_single_flight', return_value=None), \
+                patch('app.services.gpt_service.Config.GPT_USAGE_TRACKING', False), \
+                patch('app.services.gpt_service.get_token', return_value='token'), \
+                patch('app.services.gpt_service.http_client') as mock_http_client:
+            reduce_response = MagicMock(status_code=200)
+            reduce_response.iter_lines.return_value = [
+                json.dumps({'result': {'alternatives': [{'message': {'text': 'Итог'}}]}}).encode()
+            ]
+            mock_http_client.post.side_effect = lambda url, **kwargs: (
+                reduce_response if kwargs.get('stream') else _completion('Кратко'))
+            body = client.post('/explain/stream', json={'text': text}).get_data(as_text=True)
+
+        events = [event.split('\n')[0] for event in body.strip().split('\n\n')]
+        self.assertEqual(events, ['event: progress', 'event: progress', 'data: {"text": "Итог"}', 'event: done'])
+
+    def test_job_status_is_visible_only_to_its_session(self):
+        from app.services.job_service import job_service
+        own = job_service.submit('upload', {'file_path': 'book.pdf'}, session_id='s1')
+        foreign = job_service.submit('upload', {'file_path': 'book.pdf'}, session_id='s2')
+        orphan = job_service.submit('upload', {'file_path': 'book.pdf'})
+        client = self.app.test_client()
+        with client.session_transaction() as flask_session:
+            flask_session['session_id'] = 's1'
+
+        self.assertEqual(client.get(f'/api/jobs/{own}').status_code, 200)
+        self.assertEqual(client.get(f'/api/jobs/{foreign}').status_code, 404)
+        self.assertEqual(client.get(f'/api/jobs/{orphan}').status_code, 404)
+
+    def add_document(self, title, content):
+        document = Document(title=title, content=content)
+        database.db_session.add(document)
+        database.db_session.commit()
+        document_uuid = document.uuid
+        database.db_session.remove()
+        return document_uuid
+
+    def test_document_list_and_search_are_served(self):
+        document_uuid = self.add_document('Оптика', 'Собирающая линза фокусирует свет.')
+        client = self.app.test_client()
+
+        listed = client.get('/api/documents?limit=100').get_json()
+        found = client.get('/api/documents/search?q=линза').get_json()
+
+        self.assertIn(document_uuid, [item['uuid'] for item in listed['documents']])
+        self.assertEqual([item['uuid'] for item in found['results']], [document_uuid])
+
+    def test_page_routes_are_served(self):
+        document_uuid = self.add_document('Учебник', None)
+        for number, status in ((1, 'done'), (2, 'failed')):
+            save_page(database.db_session, document_uuid, {'page_number': number, 'text': f'Страница {number}',
+                                                           'source': 'text_layer', 'status': status})
+        database.db_session.remove()
+        client = self.app.test_client()
+
+        pages = client.get(f'/api/documents/{document_uuid}/pages?text=1').get_json()
+        page = client.get(f'/api/documents/{document_uuid}/pages/2')
+        reprocess = client.post(f'/api/documents/{document_uuid}/reprocess', json={'mode': 'failed'})
+
+        self.assertEqual([item['page_number'] for item in pages['pages']], [1, 2])
+        self.assertEqual(pages['status'], {'done': 1, 'failed': 1})
+        self.assertEqual(page.get_json()['status'], 'failed')
+        # Исходного файла нет: маршрут отвечает, но задачу не ставит
+        self.assertEqual(reprocess.status_code, 409)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app.database.db import Base
+from app.database.compression import (compress_text, decompress_text, compress_column, storage_report,
+                                      ZLIB_MARKER)
+from app.models.document import Document
+from app.services.search_service import SearchService, init_search_index
+
+PAGE = 'Закон Ома для участка цепи: сила тока прямо пропорциональна напряжению. ' * 40
+
+class TestCompressText(unittest.TestCase):
+    def test_large_text_is_compressed_with_marker(self):
+        packed = compress_text(PAGE, codec='zlib', min_bytes=1024)
+
+        self.assertIsInstance(packed, bytes)
+        self.assertTrue(packed.startswith(ZLIB_MARKER))
+        self.assertLess(len(packed), len(PAGE.encode('utf-8')) // 5)
+        self.assertEqual(decompress_text(packed), PAGE)
+
+    def test_short_and_incompressible_text_is_kept(self):
+        self.assertEqual(compress_text('Короткий текст', codec='zlib', min_bytes=1024), 'Короткий текст')
+        # Сжатие, не уменьшающее размер, не применяется
+        self.assertEqual(compress_text('abc', codec='zlib', min_bytes=1), 'abc')
+        self.assertEqual(compress_text(PAGE, codec='none'), PAGE)
+
+    def test_plain_values_pass_through(self):
+        self.assertIsNone(decompress_text(None))
+        self.assertEqual(decompress_text('текст'), 'текст')
+
+class TestCompressedColumn(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        Base.metadata.create_all(bind=self.engine, tables=[Document.__table__])
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def stored_types(self):
+        with self.engine.connect() as connection:
+            return connection.execute(text('SELECT typeof(content) FROM documents ORDER BY id')).scalars().all()
+
+    def test_content_is_stored_compressed_and_loaded_on_access(self):
+        # Arrange
+        document = Document(title='Физика', content=PAGE)
+        self.session.add_all([document, Document(title='Заметка', content='Короткий текст')])
+        self.session.commit()
+        self.session.expunge_all()
+
+        # Act
+        loaded = self.session.query(Document).filter_by(title='Физика').one()
+
+        # Assert
+        self.assertEqual(self.stored_types(), ['blob', 'text'])
+        self.assertIn('content', inspect(loaded).unloaded)
+        self.assertEqual(loaded.content, PAGE)
+
+    def test_search_reads_compressed_content(self):
+        init_search_index(self.engine)
+        self.session.add(Document(title='Физика', content=PAGE + ' Второй закон Ньютона.'))
+        self.session.commit()
+
+        results = SearchService(self.session).search('Ньютона')['results']
+
+        self.assertEqual([result['title'] for result in results], ['Физика'])
+        self.assertIn('[Ньютона]', results[0]['snippet'])
+
+    def test_migration_compresses_legacy_rows_without_reindexing(self):
+        # Arrange: строки, записанные до включения сжатия
+        init_search_index(self.engine)
+        with self.engine.begin() as connection:
+            for index in range(5):
+                connection.execute(text('INSERT INTO documents (uuid, title, content) VALUES (:uuid, :title, :content)'),
+                                   {'uuid': f'doc-{index}', 'title': f'Глава {index}', 'content': f'{PAGE} глава{index}'})
+        batches = []
+
+        # Act
+        scanned, compressed = compress_column(self.engine, 'documents', 'content', batch_size=2, codec='zlib',
+                                              on_batch=lambda total, packed, last: batches.append(total))
+
+        # Assert
+        self.assertEqual((scanned, compressed), (5, 5))
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(self.stored_types(), ['blob'] * 5)
+        report = storage_report(self.engine, 'documents', 'content')
+        self.assertEqual(report['compressed_rows'], 5)
+        self.assertGreater(report['ratio'], 5)
+        self.assertEqual(self.session.query(Document.content).filter_by(uuid='doc-3').scalar(), f'{PAGE} глава3')
+        self.assertEqual([result['title'] for result in SearchService(self.session).search('глава3')['results']],
+                         ['Глава 3'])
+        self.assertEqual(compress_column(self.engine, 'documents', 'content'), (0, 0))
+
+    def test_legacy_search_index_is_rebuilt_from_view(self):
+        # Arrange: индекс прежней версии читал текст прямо из documents
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE documents_fts USING fts5(title, content, content='documents', content_rowid='id')"))
+            connection.execute(text(
+                'CREATE TRIGGER documents_fts_insert AFTER INSERT ON documents BEGIN '
+                'INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END'))
+            connection.execute(text("INSERT INTO documents (uuid, title, content) VALUES ('old', 'Физика', 'Закон Ома')"))
+
+        # Act
+        init_search_index(self.engine)
+        self.session.add(Document(title='Механика', content=PAGE + ' Закон Ньютона.'))
+        self.session.commit()
+
+        # Assert
+        search = SearchService(self.session)
+        self.assertEqual(sorted(result['title'] for result in search.search('Ома')['results']), ['Механика', 'Физика'])
+        self.assertEqual([result['title'] for result in search.search('Ньютона')['results']], ['Механика'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.config import Config
+from app.database.db import Base, create_db_engine, write_transaction
+from app.models.document import Document
+
+class TestCreateDbEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_db_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        Base.metadata.create_all(bind=self.engine, tables=[Document.__table__])
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_sqlite_pragmas_are_applied_on_connect(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+            self.assertEqual(connection.exec_driver_sql('PRAGMA synchronous').scalar(), 1)  # NORMAL
+            self.assertGreater(connection.exec_driver_sql('PRAGMA busy_timeout').scalar(), 0)
+
+    def test_concurrent_read_then_write_transactions_do_not_fail(self):
+        # Arrange
+        Session = sessionmaker(bind=self.engine)
+        session = Session()
+        session.add(Document(title='Документ'))
+        session.commit()
+        session.close()
+        errors = []
+
+        def worker():
+            for _ in range(20):
+                session = Session()
+                try:
+                    with write_transaction(session):
+                        document = session.query(Document).first()
+                        document.title = f'Документ {threading.get_ident()}'
+                        session.add(Document(title='Новый'))
+                except Exception as e:
+                    errors.append(e)
+                    session.rollback()
+                finally:
+                    session.close()
+
+        # Act
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        # Assert
+        self.assertEqual(errors, [])
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT count(*) FROM documents')).scalar(), 81)
+
+    def test_open_read_transaction_does_not_block_other_writers(self):
+        # Arrange: короткое ожидание блокировки, чтобы ошибка не ждала 30 секунд
+        patcher = patch.object(Config, 'DB_SQLITE_BUSY_TIMEOUT', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        engine = create_db_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        self.addCleanup(engine.dispose)
+        Session = sessionmaker(bind=engine)
+        reader, writer = Session(), Session()
+        self.addCleanup(reader.close)
+        self.addCleanup(writer.close)
+        reader.add(Document(title='Документ'))
+        reader.commit()
+
+        # Act: чтение оставляет транзакцию открытой (как db_session до конца запроса)
+        self.assertIsNotNone(reader.query(Document).first())
+        writer.add(Document(title='Запись из второй сессии'))
+        writer.commit()
+        with write_transaction(writer):
+            writer.query(Document).filter_by(title='Документ').one().title = 'Обновлен'
+
+        # Assert
+        self.assertTrue(reader.in_transaction())
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT count(*) FROM documents')).scalar(), 2)
+
+    def test_in_memory_database_is_supported(self):
+        engine = create_db_engine('sqlite://')
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT 1')).scalar(), 1)
+        engine.dispose()
+
+if __name__ == '__main__':
+    unittest.main()
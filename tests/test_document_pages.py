@@ -0,0 +1,189 @@
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from app.config import Config
+from app.database.db import Base
+from app.models.document import Document
+from app.models.document_page import DocumentPage
+from app.services import pipeline_service
+from app.services.document_service import get_page_range, get_page_summary, save_page
+from app.services.pdf_service import pymupdf
+
+class FakeJob:
+    """Контекст задачи без очереди: стадии сохраняются в словарь"""
+
+    def __init__(self, payload, stages=None):
+        self.job_id = 'job-1'
+        self.session_id = 's1'
+        self.payload = payload
+        self.stages = stages or {}
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def update_stage(self, name, **fields):
+        self.stages.setdefault(name, {}).update(fields)
+
+@unittest.skipIf(pymupdf is None, "PyMuPDF не установлен")
+class TestDocumentPages(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.test_dir, 'pages.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.session = scoped_session(sessionmaker(bind=self.engine))
+
+        # Страницы 1 и 3 содержат текстовый слой, страница 2 - "скан" без текста
+        self.pdf_path = os.path.join(self.test_dir, 'book.pdf')
+        document = pymupdf.open()
+        for text in ['Chapter one: introduction to algebra', None, 'Chapter three: geometry basics']:
+            page = document.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        document.save(self.pdf_path)
+        document.close()
+
+        self.ocr_service = MagicMock()
+        self.ocr_service.config_fingerprint.return_value = 'cfg1'
+        self.ocr_service.recognize_many.side_effect = self.recognize_many
+        self.ocr_error = None
+        self.patchers = [
+            patch.object(pipeline_service, 'db_session', self.session),
+            patch.object(pipeline_service, 'OCRService', return_value=self.ocr_service),
+            patch.object(pipeline_service, 'retrieval_service'),
+            patch.object(pipeline_service, 'log_service'),
+            patch.object(pipeline_service, 'LogService'),
+            patch.object(Config, 'CACHE_DB_PATH', os.path.join(self.test_dir, 'results.db')),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.session.remove()
+        self.engine.dispose()
+        shutil.rmtree(self.test_dir)
+
+    def recognize_many(self, images, digests=None):
+        if self.ocr_error:
+            return [{'text': '', 'error': self.ocr_error} for _ in images]
+        return [{'text': 'scanned page', 'error': None} for _ in images]
+
+    def upload(self, stages=None):
+        job = FakeJob({'file_path': self.pdf_path, 'filename': 'book.pdf', 'explain': False}, stages)
+        return pipeline_service.process_upload(job), job
+
+    def pages(self, document_id):
+        self.session.remove()
+        return {page['page_number']: page for page in get_page_range(self.session, document_id)}
+
+    def test_upload_stores_each_page(self):
+        result, job = self.upload()
+
+        pages = self.pages(result['document_id'])
+        self.assertEqual(sorted(pages), [1, 2, 3])
+        self.assertEqual([pages[n]['source'] for n in (1, 2, 3)], ['text_layer', 'ocr', 'text_layer'])
+        self.assertEqual(len(pages[2]['image_hash']), 64)
+        self.assertIsNone(pages[1]['image_hash'])
+        self.assertEqual(job.stages['ocr']['pages_done'], 3)
+        document = self.session.query(Document).filter_by(uuid=result['document_id']).one()
+        self.assertEqual(document.content,
+                         'Chapter one: introduction to algebra\n\nscanned page\n\nChapter three: geometry basics')
+
+    def test_failed_page_is_marked_and_skipped_in_content(self):
+        self.ocr_error = 'OCR недоступен'
+
+        result, job = self.upload()
+
+        pages = self.pages(result['document_id'])
+        self.assertEqual(pages[2]['status'], 'failed')
+        self.assertEqual(pages[2]['error'], 'OCR недоступен')
+        self.assertEqual(get_page_summary(self.session, result['document_id']), {'done': 2, 'failed': 1})
+        self.assertEqual(job.stages['ocr']['pages_failed'], 1)
+        self.assertNotIn('OCR недоступен', result['extracted_text'])
+
+    def test_retry_reuses_document_and_skips_done_pages(self):
+        # Первая попытка успела создать документ и сохранить страницу 2 до сбоя
+        document = Document('book.pdf', None, self.pdf_path, '.pdf')
+        self.session.add(document)
+        self.session.commit()
+        document_id = document.uuid
+        save_page(self.session, document_id, {'page_number': 2, 'text': 'scanned page', 'source': 'ocr'}, 'cfg1')
+
+        result, _ = self.upload(stages={'ocr': {'document_id': document_id}})
+
+        self.assertEqual(result['document_id'], document_id)
+        self.assertEqual(self.session.query(Document).count(), 1)
+        self.ocr_service.recognize_many.assert_not_called()
+        self.assertEqual(self.pages(document_id)[2]['attempts'], 1)
+
+    def test_pages_are_visible_while_document_is_processed(self):
+        document_id = pipeline_service.create_document(self.pdf_path, 'book.pdf')
+        reader = sessionmaker(bind=self.engine)()
+        self.addCleanup(reader.close)
+        visible = []
+
+        def on_page(page):
+            visible.append(reader.query(DocumentPage).filter_by(document_uuid=document_id).count())
+            reader.rollback()
+
+        pipeline_service.process_pages(document_id, self.pdf_path, self.ocr_service, [1, 2, 3], on_page=on_page)
+
+        self.assertEqual(visible, [1, 2, 3])
+
+    def test_image_ocr_error_is_saved_as_failed_page(self):
+        image_path = os.path.join(self.test_dir, 'scan.png')
+        with open(image_path, 'wb') as f:
+            f.write(b'png')
+        self.ocr_service.recognize_file.side_effect = RuntimeError('Ошибка OCR: 500')
+        document_id = pipeline_service.create_document(image_path, 'scan.png')
+
+        _, failed = pipeline_service.process_pages(document_id, image_path, self.ocr_service, [1])
+
+        self.assertEqual(failed, [1])
+        self.assertEqual(self.pages(document_id)[1]['status'], 'failed')
+        self.assertEqual(pipeline_service.assemble_content(self.session, document_id), '')
+
+    def test_reprocess_failed_only_touches_failed_pages(self):
+        self.ocr_error = 'OCR недоступен'
+        document_id = self.upload()[0]['document_id']
+        self.ocr_error = None
+
+        result = pipeline_service.process_reprocess(FakeJob({'document_id': document_id, 'mode': 'failed'}))
+
+        self.assertEqual(result['pages_processed'], [2])
+        self.assertEqual(result['pages_failed'], [])
+        pages = self.pages(document_id)
+        self.assertEqual(pages[2]['status'], 'done')
+        self.assertEqual(pages[2]['attempts'], 2)
+        self.assertEqual(pages[1]['attempts'], 1)
+        document = self.session.query(Document).filter_by(uuid=document_id).one()
+        self.assertIn('scanned page', document.content)
+
+    def test_stale_selects_pages_recognized_with_other_ocr_settings(self):
+        document_id = self.upload()[0]['document_id']
+
+        self.assertEqual(pipeline_service.select_pages(document_id, 3, 'stale', ocr_config='cfg1'), [])
+        self.assertEqual(pipeline_service.select_pages(document_id, 3, 'stale', ocr_config='cfg2'), [2])
+        self.assertEqual(pipeline_service.select_pages(document_id, 3, 'all', page_numbers=[3, 9]), [3])
+
+    def test_legacy_document_without_pages_is_fully_processed(self):
+        self.assertEqual(pipeline_service.select_pages('legacy', 3, 'failed'), [1, 2, 3])
+
+    def test_page_range_fetch(self):
+        document_id = self.upload()[0]['document_id']
+        self.session.remove()
+
+        pages = get_page_range(self.session, document_id, start=2, end=3, include_text=False)
+
+        self.assertEqual([page['page_number'] for page in pages], [2, 3])
+        self.assertNotIn('text', pages[0])
+
+if __name__ == '__main__':
+    unittest.main()
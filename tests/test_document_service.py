@@ -0,0 +1,67 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database.db import Base
+from app.models.document import Document
+from app.services.document_service import stream_document_page, parse_fields, decode_cursor, encode_cursor, InvalidCursor
+
+class TestDocumentListing(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine, tables=[Document.__table__])
+        self.session = sessionmaker(bind=engine)()
+        started = datetime(2024, 1, 1)
+        for index in range(7):
+            document = Document(title=f'Документ {index}', content='текст ' * 1000, file_type='.pdf')
+            # Два документа с одинаковым временем создания проверяют порядок по id
+            document.created_at = started + timedelta(minutes=min(index, 5))
+            self.session.add(document)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def fetch(self, **kwargs):
+        return json.loads(''.join(stream_document_page(self.session, **kwargs)))
+
+    def test_pages_cover_all_documents_once_newest_first(self):
+        # Act
+        titles = []
+        cursor = None
+        pages = 0
+        while True:
+            page = self.fetch(limit=3, cursor=cursor)
+            titles.extend(document['title'] for document in page['documents'])
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        # Assert
+        self.assertEqual(pages, 3)
+        self.assertEqual(titles, [f'Документ {index}' for index in (6, 5, 4, 3, 2, 1, 0)])
+
+    def test_list_projection_excludes_content(self):
+        page = self.fetch(limit=2)
+        self.assertNotIn('content', page['documents'][0])
+        self.assertEqual(set(page['documents'][0]), {'id', 'uuid', 'title', 'file_type', 'created_at', 'updated_at'})
+
+    def test_fields_parameter_selects_columns(self):
+        page = self.fetch(fields=parse_fields('title,content'), limit=1)
+        self.assertEqual(set(page['documents'][0]), {'title', 'content'})
+        with self.assertRaises(ValueError):
+            parse_fields('title,password')
+
+    def test_last_full_page_has_no_cursor(self):
+        self.assertIsNone(self.fetch(limit=7)['next_cursor'])
+
+    def test_cursor_round_trip_and_validation(self):
+        created_at = datetime(2024, 1, 1, 12, 30)
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('не курсор')
+
+if __name__ == '__main__':
+    unittest.main()
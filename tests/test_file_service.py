@@ -63,5 +63,26 @@ class TestFileService(unittest.TestCase):
         result = self.file_service.delete_file('/nonexistent/path.txt')
         self.assertFalse(result)
 
+    def test_spool_upload_hashes_while_saving(self):
+        import io
+        import hashlib
+        from werkzeug.datastructures import FileStorage
+        
+        data = b'page image bytes' * 1000
+        upload = self.file_service.spool_upload(FileStorage(stream=io.BytesIO(data), filename='page.png'))
+        
+        self.assertTrue(upload.file_path.startswith(self.test_upload_dir))
+        self.assertEqual(upload.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(upload.size, len(data))
+        with open(upload.file_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        with upload.buffer() as buffer:
+            self.assertEqual(bytes(buffer), data)
+        
+        # Без копии в памяти содержимое читается через mmap сохраненного файла
+        upload.memory = None
+        with upload.buffer() as buffer:
+            self.assertEqual(buffer[:], data)
+
 if __name__ == '__main__':
     unittest.main()
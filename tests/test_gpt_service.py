@@ -0,0 +1,313 @@
+import json
+import asyncio
+import time
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from app.services.gpt_service import GPTService
+from app.utils.result_cache import ResultCache
+from app.utils.single_flight import SingleFlight
+from app.services.usage_service import TokenBudgetExceeded
+
+def _completion(text):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {'result': {'alternatives': [{'message': {'text': text}}]}}
+    return response
+
+class TestGPTCompletionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResultCache('gpt')
+        self.gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=self.cache,
+                                      usage=False)
+    
+    @patch('app.services.gpt_service.Config.GPT_CACHE_EXPLANATIONS', True)
+    @patch('app.services.gpt_service.http_client')
+    def test_repeated_explanation_is_served_from_cache(self, mock_http_client):
+        # Arrange
+        mock_http_client.post.return_value = _completion('Объяснение')
+        
+        # Act: тот же текст, отличающийся только пробелами
+        first = self.gpt_service.explain_content('Закон  Ома:\n I = U / R ')
+        second = self.gpt_service.explain_content('Закон Ома:\nI = U / R')
+        
+        # Assert
+        self.assertEqual(first, 'Объяснение')
+        self.assertEqual(second, 'Объяснение')
+        self.assertEqual(mock_http_client.post.call_count, 1)
+        self.assertEqual(self.cache.get_stats()['memory_hits'], 1)
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_explanations_are_not_cached_by_default(self, mock_http_client):
+        mock_http_client.post.side_effect = [_completion('Объяснение 1'), _completion('Объяснение 2')]
+
+        first = self.gpt_service.explain_content('Закон Ома')
+        second = self.gpt_service.explain_content('Закон Ома')
+
+        self.assertEqual((first, second), ('Объяснение 1', 'Объяснение 2'))
+        self.assertEqual(mock_http_client.post.call_count, 2)
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_concurrent_uncached_requests_are_sent_once(self, mock_http_client):
+        # Arrange: ответ приходит, пока второй такой же запрос уже ждет
+        started = threading.Event()
+        release = threading.Event()
+        
+        def slow_post(url, **kwargs):
+            started.set()
+            release.wait(5)
+            return _completion('Объяснение')
+        mock_http_client.post.side_effect = slow_post
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=self.cache,
+                                 single_flight=SingleFlight('gpt'), usage=False)
+        results = []
+        
+        # Act
+        first = threading.Thread(target=lambda: results.append(gpt_service.explain_content('Закон Ома')))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(gpt_service.explain_content('Закон Ома')))
+        second.start()
+        time.sleep(0.05)
+        release.set()
+        first.join(5)
+        second.join(5)
+        
+        # Assert
+        self.assertEqual(results, ['Объяснение', 'Объяснение'])
+        self.assertEqual(mock_http_client.post.call_count, 1)
+        self.assertIsNone(self.cache.get(GPTService.cache_key(mock_http_client.post.call_args.kwargs['json'])))
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_high_temperature_calls_are_not_cached(self, mock_http_client):
+        # Arrange
+        mock_http_client.post.side_effect = [_completion('Пример 1'), _completion('Пример 2')]
+        
+        # Act
+        first = self.gpt_service.generate_examples('Материал', 'Тема')
+        second = self.gpt_service.generate_examples('Материал', 'Тема')
+        
+        # Assert
+        self.assertEqual((first, second), ('Пример 1', 'Пример 2'))
+        self.assertEqual(mock_http_client.post.call_count, 2)
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_stream_yields_increments_and_caches_full_answer(self, mock_http_client):
+        # Arrange: каждый фрагмент потока содержит весь текст, сгенерированный к этому моменту
+        response = MagicMock(status_code=200)
+        response.iter_lines.return_value = [
+            json.dumps({'result': {'alternatives': [{'message': {'text': text}}]}}).encode()
+            for text in ['Сила', 'Сила тока', 'Сила тока равна 2 А']
+        ]
+        mock_http_client.post.return_value = response
+        
+        # Act
+        chunks = list(self.gpt_service.answer_question_stream('I = U / R', 'Чему равен ток?'))
+        cached = self.gpt_service.answer_question('I = U / R', 'Чему равен ток?')
+        
+        # Assert
+        self.assertEqual(chunks, ['Сила', ' тока', ' равна 2 А'])
+        self.assertEqual(cached, 'Сила тока равна 2 А')
+        self.assertEqual(mock_http_client.post.call_count, 1)
+        sent = mock_http_client.post.call_args.kwargs
+        self.assertTrue(sent['stream'])
+        self.assertTrue(sent['json']['completionOptions']['stream'])
+    
+    def test_cache_key_depends_on_model_and_options(self):
+        payload = {
+            'modelUri': 'gpt://folder/yandexgpt-lite',
+            'completionOptions': {'stream': False, 'temperature': 0.3, 'maxTokens': 1500},
+            'messages': [{'role': 'user', 'text': 'Вопрос'}]
+        }
+        other_model = dict(payload, modelUri='gpt://folder/yandexgpt')
+        other_options = dict(payload, completionOptions={'stream': False, 'temperature': 0.3, 'maxTokens': 500})
+        streamed = dict(payload, completionOptions={'stream': True, 'temperature': 0.3, 'maxTokens': 1500})
+        
+        key = GPTService.cache_key(payload)
+        self.assertNotEqual(key, GPTService.cache_key(other_model))
+        self.assertNotEqual(key, GPTService.cache_key(other_options))
+        self.assertEqual(key, GPTService.cache_key(streamed))
+
+class TestTokenUsage(unittest.TestCase):
+    def setUp(self):
+        self.usage = MagicMock()
+        self.gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                      session_id='session', endpoint='main.ask_question', document_id='doc', usage=self.usage)
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_usage_block_is_recorded(self, mock_http_client):
+        # Arrange
+        response = _completion('Ответ')
+        response.json.return_value['result']['usage'] = {'inputTextTokens': '120', 'completionTokens': '30', 'totalTokens': '150'}
+        mock_http_client.post.return_value = response
+        
+        # Act
+        self.gpt_service.answer_question('Материал', 'Вопрос?')
+        
+        # Assert
+        self.usage.record.assert_called_once_with('session', 'main.ask_question', 120, 30, document_id='doc',
+                                                  model_uri='gpt://folder/yandexgpt-lite', estimated=False)
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_request_over_budget_is_not_sent(self, mock_http_client):
+        # Arrange
+        self.usage.check_budget.side_effect = TokenBudgetExceeded('session', 990, 50, 1000)
+        
+        # Act / Assert
+        with self.assertRaises(TokenBudgetExceeded):
+            self.gpt_service.answer_question('Материал', 'Вопрос?')
+        mock_http_client.post.assert_not_called()
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_stream_over_budget_fails_before_iteration(self, mock_http_client):
+        self.usage.check_budget.side_effect = TokenBudgetExceeded('session', 990, 50, 1000)
+        
+        # Ошибка возникает при вызове, до того как маршрут начнет потоковый ответ
+        with self.assertRaises(TokenBudgetExceeded):
+            self.gpt_service.answer_question_stream('Материал', 'Вопрос?')
+        mock_http_client.post.assert_not_called()
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_long_material_is_truncated_before_sending(self, mock_http_client):
+        # Arrange
+        mock_http_client.post.return_value = _completion('Ответ')
+        
+        # Act
+        with patch('app.services.gpt_service.Config.GPT_MAX_PROMPT_TOKENS', 100):
+            self.gpt_service.answer_question('а' * 10000, 'Вопрос?')
+        
+        # Assert: вопрос сохранен, материал обрезан
+        prompt = mock_http_client.post.call_args.kwargs['json']['messages'][1]['text']
+        self.assertLess(len(prompt), 500)
+        self.assertTrue(prompt.endswith('Вопрос: Вопрос?'))
+
+class TestMapReduceExplanation(unittest.TestCase):
+    @patch('app.services.gpt_service.Config.GPT_MAP_WORKERS', 3)
+    @patch('app.services.gpt_service.Config.GPT_CHUNK_TOKENS', 50)
+    @patch('app.services.gpt_service.http_client')
+    def test_long_content_is_explained_by_chunks_in_parallel(self, mock_http_client):
+        # Arrange: 6 страниц, каждая близка к бюджету одного запроса
+        pages = [f'Страница {index}. ' + 'слово ' * 20 for index in range(6)]
+        in_flight = {'current': 0, 'peak': 0}
+        lock = threading.Lock()
+        
+        def fake_post(url, **kwargs):
+            prompt = kwargs['json']['messages'][1]['text']
+            with lock:
+                in_flight['current'] += 1
+                in_flight['peak'] = max(in_flight['peak'], in_flight['current'])
+            time.sleep(0.05)
+            with lock:
+                in_flight['current'] -= 1
+            if 'Ниже даны объяснения' in prompt:
+                return _completion('Итоговое объяснение')
+            return _completion('Кратко')
+        
+        mock_http_client.post.side_effect = fake_post
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                 usage=False)
+        progress = []
+        
+        # Act
+        result = gpt_service.explain_content('\n\n'.join(pages), on_progress=lambda done, total: progress.append((done, total)))
+        
+        # Assert
+        self.assertEqual(result, 'Итоговое объяснение')
+        self.assertEqual(progress, [(done, 6) for done in range(1, 7)])
+        self.assertGreater(in_flight['peak'], 1)
+        self.assertLessEqual(in_flight['peak'], 3)
+        reduce_prompt = mock_http_client.post.call_args.kwargs['json']['messages'][1]['text']
+        self.assertIn('Часть 6:', reduce_prompt)
+    
+    @patch('app.services.gpt_service.Config.GPT_MAP_WORKERS', 2)
+    @patch('app.services.gpt_service.Config.GPT_CHUNK_TOKENS', 50)
+    @patch('app.services.gpt_service.http_client')
+    def test_stream_reports_map_progress_then_streams_reduce(self, mock_http_client):
+        # Arrange
+        pages = [f'Страница {index}. ' + 'слово ' * 20 for index in range(3)]
+        reduce_response = MagicMock(status_code=200)
+        reduce_response.iter_lines.return_value = [
+            json.dumps({'result': {'alternatives': [{'message': {'text': text}}]}}).encode()
+            for text in ['Итог', 'Итоговое объяснение']
+        ]
+        mock_http_client.post.side_effect = lambda url, **kwargs: (
+            reduce_response if kwargs.get('stream') else _completion('Кратко'))
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                 usage=False)
+        
+        # Act: шаг map не выполняется до начала обхода потока
+        events = gpt_service.explain_content_events('\n\n'.join(pages))
+        mock_http_client.post.assert_not_called()
+        events = list(events)
+        
+        # Assert
+        self.assertEqual(events, [('progress', {'done': done, 'total': 3}) for done in range(1, 4)] +
+                         [(None, {'text': 'Итог'}), (None, {'text': 'овое объяснение'})])
+        self.assertEqual(mock_http_client.post.call_count, 4)
+    
+    @patch('app.services.gpt_service.Config.GPT_CHUNK_TOKENS', 50)
+    @patch('app.services.gpt_service.http_client')
+    def test_long_stream_over_budget_fails_before_iteration(self, mock_http_client):
+        usage = MagicMock()
+        usage.check_budget.side_effect = TokenBudgetExceeded('session', 990, 50, 1000)
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                 session_id='session', usage=usage)
+        
+        with self.assertRaises(TokenBudgetExceeded):
+            gpt_service.explain_content_events('\n\n'.join(['слово ' * 30] * 3))
+        mock_http_client.post.assert_not_called()
+    
+    @patch('app.services.gpt_service.http_client')
+    def test_short_content_uses_single_request(self, mock_http_client):
+        mock_http_client.post.return_value = _completion('Объяснение')
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                 usage=False)
+        
+        self.assertEqual(gpt_service.explain_content('Короткий текст'), 'Объяснение')
+        self.assertEqual(mock_http_client.post.call_count, 1)
+
+    def test_usage_accounting_can_be_disabled(self):
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                 usage=False)
+
+        self.assertIsNone(gpt_service.usage)
+
+class TestGPTBatch(unittest.TestCase):
+    @patch('app.services.gpt_service.http_client')
+    def test_batch_runs_tasks_concurrently_and_yields_as_completed(self, mock_http_client):
+        # Arrange: объяснение генерируется дольше остальных заданий
+        def fake_post(url, **kwargs):
+            prompt = kwargs['json']['messages'][1]['text']
+            if prompt.startswith('Объясни'):
+                time.sleep(0.3)
+                return _completion('Объяснение')
+            time.sleep(0.1)
+            return _completion('Ответ' if prompt.startswith('Ответь') else 'Примеры')
+        
+        mock_http_client.post.side_effect = fake_post
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token', cache=ResultCache('gpt'),
+                                 usage=False)
+        tasks = [
+            {'type': 'explain'},
+            {'type': 'examples', 'topic': 'Закон Ома'},
+            {'type': 'answer', 'question': 'Что такое ток?'},
+            {'type': 'unknown'},
+        ]
+        
+        async def collect():
+            return [result async for result in gpt_service.run_batch('Материал', tasks)]
+        
+        # Act
+        started = time.perf_counter()
+        results = asyncio.run(collect())
+        elapsed = time.perf_counter() - started
+        
+        # Assert
+        self.assertLess(elapsed, 0.45)
+        self.assertEqual(results[-1], {'index': 0, 'type': 'explain', 'result': 'Объяснение'})
+        by_index = {result['index']: result for result in results}
+        self.assertEqual(by_index[1]['result'], 'Примеры')
+        self.assertEqual(by_index[2]['result'], 'Ответ')
+        self.assertIn('error', by_index[3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from app.utils.http_client import HTTPClient
+
+class TestHTTPClient(unittest.TestCase):
+    def setUp(self):
+        self.client = HTTPClient(pool_maxsize=4, connect_timeout=2, read_timeouts={'gpt': 30})
+    
+    def tearDown(self):
+        self.client.close()
+    
+    def test_session_reused_per_host(self):
+        first = self.client.get_session('https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze')
+        second = self.client.get_session('https://vision.api.cloud.yandex.net/other')
+        other = self.client.get_session('https://llm.api.cloud.yandex.net/foundationModels/v1/completion')
+        
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+    
+    def test_post_uses_upstream_timeout(self):
+        session = self.client.get_session('https://llm.api.cloud.yandex.net/')
+        with patch.object(session, 'post', return_value=MagicMock(status_code=200)) as mock_post:
+            self.client.post('https://llm.api.cloud.yandex.net/completion', upstream='gpt', json={})
+        
+        mock_post.assert_called_once_with('https://llm.api.cloud.yandex.net/completion', timeout=(2, 30), json={})
+    
+    def test_post_retries_throttled_response(self):
+        client = HTTPClient(rate_limits={'gpt': (1000, 4)}, backoff_base=0.01)
+        session = client.get_session('https://llm.api.cloud.yandex.net/')
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '0'})
+        ok = MagicMock(status_code=200, headers={})
+        with patch.object(session, 'post', side_effect=[throttled, ok]) as mock_post:
+            response = client.post('https://llm.api.cloud.yandex.net/completion', upstream='gpt', json={})
+        
+        self.assertIs(response, ok)
+        self.assertEqual(mock_post.call_count, 2)
+        throttled.close.assert_called_once_with()
+        ok.close.assert_not_called()
+        stats = client.get_rate_limit_stats()['gpt']
+        self.assertEqual(stats['throttled'], 1)
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['concurrency_limit'], 2)
+        client.close()
+    
+    def test_post_returns_last_error_after_max_attempts(self):
+        client = HTTPClient(rate_limits={'vision': (1000, 4)}, max_attempts=3, backoff_base=0.01)
+        session = client.get_session('https://vision.api.cloud.yandex.net/')
+        unavailable = MagicMock(status_code=502, headers={})
+        with patch.object(session, 'post', return_value=unavailable) as mock_post:
+            response = client.post('https://vision.api.cloud.yandex.net/batchAnalyze', upstream='vision', data=b'')
+        
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(mock_post.call_count, 3)
+        client.close()
+    
+    def test_stats_report_hosts(self):
+        self.client.get_session('https://iam.api.cloud.yandex.net/iam/v1/tokens')
+        stats = self.client.get_stats()
+        
+        self.assertIn('iam.api.cloud.yandex.net', stats)
+        self.assertEqual(stats['iam.api.cloud.yandex.net']['pool_hits'], 0)
+        self.assertEqual(stats['iam.api.cloud.yandex.net']['pool_maxsize'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
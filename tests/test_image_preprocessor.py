@@ -0,0 +1,49 @@
+import unittest
+import io
+from PIL import Image, ImageDraw
+from app.services.image_preprocessor import ImagePreprocessor
+
+def _scan(format_name, size=(1600, 1200), dpi=(600, 600), mode='RGB'):
+    image = Image.new(mode, size, 'white')
+    draw = ImageDraw.Draw(image)
+    for y in range(100, size[1] - 100, 40):
+        draw.rectangle((100, y, size[0] - 100, y + 12), fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format=format_name, dpi=dpi)
+    return buffer.getvalue()
+
+class TestImagePreprocessor(unittest.TestCase):
+    def test_lossless_scan_transcoded_and_downscaled(self):
+        preprocessor = ImagePreprocessor(grayscale=True, target_dpi=300, jpeg_quality=85, deskew=False)
+        
+        output, report = preprocessor.process(_scan('BMP'))
+        
+        result = Image.open(io.BytesIO(output))
+        self.assertEqual(result.format, 'JPEG')
+        self.assertEqual(result.mode, 'L')
+        self.assertEqual(result.size, (800, 600))
+        self.assertGreater(report['bytes_saved'], 0)
+        self.assertEqual([stage['name'] for stage in report['stages']], ['open', 'grayscale', 'downscale', 'encode'])
+    
+    def test_small_jpeg_kept_unchanged(self):
+        preprocessor = ImagePreprocessor(grayscale=False, target_dpi=300, deskew=False)
+        original = _scan('JPEG', size=(400, 300), dpi=(150, 150))
+        
+        output, report = preprocessor.process(original)
+        
+        self.assertIs(output, original)
+        self.assertEqual(report['bytes_saved'], 0)
+    
+    def test_stats_accumulate(self):
+        preprocessor = ImagePreprocessor(grayscale=True, target_dpi=300, deskew=False)
+        preprocessor.process(_scan('PNG'))
+        preprocessor.process(_scan('TIFF'))
+        
+        stats = preprocessor.get_stats()
+        
+        self.assertEqual(stats['images'], 2)
+        self.assertEqual(stats['bytes_saved'], stats['input_bytes'] - stats['output_bytes'])
+        self.assertIn('encode', stats['stages'])
+
+if __name__ == '__main__':
+    unittest.main()
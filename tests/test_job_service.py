@@ -0,0 +1,103 @@
+import os
+import time
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from app.database.db import Base
+from app.models.job import Job
+from app.services.job_service import JobService
+
+class TestJobService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.temp_dir.name, 'jobs.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.session = scoped_session(sessionmaker(bind=self.engine))
+        self.service = JobService(session=self.session, max_workers=2, poll_interval=0.05,
+                                  lease_seconds=60, max_attempts=2)
+
+    def tearDown(self):
+        self.service.stop(timeout=2)
+        self.session.remove()
+        self.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def wait_for(self, job_id, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.session.remove()
+            job = self.service.get_job(job_id)
+            if job.status in ('done', 'failed'):
+                return job.to_dict()
+            time.sleep(0.02)
+        self.fail(f"Задача {job_id} не завершилась")
+
+    def test_job_runs_stages_and_stores_result(self):
+        # Arrange
+        def handler(job):
+            with job.stage('ocr'):
+                job.update_stage('ocr', pages_done=1)
+            with job.stage('explain'):
+                pass
+            return {'text': job.payload['value'].upper()}
+
+        self.service.register('demo', handler, stages=['ocr', 'explain'])
+
+        # Act
+        job_id = self.service.submit('demo', {'value': 'abc'}, session_id='s1')
+        result = self.wait_for(job_id)
+
+        # Assert
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['result'], {'text': 'ABC'})
+        self.assertEqual(result['stages']['ocr']['status'], 'done')
+        self.assertEqual(result['stages']['ocr']['pages_done'], 1)
+        self.assertEqual(result['stages']['explain']['status'], 'done')
+        self.assertEqual(result['attempts'], 1)
+
+    def test_failed_stage_is_reported(self):
+        # Arrange
+        def handler(job):
+            with job.stage('ocr'):
+                raise RuntimeError('OCR недоступен')
+
+        self.service.register('broken', handler, stages=['ocr', 'explain'])
+
+        # Act
+        job_id = self.service.submit('broken', {})
+        result = self.wait_for(job_id)
+
+        # Assert
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(result['error'], 'OCR недоступен')
+        self.assertEqual(result['stages']['ocr']['status'], 'failed')
+        self.assertEqual(result['stages']['explain']['status'], 'pending')
+
+    def test_stale_running_job_is_requeued(self):
+        # Arrange: задача, захваченная упавшим процессом
+        self.service.register('demo', lambda job: {'ok': True})
+        job = Job('demo', payload={})
+        job.status = 'running'
+        job.attempts = 1
+        job.worker_id = 'dead-worker'
+        job.updated_at = datetime.utcnow() - timedelta(seconds=120)
+        self.session.add(job)
+        self.session.commit()
+        job_id = job.id
+
+        # Act
+        self.service.start()
+        result = self.wait_for(job_id)
+
+        # Assert
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['attempts'], 2)
+
+    def test_unknown_job_type_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.service.submit('missing', {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from app.services.model_router import ModelRouter, get_model_router, percentile
+from app.services.gpt_service import GPTService
+
+LITE = 'gpt://folder/yandexgpt-lite'
+LARGE = 'gpt://folder/yandexgpt/latest'
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter(LITE, LARGE, large_tasks=('explain',), large_max_prompt_tokens=1000,
+                                  slo_seconds=5.0, window=0.3, min_samples=5)
+
+    def test_routes_by_task_and_prompt_length(self):
+        self.assertEqual(self.router.choose('explain', 500), LARGE)
+        self.assertEqual(self.router.choose('answer', 500), LITE)
+        self.assertEqual(self.router.choose('explain', 5000), LITE)
+
+        decisions = self.router.get_stats()['decisions']
+        self.assertEqual(decisions['explain'][LITE], {'prompt_length': 1})
+
+    def test_default_routes_every_task_to_fast_model(self):
+        router = ModelRouter(LITE, LARGE)
+
+        self.assertEqual({router.choose(task, 100) for task in ('explain', 'answer', 'examples')}, {LITE})
+
+    def test_default_config_keeps_fast_model(self):
+        with patch('app.services.model_router._router', None), \
+                patch('app.services.model_router.Config.GPT_ROUTING_ENABLED', True):
+            router = get_model_router()
+
+        self.assertEqual(router.large_tasks, set())
+
+    def test_falls_back_to_fast_model_while_p95_exceeds_slo(self):
+        # Arrange: большая модель отвечает дольше SLO
+        for _ in range(5):
+            self.router.observe(LARGE, 9.0)
+
+        # Act / Assert
+        self.assertEqual(self.router.choose('explain', 500), LITE)
+        self.assertEqual(self.router.get_stats()['models'][LARGE]['p95'], 9.0)
+
+        # Медленные замеры вышли из окна: большая модель снова получает запросы
+        time.sleep(0.35)
+        self.assertEqual(self.router.choose('explain', 500), LARGE)
+
+    def test_latency_histogram(self):
+        self.router.observe(LITE, 0.3)
+        self.router.observe(LITE, 3.0)
+        self.router.observe(LITE, 1.0, success=False)
+
+        stats = self.router.get_stats()['models'][LITE]
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['histogram']['le_0.5'], 1)
+        self.assertEqual(stats['histogram']['le_4'], 1)
+
+    def test_percentile_nearest_rank(self):
+        self.assertEqual(percentile(list(range(1, 101)), 0.95), 95)
+        self.assertIsNone(percentile([], 0.5))
+
+class TestGPTServiceRouting(unittest.TestCase):
+    @patch('app.services.gpt_service.http_client')
+    def test_request_uses_routed_model_and_reports_latency(self, mock_http_client):
+        # Arrange
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'result': {'alternatives': [{'message': {'text': 'Ответ'}}]}}
+        mock_http_client.post.return_value = response
+        router = MagicMock()
+        router.choose.return_value = LARGE
+        gpt_service = GPTService('https://llm.example/completion', 'folder', iam_token='token',
+                                 cache=MagicMock(), usage=MagicMock(), router=router)
+
+        # Act
+        gpt_service.generate_examples('Материал', 'Тема')
+
+        # Assert
+        router.choose.assert_called_once()
+        self.assertEqual(router.choose.call_args.args[0], 'examples')
+        self.assertEqual(mock_http_client.post.call_args.kwargs['json']['modelUri'], LARGE)
+        router.observe.assert_called_once()
+        self.assertEqual(router.observe.call_args.args[0], LARGE)
+        self.assertTrue(router.observe.call_args.args[2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 import unittest
 import os
 import io
+import json
+import base64
+import threading
+import time
 from PIL import Image
-from app.services.ocr_service import OCRService
+from app.services.ocr_service import OCRService, StreamingAnalyzeBody
+from app.utils.result_cache import ResultCache
+from app.utils.single_flight import SingleFlight
 from unittest.mock import patch, MagicMock
 
 class TestOCRService(unittest.TestCase):
@@ -27,5 +33,130 @@ class TestOCRService(unittest.TestCase):
         self.assertEqual(result, "Sample text")
         mock_image_to_string.assert_called_once()
 
+def _page_result(text):
+    return {'results': [{'textDetection': {'pages': [{'blocks': [{'lines': [{'words': [{'text': text}]}]}]}]}}]}
+
+class TestOCRBatching(unittest.TestCase):
+    def setUp(self):
+        self.ocr_service = OCRService('folder', iam_token='token', cache=ResultCache('ocr'))
+    
+    @patch('app.services.ocr_service.http_client')
+    def test_recognize_many_packs_pages_into_batches(self, mock_client):
+        def fake_post(url, upstream=None, headers=None, data=None):
+            specs = json.loads(b''.join(data))['analyzeSpecs']
+            response = MagicMock(status_code=200)
+            response.json.return_value = {'results': [_page_result(f"page{len(specs)}") for _ in specs]}
+            return response
+        mock_client.post.side_effect = fake_post
+        
+        with patch('app.services.ocr_service.Config.OCR_BATCH_MAX_IMAGES', 2):
+            result = self.ocr_service.recognize_many([b'a', b'b', b'c'])
+        
+        self.assertEqual([page['text'] for page in result], ['page2', 'page2', 'page1'])
+        self.assertEqual(mock_client.post.call_count, 2)
+    
+    @patch('app.services.ocr_service.http_client')
+    def test_recognize_many_falls_back_on_partial_failure(self, mock_client):
+        batch_response = MagicMock(status_code=200)
+        batch_response.json.return_value = {'results': [_page_result('first'), {'error': {'code': 3}}]}
+        single_response = MagicMock(status_code=200)
+        single_response.json.return_value = {'results': [_page_result('second')]}
+        mock_client.post.side_effect = [batch_response, single_response]
+        
+        result = self.ocr_service.recognize_many([b'a', b'b'])
+        
+        self.assertEqual(result, [{'text': 'first', 'error': None}, {'text': 'second', 'error': None}])
+        body = json.loads(b''.join(mock_client.post.call_args_list[1].kwargs['data']))
+        self.assertEqual(len(body['analyzeSpecs']), 1)
+    
+    @patch('app.services.ocr_service.http_client')
+    def test_repeated_image_served_from_cache(self, mock_client):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'results': [_page_result('cached')]}
+        mock_client.post.return_value = response
+        
+        first = self.ocr_service.recognize_bytes(b'same page')
+        second = self.ocr_service.recognize_bytes(b'same page')
+        batch = self.ocr_service.recognize_many([b'same page'])
+        
+        self.assertEqual((first, second, batch), ('cached', 'cached', [{'text': 'cached', 'error': None}]))
+        self.assertEqual(mock_client.post.call_count, 1)
+    
+    @patch('app.services.ocr_service.http_client')
+    def test_recognize_many_reports_failed_pages(self, mock_client):
+        batch_response = MagicMock(status_code=200)
+        batch_response.json.return_value = {'results': [_page_result('first'), {'error': {'code': 3}}]}
+        mock_client.post.side_effect = [batch_response, MagicMock(status_code=500, text='boom')]
+        
+        result = self.ocr_service.recognize_many([b'a', b'b'])
+        
+        self.assertEqual(result[0], {'text': 'first', 'error': None})
+        self.assertEqual(result[1]['text'], '')
+        self.assertIn('500', result[1]['error'])
+        # Ошибка не попадает в кэш: повторный вызов распознает только вторую страницу
+        mock_client.post.side_effect = [batch_response]
+        batch_response.json.return_value = {'results': [_page_result('second')]}
+        self.assertEqual(self.ocr_service.recognize_many([b'a', b'b'])[1], {'text': 'second', 'error': None})
+    
+    @patch('app.services.ocr_service.http_client')
+    def test_concurrent_identical_batches_are_sent_once(self, mock_client):
+        started = threading.Event()
+        release = threading.Event()
+        
+        def slow_post(url, upstream=None, headers=None, data=None):
+            started.set()
+            release.wait(5)
+            specs = json.loads(b''.join(data))['analyzeSpecs']
+            response = MagicMock(status_code=200)
+            response.json.return_value = {'results': [_page_result('page') for _ in specs]}
+            return response
+        mock_client.post.side_effect = slow_post
+        service = OCRService('folder', iam_token='token', cache=ResultCache('ocr'), single_flight=SingleFlight('ocr'))
+        results = []
+        
+        first = threading.Thread(target=lambda: results.append(service.recognize_many([b'a', b'b'])))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(service.recognize_many([b'a', b'b'])))
+        second.start()
+        time.sleep(0.05)
+        release.set()
+        first.join(5)
+        second.join(5)
+        
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(mock_client.post.call_count, 1)
+    
+    @patch('app.services.ocr_service.http_client')
+    def test_errors_are_not_cached(self, mock_client):
+        mock_client.post.return_value = MagicMock(status_code=500, text='boom')
+        
+        self.ocr_service.recognize_bytes(b'page')
+        self.ocr_service.recognize_bytes(b'page')
+        
+        self.assertEqual(mock_client.post.call_count, 2)
+
+class TestStreamingAnalyzeBody(unittest.TestCase):
+    def test_body_matches_json_serialization(self):
+        image = bytes(range(256)) * 5000
+        specs = [
+            {'content': image, 'features': [{'type': 'TEXT_DETECTION'}]},
+            {'content': b'xy', 'features': []}
+        ]
+        
+        body = StreamingAnalyzeBody('folder', specs)
+        data = b''.join(body)
+        
+        self.assertEqual(len(data), len(body))
+        self.assertEqual(json.loads(data), {
+            'folderId': 'folder',
+            'analyzeSpecs': [
+                {'content': base64.b64encode(image).decode('ascii'), 'features': [{'type': 'TEXT_DETECTION'}]},
+                {'content': 'eHk=', 'features': []}
+            ]
+        })
+        # Тело можно отправить повторно (например, после обновления токена)
+        self.assertEqual(b''.join(body), data)
+
 if __name__ == '__main__':
     unittest.main()
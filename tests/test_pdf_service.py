@@ -0,0 +1,77 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+from app.services.pdf_service import PDFService, pymupdf
+
+def scanning_ocr_service(text='scanned page'):
+    """Заглушка OCR, распознающая каждую страницу пакета как text"""
+    ocr_service = MagicMock()
+    ocr_service.recognize_many.side_effect = lambda images, digests=None: [{'text': text, 'error': None} for _ in images]
+    return ocr_service
+
+@unittest.skipIf(pymupdf is None, "PyMuPDF не установлен")
+class TestPDFService(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.test_dir, 'book.pdf')
+        
+        # Страницы 1 и 3 содержат текстовый слой, страница 2 - "скан" без текста
+        document = pymupdf.open()
+        for text in ['Chapter one: introduction to algebra', None, 'Chapter three: geometry basics']:
+            page = document.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        document.save(self.pdf_path)
+        document.close()
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_only_pages_without_text_layer_are_ocrd(self):
+        ocr_service = scanning_ocr_service()
+        
+        pages = list(PDFService(ocr_service, max_workers=2, dpi=50).iter_pages(self.pdf_path))
+        
+        self.assertEqual([page['page_number'] for page in pages], [1, 2, 3])
+        self.assertEqual([page['source'] for page in pages], ['text_layer', 'ocr', 'text_layer'])
+        self.assertEqual(pages[1]['text'], 'scanned page')
+        ocr_service.recognize_many.assert_called_once()
+        images, digests = ocr_service.recognize_many.call_args[0]
+        self.assertEqual(len(images), 1)
+        self.assertTrue(images[0].startswith(b'\x89PNG'))
+        self.assertEqual(digests, [pages[1]['image_hash']])
+    
+    def test_consecutive_scanned_pages_are_sent_in_batches(self):
+        # Пять страниц без текстового слоя подряд
+        document = pymupdf.open()
+        for _ in range(5):
+            document.new_page()
+        document.save(self.pdf_path)
+        document.close()
+        ocr_service = scanning_ocr_service()
+        
+        pages = list(PDFService(ocr_service, max_workers=2, dpi=50, batch_size=2).iter_pages(self.pdf_path))
+        
+        self.assertEqual([page['page_number'] for page in pages], [1, 2, 3, 4, 5])
+        self.assertEqual([len(call[0][0]) for call in ocr_service.recognize_many.call_args_list], [2, 2, 1])
+    
+    def test_failed_page_is_marked(self):
+        ocr_service = MagicMock()
+        ocr_service.recognize_many.return_value = [{'text': '', 'error': 'Ошибка распознавания: 500'}]
+        
+        pages = list(PDFService(ocr_service, max_workers=1, dpi=50).iter_pages(self.pdf_path))
+        
+        self.assertEqual([page['status'] for page in pages], ['done', 'failed', 'done'])
+        self.assertEqual(pages[1]['error'], 'Ошибка распознавания: 500')
+    
+    def test_extract_text_joins_pages_in_order(self):
+        ocr_service = scanning_ocr_service()
+        
+        text = PDFService(ocr_service, max_workers=1, dpi=50).extract_text(self.pdf_path)
+        
+        self.assertEqual(text, 'Chapter one: introduction to algebra\n\nscanned page\n\nChapter three: geometry basics')
+
+if __name__ == '__main__':
+    unittest.main()
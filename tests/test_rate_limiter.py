@@ -0,0 +1,62 @@
+import time
+import unittest
+from app.utils.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def test_token_bucket_limits_rate(self):
+        # Arrange: 20 запросов в секунду, корзина на 2 запроса
+        limiter = AdaptiveRateLimiter('test', rate=20, burst=2, max_concurrency=100)
+        
+        # Act
+        started = time.monotonic()
+        for _ in range(6):
+            self.assertTrue(limiter.acquire())
+            limiter.release(200)
+        elapsed = time.monotonic() - started
+        
+        # Assert: 2 запроса сразу, остальные 4 с интервалом 50 мс
+        self.assertGreaterEqual(elapsed, 0.18)
+    
+    def test_throttling_halves_window_and_success_grows_it(self):
+        limiter = AdaptiveRateLimiter('test', rate=1000, max_concurrency=8)
+        
+        limiter.acquire()
+        limiter.release(429)
+        self.assertEqual(limiter.get_stats()['concurrency_limit'], 4)
+        
+        # Повторный 429 в пределах интервала не уменьшает окно еще раз
+        limiter.acquire()
+        limiter.release(429)
+        self.assertEqual(limiter.get_stats()['concurrency_limit'], 4)
+        
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(200)
+        self.assertGreater(limiter.get_stats()['concurrency_limit'], 4)
+    
+    def test_concurrency_window_blocks_until_deadline(self):
+        limiter = AdaptiveRateLimiter('test', rate=1000, max_concurrency=1)
+        self.assertTrue(limiter.acquire())
+        
+        self.assertFalse(limiter.acquire(deadline=time.monotonic() + 0.05))
+        
+        limiter.release(200)
+        self.assertTrue(limiter.acquire(deadline=time.monotonic() + 0.05))
+    
+    def test_pause_delays_requests(self):
+        limiter = AdaptiveRateLimiter('test', rate=1000, max_concurrency=4)
+        limiter.pause(0.1)
+        
+        started = time.monotonic()
+        limiter.acquire()
+        
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+    
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+if __name__ == '__main__':
+    unittest.main()
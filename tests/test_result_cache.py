@@ -0,0 +1,60 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from app.utils.result_cache import ResultCache
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'cache.db')
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_memory_lru_eviction(self):
+        cache = ResultCache('test', max_entries=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        
+        self.assertEqual(cache.get('a'), '1')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+    
+    def test_disk_tier_survives_restart(self):
+        ResultCache('test', db_path=self.db_path).set('key', 'value')
+        
+        cache = ResultCache('test', db_path=self.db_path)
+        
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.get_stats()['disk_hits'], 1)
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.get_stats()['memory_hits'], 1)
+    
+    def test_namespaces_are_isolated(self):
+        ResultCache('ocr', db_path=self.db_path).set('key', 'ocr')
+        
+        self.assertIsNone(ResultCache('gpt', db_path=self.db_path).get('key'))
+    
+    def test_ttl_expiry(self):
+        cache = ResultCache('test', db_path=self.db_path, ttl=10)
+        with patch('app.utils.result_cache.time.time', return_value=1000):
+            cache.set('key', 'value')
+        with patch('app.utils.result_cache.time.time', return_value=1011):
+            self.assertIsNone(cache.get('key'))
+    
+    def test_disk_pruning(self):
+        cache = ResultCache('test', max_entries=1, db_path=self.db_path, max_disk_entries=5)
+        cache.DISK_PRUNE_INTERVAL = 1
+        for i in range(8):
+            cache.set(f'key{i}', str(i))
+        
+        self.assertEqual(cache.get_stats()['disk_evictions'], 3)
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key7'), '7')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker, scoped_session
+from app.database.db import Base
+from app.models.document_index import DocumentIndex
+from app.services.retrieval_service import BM25Index, RetrievalService, tokenize
+
+PASSAGES = [
+    'Закон Ома связывает силу тока, напряжение и сопротивление проводника.',
+    'Фотосинтез происходит в хлоропластах растений под действием света.',
+    'Сопротивление проводника зависит от его длины, площади сечения и материала.',
+    'Митохондрии обеспечивают клетку энергией в виде АТФ.',
+]
+
+class TestBM25Index(unittest.TestCase):
+    def test_tokenize_stems_and_drops_stop_words(self):
+        self.assertEqual(tokenize('Что такое сопротивление проводников?'), ['такое', 'сопрот', 'провод'])
+    
+    def test_search_ranks_relevant_passages(self):
+        index = BM25Index.build(PASSAGES)
+        
+        hits = index.search('От чего зависит сопротивление проводника?', top_k=2)
+        
+        self.assertEqual([passage_id for passage_id, _ in hits], [2, 0])
+        self.assertGreater(hits[0][1], hits[1][1])
+    
+    def test_search_without_matches_returns_nothing(self):
+        self.assertEqual(BM25Index.build(PASSAGES).search('квантовая хромодинамика', top_k=2), [])
+    
+    def test_serialization_roundtrip(self):
+        index = BM25Index.build(PASSAGES)
+        
+        restored = BM25Index.from_bytes(index.to_bytes())
+        
+        self.assertEqual(restored.search('фотосинтез света', 1), index.search('фотосинтез света', 1))
+
+class TestRetrievalService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.temp_dir.name, 'index.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.session = scoped_session(sessionmaker(bind=self.engine))
+        self.service = RetrievalService(session=self.session)
+    
+    def tearDown(self):
+        self.session.remove()
+        self.engine.dispose()
+        self.temp_dir.cleanup()
+    
+    @patch('app.services.retrieval_service.Config.RETRIEVAL_PASSAGE_TOKENS', 30)
+    def test_select_context_returns_relevant_passages_in_document_order(self):
+        # Arrange: каждый абзац становится отдельным фрагментом
+        content = '\n\n'.join(PASSAGES + [f'Дополнительный раздел {index}.' for index in range(6)])
+        self.service.build_index('doc-1', content)
+        
+        # Act
+        context = self.service.select_context('doc-1', content, 'Как сопротивление проводника связано с током?', top_k=2)
+        
+        # Assert
+        self.assertEqual(context, PASSAGES[0] + '\n\n' + PASSAGES[2])
+    
+    def test_index_is_persisted_and_built_lazily(self):
+        content = '\n\n'.join(PASSAGES)
+        
+        self.service.select_context('doc-2', content, 'фотосинтез')
+        
+        self.assertIsNotNone(self.session.get(DocumentIndex, 'doc-2'))
+        other = RetrievalService(session=self.session)
+        passages, index = other.get_index('doc-2')
+        self.assertEqual(passages, [content])
+        self.assertEqual(index.passage_count, 1)
+
+    def test_cached_index_is_replaced_after_rebuild_in_another_process(self):
+        # Arrange: индекс закеширован в памяти первого воркера
+        self.service.build_index('doc-3', PASSAGES[0])
+        self.assertEqual(self.service.get_index('doc-3')[0], [PASSAGES[0]])
+        other_worker = RetrievalService(session=self.session)
+
+        # Act: второй воркер перестраивает индекс после повторной обработки
+        other_worker.build_index('doc-3', PASSAGES[1])
+
+        # Assert
+        self.assertEqual(self.service.get_index('doc-3')[0], [PASSAGES[1]])
+        other_worker.delete_index('doc-3')
+        self.session.commit()
+        self.assertIsNone(self.service.get_index('doc-3'))
+
+    def test_content_is_loaded_only_when_index_is_missing(self):
+        content = '\n\n'.join(PASSAGES)
+        load_content = MagicMock(return_value=content)
+
+        self.service.select_context('doc-4', load_content, 'фотосинтез')
+        self.service.select_context('doc-4', load_content, 'митохондрии')
+
+        load_content.assert_called_once_with()
+
+    def test_passages_are_stored_compressed(self):
+        content = '\n\n'.join(PASSAGES * 20)
+        self.service.build_index('doc-5', content)
+
+        with self.engine.connect() as connection:
+            stored = connection.execute(text("SELECT typeof(passages) FROM document_indexes WHERE document_uuid = 'doc-5'")).scalar()
+        self.assertEqual(stored, 'blob')
+        self.assertEqual('\n\n'.join(RetrievalService(session=self.session).get_index('doc-5')[0]), content)
+
+if __name__ == '__main__':
+    unittest.main()
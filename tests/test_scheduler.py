@@ -0,0 +1,109 @@
+import time
+import threading
+import unittest
+from app.services.scheduler import FairScheduler
+
+class TestFairScheduler(unittest.TestCase):
+    def run_requests(self, scheduler, requests, hold=0.01):
+        """Запускает запросы в отдельных потоках и возвращает порядок получения слотов"""
+        order = []
+        order_lock = threading.Lock()
+        threads = []
+
+        def worker(session_id, cost):
+            with scheduler.slot(session_id, cost=cost):
+                with order_lock:
+                    order.append(session_id)
+                time.sleep(hold)
+
+        for session_id, cost in requests:
+            thread = threading.Thread(target=worker, args=(session_id, cost))
+            thread.start()
+            threads.append(thread)
+            # Фиксируем порядок постановки в очередь
+            time.sleep(0.005)
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_interactive_session_is_not_starved_by_bulk_session(self):
+        # Arrange: один слот уже занят, сессия bulk поставила 10 запросов до interactive
+        scheduler = FairScheduler('test', max_concurrency=1, session_concurrency=1)
+        blocker = scheduler.acquire('bulk')
+        requests = [('bulk', 1)] * 10 + [('interactive', 1)] * 2
+
+        # Act
+        releaser = threading.Timer(0.2, scheduler.release, args=(blocker,))
+        releaser.start()
+        order = self.run_requests(scheduler, requests)
+
+        # Assert: запросы interactive чередуются с bulk, а не ждут всю очередь bulk
+        self.assertEqual(len(order), 12)
+        self.assertEqual(order[:4].count('interactive'), 2)
+
+    def test_concurrency_limits(self):
+        # Arrange
+        scheduler = FairScheduler('test', max_concurrency=3, session_concurrency=2)
+        peak = {'total': 0, 'a': 0}
+        current = {'total': 0, 'a': 0}
+        lock = threading.Lock()
+
+        def worker(session_id):
+            with scheduler.slot(session_id):
+                with lock:
+                    current['total'] += 1
+                    peak['total'] = max(peak['total'], current['total'])
+                    if session_id == 'a':
+                        current['a'] += 1
+                        peak['a'] = max(peak['a'], current['a'])
+                time.sleep(0.02)
+                with lock:
+                    current['total'] -= 1
+                    if session_id == 'a':
+                        current['a'] -= 1
+
+        # Act
+        threads = [threading.Thread(target=worker, args=(session_id,)) for session_id in ['a'] * 6 + ['b'] * 6]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        # Assert
+        self.assertEqual(peak['total'], 3)
+        self.assertEqual(peak['a'], 2)
+        self.assertEqual(scheduler.get_stats()['running'], 0)
+
+    def test_stats_report_queue_depth_and_wait(self):
+        # Arrange
+        scheduler = FairScheduler('test', max_concurrency=1, session_concurrency=1)
+        blocker = scheduler.acquire('a')
+        thread = threading.Thread(target=lambda: self.run_requests(scheduler, [('b', 1)]))
+        thread.start()
+        time.sleep(0.05)
+
+        # Act
+        stats = scheduler.get_stats()
+        scheduler.release(blocker)
+        thread.join(5)
+        final = scheduler.get_stats()
+
+        # Assert
+        self.assertEqual(stats['queued'], 1)
+        self.assertEqual(stats['sessions']['b']['queued'], 1)
+        self.assertGreater(stats['sessions']['b']['oldest_wait'], 0)
+        self.assertEqual(final['sessions']['b']['granted'], 1)
+        self.assertGreater(final['sessions']['b']['max_wait'], 0.04)
+
+    def test_acquire_timeout(self):
+        # Arrange
+        scheduler = FairScheduler('test', max_concurrency=1, session_concurrency=1)
+        scheduler.acquire('a')
+
+        # Act & Assert
+        with self.assertRaises(TimeoutError):
+            scheduler.acquire('b', timeout=0.05)
+        self.assertEqual(scheduler.get_stats()['queued'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
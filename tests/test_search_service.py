@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database.db import Base
+from app.models.document import Document
+from app.services.search_service import SearchService, init_search_index, backfill_search_index, build_match_query
+
+class TestSearchService(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}")
+        Base.metadata.create_all(bind=self.engine, tables=[Document.__table__])
+        self.session = sessionmaker(bind=self.engine)()
+        self.search = SearchService(self.session)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def add(self, title, content):
+        document = Document(title=title, content=content)
+        self.session.add(document)
+        self.session.commit()
+        return document
+
+    def titles(self, query, **kwargs):
+        return [result['title'] for result in self.search.search(query, **kwargs)['results']]
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        # Arrange
+        init_search_index(self.engine)
+        physics = self.add('Физика', 'Закон Ома связывает напряжение и силу тока.')
+        self.add('Химия', 'Периодический закон Менделеева.')
+
+        # Act / Assert: разные падежные формы находят документ
+        self.assertEqual(self.titles('законы Ома'), ['Физика'])
+        self.assertEqual(self.search.search('Ома')['results'][0]['created_at'], physics.to_dict()['created_at'])
+        self.assertEqual(sorted(self.titles('закон')), ['Физика', 'Химия'])
+
+        physics.content = 'Второй закон Ньютона.'
+        self.session.commit()
+        self.assertEqual(self.titles('Ома'), [])
+        self.assertEqual(self.titles('Ньютона'), ['Физика'])
+
+        self.session.delete(physics)
+        self.session.commit()
+        self.assertEqual(self.titles('закон'), ['Химия'])
+
+    def test_backfill_indexes_documents_created_before_index(self):
+        # Arrange: документы загружены до появления индекса
+        for index in range(5):
+            self.add(f'Глава {index}', f'Фотосинтез в листьях растений, глава {index}')
+        init_search_index(self.engine)
+        self.add('Новая глава', 'Фотосинтез и дыхание')
+
+        # Act
+        batches = []
+        indexed = backfill_search_index(self.engine, batch_size=2, on_batch=lambda total, last_id: batches.append(total))
+
+        # Assert: новый документ уже был в индексе, повторный запуск ничего не добавляет
+        self.assertEqual(indexed, 5)
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(len(self.titles('фотосинтез', limit=10)), 6)
+        self.assertEqual(backfill_search_index(self.engine), 0)
+
+    def test_results_are_ranked_paginated_and_have_snippets(self):
+        init_search_index(self.engine)
+        self.add('Оптика', 'Свет. ' * 50 + 'Линза')
+        for index in range(3):
+            self.add(f'Линза {index}', 'Собирающая линза фокусирует свет.')
+
+        first = self.search.search('линза', limit=2)
+        second = self.search.search('линза', limit=2, offset=first['next_offset'])
+
+        # Совпадение в названии весит больше, чем одно упоминание в длинном тексте
+        self.assertEqual(first['results'][0]['title'][:5], 'Линза')
+        self.assertEqual(second['results'][-1]['title'], 'Оптика')
+        self.assertIsNone(second['next_offset'])
+        self.assertIn('[линза]', first['results'][0]['snippet'])
+
+    def test_fts_syntax_in_query_is_escaped(self):
+        self.assertEqual(build_match_query('законы AND "Ома" OR (NEAR'), '"закон"* "ома" "near"*')
+        self.assertIsNone(build_match_query('и в на'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+from app.utils.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_concurrent_identical_calls_compute_once(self):
+        # Arrange
+        single_flight = SingleFlight('test')
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'текст'
+
+        def worker():
+            results.append(single_flight.do('key', compute))
+
+        # Act
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        # Assert
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['текст'] * 5)
+        self.assertEqual(single_flight.get_stats()['local_waits'], 4)
+
+    def test_waiter_in_other_worker_gets_leader_result(self):
+        # Arrange: два экземпляра с общей базой изображают два воркера gunicorn
+        first = SingleFlight('test', db_path=self.db_path, poll_interval=0.02)
+        second = SingleFlight('test', db_path=self.db_path, poll_interval=0.02)
+        shared_cache = {}
+        second_calls = []
+
+        def slow_compute():
+            time.sleep(0.2)
+            shared_cache['key'] = 'из первого воркера'
+            return shared_cache['key']
+
+        def second_compute():
+            second_calls.append(1)
+            return 'из второго воркера'
+
+        # Act
+        leader = threading.Thread(target=first.do, args=('key', slow_compute, lambda: shared_cache.get('key')))
+        leader.start()
+        time.sleep(0.05)
+        result = second.do('key', second_compute, lambda: shared_cache.get('key'))
+        leader.join(5)
+
+        # Assert
+        self.assertEqual(result, 'из первого воркера')
+        self.assertEqual(second_calls, [])
+        self.assertEqual(second.get_stats()['remote_hits'], 1)
+
+    def test_expired_lease_is_taken_over(self):
+        # Arrange: аренда «упавшего» воркера истекает, а результата в кэше нет
+        abandoned = SingleFlight('test', db_path=self.db_path, lease_seconds=0.1)
+        self.assertTrue(abandoned._acquire_lease('key'))
+        waiter = SingleFlight('test', db_path=self.db_path, lease_seconds=0.1, poll_interval=0.02)
+
+        # Act
+        result = waiter.do('key', lambda: 'пересчитано', lambda: None)
+
+        # Assert
+        self.assertEqual(result, 'пересчитано')
+        self.assertEqual(waiter.get_stats()['takeovers'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from datetime import datetime
+from app.services.storage_service import StorageService
+
+class StoredDocument:
+    def __init__(self, document_id, filename='book.pdf'):
+        self.id = document_id
+        self.filename = filename
+        self.created_at = datetime(2024, 1, 1)
+
+    def to_dict(self):
+        return {'id': self.id, 'filename': self.filename, 'content': f'Текст {self.id}'}
+
+def save_many(storage_dir, prefix, count):
+    storage = StorageService(storage_dir, fsync=False, compact_min_entries=20)
+    for index in range(count):
+        storage.save_document(StoredDocument(f'{prefix}-{index}'))
+    storage.close()
+
+class TestStorageService(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def open(self, **kwargs):
+        storage = StorageService(self.test_dir, fsync=False, **kwargs)
+        self.addCleanup(storage.close)
+        return storage
+
+    def ids(self, storage):
+        return [entry['id'] for entry in storage.get_all_documents()]
+
+    def test_index_is_rebuilt_from_snapshot_and_journal(self):
+        # Arrange
+        storage = self.open()
+        for document_id in ('a', 'b', 'c'):
+            storage.save_document(StoredDocument(document_id))
+        storage.delete_document('b')
+
+        # Act
+        reopened = self.open()
+
+        # Assert
+        self.assertEqual(self.ids(reopened), ['a', 'c'])
+        self.assertEqual(reopened.get_document('c')['content'], 'Текст c')
+        with open(storage.metadata_file, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['documents'], [])
+
+    def test_journal_is_compacted_into_snapshot(self):
+        storage = self.open(compact_min_entries=5)
+
+        for index in range(12):
+            storage.save_document(StoredDocument(f'doc-{index}'))
+
+        with open(storage.metadata_file, encoding='utf-8') as f:
+            snapshot = [entry['id'] for entry in json.load(f)['documents']]
+        with open(storage.journal_file, encoding='utf-8') as f:
+            journal = f.read().splitlines()
+        self.assertGreaterEqual(len(snapshot), 6)
+        self.assertLessEqual(len(journal), 6)
+        self.assertEqual(self.ids(self.open()), [f'doc-{index}' for index in range(12)])
+
+    def test_torn_last_record_is_discarded(self):
+        storage = self.open()
+        storage.save_document(StoredDocument('a'))
+        storage.close()
+        # Сбой посреди записи второй операции
+        with open(os.path.join(self.test_dir, 'metadata.journal'), 'ab') as f:
+            f.write(b'{"op":"put","document":{"id":"b"')
+
+        reopened = self.open()
+        reopened.save_document(StoredDocument('c'))
+
+        self.assertEqual(self.ids(reopened), ['a', 'c'])
+        self.assertEqual(self.ids(self.open()), ['a', 'c'])
+
+    def test_instances_see_each_others_writes_across_compaction(self):
+        first = self.open(compact_min_entries=3)
+        second = self.open(compact_min_entries=3)
+
+        first.save_document(StoredDocument('a'))
+        self.assertEqual(self.ids(second), ['a'])
+        for index in range(5):
+            second.save_document(StoredDocument(f'b{index}'))
+        first.delete_document('b0')
+
+        self.assertEqual(self.ids(first), ['a', 'b1', 'b2', 'b3', 'b4'])
+        self.assertEqual(self.ids(second), ['a', 'b1', 'b2', 'b3', 'b4'])
+
+    def test_new_store_uses_sharded_compact_files(self):
+        storage = self.open(compress=True)
+
+        storage.save_document(StoredDocument('a'))
+
+        path = storage._document_path('a')
+        self.assertEqual(os.path.relpath(path, storage.documents_dir).count(os.sep), 1)
+        self.assertTrue(path.endswith('a.json.gz'))
+        self.assertEqual(self.open().get_document('a')['content'], 'Текст a')
+        self.assertTrue(storage.update_document('a', {'title': 'Физика'}))
+        self.assertEqual(storage.get_document('a')['title'], 'Физика')
+
+    def test_legacy_store_is_migrated_in_place(self):
+        # Arrange: хранилище прежнего формата
+        documents_dir = os.path.join(self.test_dir, 'documents')
+        os.makedirs(documents_dir)
+        entries = []
+        for document_id in ('a', 'b', 'c'):
+            with open(os.path.join(documents_dir, f'{document_id}.json'), 'w', encoding='utf-8') as f:
+                json.dump({'id': document_id, 'content': f'Текст {document_id}'}, f, ensure_ascii=False, indent=2)
+            entries.append({'id': document_id, 'filename': 'book.pdf', 'created_at': '2024-01-01T00:00:00'})
+        with open(os.path.join(self.test_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump({'documents': entries, 'last_updated': '2024-01-01T00:00:00'}, f, indent=2)
+        storage = self.open()
+        self.assertEqual(storage.layout, StorageService.LEGACY_LAYOUT)
+
+        # Act
+        scanned, migrated = storage.migrate(layout='sharded', compact=True, compress=True)
+
+        # Assert
+        self.assertEqual((scanned, migrated), (3, 3))
+        self.assertEqual(os.listdir(documents_dir).count('a.json'), 0)
+        reopened = self.open()
+        self.assertEqual(reopened.layout, {'layout': 'sharded', 'compact': True, 'compress': True})
+        self.assertEqual(self.ids(reopened), ['a', 'b', 'c'])
+        self.assertEqual(reopened.get_document('b')['content'], 'Текст b')
+        self.assertEqual(storage.migrate(layout='sharded', compact=True, compress=True), (3, 0))
+
+    def test_documents_are_found_after_interrupted_migration(self):
+        storage = self.open(layout='flat', compact=False)
+        storage.save_document(StoredDocument('a'))
+
+        # Формат уже переключен, но файл еще не перенесен
+        storage.layout = {'layout': 'sharded', 'compact': True, 'compress': False}
+
+        self.assertEqual(storage.get_document('a')['content'], 'Текст a')
+        self.assertTrue(storage.delete_document('a'))
+        self.assertIsNone(storage.get_document('a'))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'Нужен fork')
+    def test_concurrent_processes_do_not_lose_updates(self):
+        self.open()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=save_many, args=(self.test_dir, f'p{worker}', 50)) for worker in range(4)]
+
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+
+        self.assertTrue(all(process.exitcode == 0 for process in processes))
+        self.assertEqual(len(set(self.ids(self.open()))), 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from unittest.mock import patch
+from app.utils.text_chunker import estimate_tokens, split_paragraphs, split_text
+
+@patch('app.utils.text_chunker.Config.GPT_CHARS_PER_TOKEN', 1)
+class TestTextChunker(unittest.TestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('abcd'), 4)
+    
+    def test_split_paragraphs(self):
+        self.assertEqual(split_paragraphs('Первый\n\n  \nВторой\nстрока\n\n'), ['Первый', 'Второй\nстрока'])
+    
+    def test_paragraphs_are_packed_under_budget(self):
+        text = '\n\n'.join(['a' * 10, 'b' * 10, 'c' * 10])
+        
+        chunks = split_text(text, max_tokens=25)
+        
+        self.assertEqual(chunks, ['a' * 10 + '\n\n' + 'b' * 10, 'c' * 10])
+    
+    def test_long_paragraph_is_split_by_sentences_then_characters(self):
+        text = 'Раз два. Три четыре. ' + 'x' * 30
+        
+        chunks = split_text(text, max_tokens=12)
+        
+        self.assertEqual(chunks[:2], ['Раз два.', 'Три четыре.'])
+        self.assertTrue(all(estimate_tokens(chunk) <= 12 for chunk in chunks))
+        self.assertEqual(''.join(chunks[2:]), 'x' * 30)
+
+if __name__ == '__main__':
+    unittest.main()
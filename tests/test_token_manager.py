@@ -0,0 +1,59 @@
+import unittest
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app.utils.token_manager import TokenManager
+
+class TestTokenManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = TokenManager(oauth_token='oauth', background_refresh=False)
+        self.exchange_count = 0
+        
+    def _fake_exchange(self, oauth_token):
+        self.exchange_count += 1
+        time.sleep(0.05)
+        return f"iam-{self.exchange_count}", datetime.utcnow() + timedelta(hours=12)
+    
+    def test_token_is_cached_between_calls(self):
+        with patch.object(TokenManager, 'exchange_oauth_token', side_effect=self._fake_exchange):
+            first = self.manager.get_iam_token()
+            second = self.manager.get_iam_token()
+        
+        self.assertEqual(first, "iam-1")
+        self.assertEqual(second, "iam-1")
+        self.assertEqual(self.exchange_count, 1)
+    
+    def test_concurrent_requests_trigger_single_exchange(self):
+        results = []
+        
+        def worker():
+            results.append(self.manager.get_iam_token())
+        
+        with patch.object(TokenManager, 'exchange_oauth_token', side_effect=self._fake_exchange):
+            threads = [threading.Thread(target=worker) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(self.exchange_count, 1)
+        self.assertEqual(set(results), {"iam-1"})
+    
+    def test_stale_token_refreshed_once(self):
+        with patch.object(TokenManager, 'exchange_oauth_token', side_effect=self._fake_exchange):
+            stale = self.manager.get_iam_token()
+            # Два потока получили 401 с одним и тем же токеном
+            first = self.manager.get_iam_token(force_refresh=True, stale_token=stale)
+            second = self.manager.get_iam_token(force_refresh=True, stale_token=stale)
+        
+        self.assertEqual(first, "iam-2")
+        self.assertEqual(second, "iam-2")
+        self.assertEqual(self.exchange_count, 2)
+    
+    def test_parse_expires_at_with_nanoseconds(self):
+        parsed = TokenManager._parse_expires_at('2024-01-01T12:00:00.123456789Z')
+        self.assertEqual(parsed, datetime(2024, 1, 1, 12, 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
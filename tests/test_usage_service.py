@@ -0,0 +1,53 @@
+import unittest
+from sqlalchemy import create_engine
+from app.database.db import Base
+from app.models.token_usage import TokenUsage
+from app.services.usage_service import UsageService, TokenBudgetExceeded
+
+class TestUsageService(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=self.engine, tables=[TokenUsage.__table__])
+        self.usage = UsageService(bind=self.engine, budget=1000, window=3600)
+
+    def test_summary_groups_tokens_by_endpoint(self):
+        # Arrange
+        self.usage.record('s1', 'main.ask_question', 100, 50, document_id='d1')
+        self.usage.record('s2', 'main.ask_question', 200, 50, document_id='d1')
+        self.usage.record('s1', 'upload', 500, 300, document_id='d2')
+
+        # Act
+        summary = self.usage.get_summary(group_by='endpoint')
+
+        # Assert: группы по убыванию расхода
+        self.assertEqual([group['endpoint'] for group in summary], ['upload', 'main.ask_question'])
+        self.assertEqual(summary[1], {'endpoint': 'main.ask_question', 'requests': 2,
+                                      'input_tokens': 300, 'output_tokens': 100, 'total_tokens': 400})
+
+    def test_budget_rejects_request_exceeding_remaining_tokens(self):
+        # Arrange
+        self.usage.record('s1', 'upload', 600, 300)
+
+        # Act / Assert
+        self.usage.check_budget('s1', 100)
+        self.usage.check_budget('s2', 900)
+        with self.assertRaises(TokenBudgetExceeded):
+            self.usage.check_budget('s1', 101)
+        self.assertEqual(self.usage.get_budget_status('s1')['remaining'], 100)
+
+    def test_requests_without_session_share_a_limited_budget(self):
+        self.usage.record(None, 'upload', 600, 300)
+
+        with self.assertRaises(TokenBudgetExceeded):
+            self.usage.check_budget(None, 101)
+        self.usage.check_budget('s1', 101)
+        self.assertEqual(self.usage.get_summary(group_by='session')[0]['session'], 'anonymous')
+
+    def test_zero_budget_is_unlimited(self):
+        usage = UsageService(bind=self.engine, budget=0)
+        usage.record('s1', 'upload', 10 ** 6, 0)
+        usage.check_budget('s1', 10 ** 6)
+        self.assertIsNone(usage.get_budget_status('s1')['remaining'])
+
+if __name__ == '__main__':
+    unittest.main()